@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with an optional per-entry TTL"""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    """Two-tier cache: an in-process LRU in front of an async MongoDB collection.
+
+    Documents are stored as {"_id": key, "value": ..., "created_at": ...}. When a
+    TTL is configured, MongoDB expires old documents through a TTL index and
+    reads also ignore documents older than the TTL.
+    """
+
+    def __init__(self, collection, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.collection = collection
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.ttl = ttl
+        self.hits_memory = 0
+        self.hits_store = 0
+        self.misses = 0
+
+    async def ensure_indexes(self):
+        if self.ttl:
+            await self.collection.create_index("created_at", expireAfterSeconds=int(self.ttl))
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.hits_memory += 1
+            return value
+
+        doc = await self.collection.find_one(self._store_query(key))
+        if doc is None:
+            self.misses += 1
+            return None
+
+        self.hits_store += 1
+        self.memory.set(key, doc["value"])
+        return doc["value"]
+
+    async def contains(self, key: str) -> bool:
+        """Whether a value is cached, without counting a lookup in the stats"""
+        if key in self.memory:
+            return True
+        return await self.collection.find_one(self._store_query(key), {"_id": 1}) is not None
+
+    def _store_query(self, key: str) -> dict:
+        query = {"_id": key}
+        if self.ttl:
+            query["created_at"] = {"$gte": datetime.utcnow() - timedelta(seconds=self.ttl)}
+        return query
+
+    async def set(self, key: str, value: Any):
+        self.memory.set(key, value)
+        await self.collection.update_one(
+            {"_id": key},
+            {"$set": {"value": value, "created_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    async def delete(self, key: str):
+        self.memory.delete(key)
+        await self.collection.delete_one({"_id": key})
+
+    def stats(self) -> dict:
+        hits = self.hits_memory + self.hits_store
+        lookups = hits + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_store": self.hits_store,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+        }
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one in-flight call.
+
+    Callers that arrive while a call for their key is running await its result
+    instead of starting another one. Nothing is kept once the call finishes.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+
+    async def run(self, key, func, *args, **kwargs):
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(func(*args, **kwargs))
+            self._calls[key] = call
+
+            def forget(done):
+                if self._calls.get(key) is done:
+                    del self._calls[key]
+
+            call.add_done_callback(forget)
+        else:
+            self.coalesced += 1
+        # One caller going away must not cancel the call for the others
+        return await asyncio.shield(call)
+
+    def __len__(self):
+        return len(self._calls)
+
+
+class VersionStamp:
+    """Counter in MongoDB that workers poll to learn that their cached copies are stale"""
+
+    def __init__(self, collection, name: str):
+        self.collection = collection
+        self.name = name
+
+    async def read(self) -> int:
+        doc = await self.collection.find_one({"_id": self.name})
+        return doc["version"] if doc else 0
+
+    async def bump(self):
+        await self.collection.update_one({"_id": self.name}, {"$inc": {"version": 1}}, upsert=True)
+
+    async def watch(self, cache: LRUCache, interval: float):
+        """Clear the cache whenever the stamp changes; runs until cancelled"""
+        seen = await self.read()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                current = await self.read()
+            except Exception as e:
+                print(f"Could not read version stamp {self.name}: {str(e)}")
+                continue
+            if current != seen:
+                cache.clear()
+                seen = current
@@ -0,0 +1,111 @@
+"""Circuit breaker for calls to an upstream service.
+
+The breaker watches the outcome and latency of recent calls. When too many
+of them fail or are slow it opens, and calls fail immediately instead of
+waiting on a struggling provider. After a cool-down it lets a few probe
+calls through (half-open) and closes again once they succeed.
+"""
+import time
+from collections import deque
+from typing import Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a call while the circuit is open"""
+
+
+class CircuitBreaker:
+    """Decides from the recent calls whether the next call may be made"""
+
+    def __init__(
+        self,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 5.0,
+        slow_call_rate: float = 0.5,
+        reset_timeout: float = 30.0,
+        half_open_calls: int = 1,
+    ):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.opened_at: Optional[float] = None
+        self.rejected = 0
+        self._calls = deque(maxlen=window)
+        self._probes = 0
+
+    def before_call(self):
+        """Reserve a call, or raise CircuitOpenError if it must not be made"""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(f"circuit open for another {self.retry_after():.1f}s")
+            self.state = HALF_OPEN
+            self._probes = 0
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_calls:
+                self.rejected += 1
+                raise CircuitOpenError("circuit half-open, probe in progress")
+            self._probes += 1
+
+    def record(self, success: bool, elapsed: float):
+        """Record the outcome of a call reserved with before_call"""
+        slow = elapsed >= self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            if success and not slow:
+                self._close()
+            else:
+                self._open()
+            return
+
+        self._calls.append((success, slow))
+        if len(self._calls) < self.min_calls:
+            return
+        failures = sum(1 for ok, _ in self._calls if not ok)
+        slow_calls = sum(1 for _, was_slow in self._calls if was_slow)
+        if failures / len(self._calls) >= self.failure_rate or slow_calls / len(self._calls) >= self.slow_call_rate:
+            self._open()
+
+    def release(self):
+        """Give back a reserved call that was never made"""
+        if self.state == HALF_OPEN and self._probes:
+            self._probes -= 1
+
+    def retry_after(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self._calls.clear()
+        print(f"Circuit opened; failing fast for {self.reset_timeout}s")
+
+    def _close(self):
+        self.state = CLOSED
+        self.opened_at = None
+        self._calls.clear()
+        print("Circuit closed; upstream recovered")
+
+    def stats(self) -> dict:
+        failures = sum(1 for ok, _ in self._calls if not ok)
+        slow_calls = sum(1 for _, slow in self._calls if slow)
+        return {
+            "state": self.state,
+            "recent_calls": len(self._calls),
+            "recent_failures": failures,
+            "recent_slow_calls": slow_calls,
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after(), 1),
+        }
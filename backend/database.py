@@ -0,0 +1,140 @@
+"""Async MongoDB access.
+
+The Motor client is created once per process with pool size and timeouts
+taken from the environment. Handlers talk to collections through the small
+repositories below rather than calling the driver directly.
+"""
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Fields handlers need from an entry to keep rollups in step with it
+ROLLUP_PROJECTION = {"_id": 0, "user_id": 1, "timestamp": 1, "nutrients": 1}
+
+
+def client_options() -> dict:
+    """Connection pool and timeout settings, overridable through .env"""
+    return {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000")),
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000")),
+    }
+
+
+def create_client(url: str) -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(url, **client_options())
+
+
+class Repository:
+    """Async access to one collection"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def find(self, query: dict, projection: Optional[dict] = None):
+        """Async cursor over matching documents"""
+        return self.collection.find(query, projection)
+
+    async def insert(self, document: dict):
+        await self.collection.insert_one(document)
+
+    async def insert_unordered(self, documents: List[dict]) -> Dict[int, int]:
+        """Insert documents without stopping at the first failure.
+        
+        Returns the error code of each document that was not inserted, by position.
+        """
+        if not documents:
+            return {}
+        try:
+            await self.collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            return {error["index"]: error["code"] for error in e.details.get("writeErrors", [])}
+        return {}
+
+    async def ids_for_idempotency_keys(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        """Ids of stored documents by (user_id, idempotency_key)"""
+        if not keys:
+            return {}
+        cursor = self.collection.find(
+            {"$or": [{"user_id": user_id, "idempotency_key": key} for user_id, key in keys]},
+            {"_id": 0, "id": 1, "user_id": 1, "idempotency_key": 1}
+        )
+        return {(doc["user_id"], doc["idempotency_key"]): doc["id"] async for doc in cursor}
+
+
+class FoodEntryRepository(Repository):
+
+    async def update(self, entry_id: str, fields: dict) -> Optional[dict]:
+        """Set fields on an entry; returns the entry as it was before the edit"""
+        return await self.collection.find_one_and_update(
+            {"id": entry_id},
+            {"$set": fields},
+            projection=ROLLUP_PROJECTION
+        )
+
+    async def delete(self, entry_id: str) -> Optional[dict]:
+        """Delete an entry; returns the deleted entry"""
+        return await self.collection.find_one_and_delete({"id": entry_id}, projection=ROLLUP_PROJECTION)
+
+
+class WeightRecordRepository(Repository):
+    pass
+
+
+class UserProfileRepository(Repository):
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"user_id": user_id}, {"_id": 0})
+
+    async def update(self, user_id: str, fields: dict) -> bool:
+        """Set profile fields, creating the profile if needed; returns whether anything changed"""
+        result = await self.collection.update_one({"user_id": user_id}, {"$set": fields}, upsert=True)
+        return result.modified_count > 0
+
+    async def get_or_create(self, user_id: str, defaults: dict) -> dict:
+        """Get a profile, creating it from defaults in the same atomic upsert if it is missing"""
+        try:
+            return await self.collection.find_one_and_update(
+                {"user_id": user_id},
+                {"$setOnInsert": defaults},
+                upsert=True,
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # A concurrent upsert created it first (the unique user_id index rejects the second)
+            return await self.get(user_id)
+
+
+class DataVersionRepository(Repository):
+    """Per-user change counters for each kind of data, bumped on every write.
+
+    Read endpoints build their ETags from these, so a conditional request is
+    answered from one small document instead of the full query.
+    """
+
+    async def get(self, user_id: str, kind: str) -> Tuple[int, Optional[datetime]]:
+        """The version of a user's data and when it last changed (0, None if never written)"""
+        doc = await self.collection.find_one({"_id": f"{user_id}:{kind}"})
+        if doc is None:
+            return 0, None
+        return doc["version"], doc["updated_at"]
+
+    async def bump(self, kind: str, user_ids: Iterable[str]):
+        now = datetime.utcnow().replace(microsecond=0)
+        updates = [
+            UpdateOne({"_id": f"{user_id}:{kind}"}, {"$inc": {"version": 1}, "$set": {"updated_at": now}}, upsert=True)
+            for user_id in set(user_ids)
+        ]
+        if updates:
+            await self.collection.bulk_write(updates, ordered=False)
@@ -0,0 +1,211 @@
+"""Local food nutrition table with fuzzy name lookup.
+
+Nutrients are held per 100 g in one float32 column per field, so the table
+stays compact. It can be compiled to a directory of .npy files and opened
+memory-mapped, which is how large USDA-style dumps are meant to be used.
+Names are indexed by word prefix and by trigram. Lookups run in memory and
+never touch the network, so the table can stand in for Spoonacular when
+the provider is unavailable.
+"""
+import bisect
+import csv
+import json
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from nutrition import NUTRIENT_FIELDS
+
+COLUMNS = [field for field, _ in NUTRIENT_FIELDS.values()]
+
+# CSV headers accepted for each column, including USDA FoodData Central nutrient names
+HEADER_ALIASES = {
+    "name": "name",
+    "description": "name",
+    "food": "name",
+    "serving_g": "serving_g",
+    "serving size (g)": "serving_g",
+    "calories_kcal": "calories_kcal",
+    "energy (kcal)": "calories_kcal",
+    "carbs_g": "carbs_g",
+    "carbohydrate, by difference (g)": "carbs_g",
+    "protein_g": "protein_g",
+    "protein (g)": "protein_g",
+    "fat_g": "fat_g",
+    "total lipid (fat) (g)": "fat_g",
+    "fiber_g": "fiber_g",
+    "fiber, total dietary (g)": "fiber_g",
+    "sugar_g": "sugar_g",
+    "sugars, total including nlea (g)": "sugar_g",
+    "sugars, total (g)": "sugar_g",
+}
+
+DEFAULT_SERVING_G = 100.0
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase words separated by single spaces ("French_Fries" -> "french fries")"""
+    return " ".join(WORD_PATTERN.findall(name.lower().replace("_", " ")))
+
+
+def trigrams(name: str) -> set:
+    """Trigrams of each word, padded like pg_trgm so word starts and ends count"""
+    grams = set()
+    for word in name.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class FoodDatabase:
+    """Columnar food table (per-100 g nutrients) with a prefix and trigram index"""
+
+    def __init__(self, names: List[str], nutrients: np.ndarray, servings: np.ndarray):
+        self.names = names
+        self.nutrients = nutrients
+        self.servings = servings
+        self._keys = [normalize_name(name) for name in names]
+        self._exact = {}
+        self._prefixes = []
+        self._trigrams: Dict[str, List[int]] = {}
+        trigram_counts = []
+        for row, key in enumerate(self._keys):
+            self._exact.setdefault(key, row)
+            for word in key.split():
+                self._prefixes.append((word, row))
+            grams = trigrams(key)
+            trigram_counts.append(len(grams))
+            for gram in grams:
+                self._trigrams.setdefault(gram, []).append(row)
+        self._prefixes.sort()
+        self._trigram_counts = np.array(trigram_counts, dtype=np.int32)
+        self._trigrams = {gram: np.array(rows, dtype=np.int32) for gram, rows in self._trigrams.items()}
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def empty(cls) -> "FoodDatabase":
+        return cls([], np.zeros((0, len(COLUMNS)), dtype=np.float32), np.zeros(0, dtype=np.float32))
+
+    @classmethod
+    def from_csv(cls, path: str) -> "FoodDatabase":
+        """Load a CSV with a name column and per-100 g nutrient columns"""
+        names, rows, servings = [], [], []
+        with open(path, newline="", encoding="utf-8") as handle:
+            reader = csv.DictReader(handle)
+            columns = {header: HEADER_ALIASES.get(header.strip().lower()) for header in reader.fieldnames or []}
+            for record in reader:
+                values = {columns[header]: value for header, value in record.items() if columns.get(header)}
+                name = (values.get("name") or "").strip()
+                if not name:
+                    continue
+                names.append(name)
+                rows.append([_number(values.get(column)) for column in COLUMNS])
+                servings.append(_number(values.get("serving_g")) or DEFAULT_SERVING_G)
+        nutrients = np.array(rows, dtype=np.float32).reshape(len(rows), len(COLUMNS))
+        return cls(names, nutrients, np.array(servings, dtype=np.float32))
+
+    def save(self, directory: str):
+        """Write the table as .npy columns plus a names file, for open() to memory-map"""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "nutrients.npy"), self.nutrients)
+        np.save(os.path.join(directory, "servings.npy"), self.servings)
+        with open(os.path.join(directory, "names.json"), "w", encoding="utf-8") as handle:
+            json.dump(self.names, handle)
+
+    @classmethod
+    def open(cls, directory: str) -> "FoodDatabase":
+        """Open a table written by save(); the nutrient columns are memory-mapped"""
+        with open(os.path.join(directory, "names.json"), encoding="utf-8") as handle:
+            names = json.load(handle)
+        nutrients = np.load(os.path.join(directory, "nutrients.npy"), mmap_mode="r")
+        servings = np.load(os.path.join(directory, "servings.npy"), mmap_mode="r")
+        return cls(names, nutrients, servings)
+
+    def _prefix_rows(self, prefix: str) -> List[int]:
+        start = bisect.bisect_left(self._prefixes, (prefix,))
+        rows = []
+        for word, row in self._prefixes[start:]:
+            if not word.startswith(prefix):
+                break
+            rows.append(row)
+        return rows
+
+    def search(self, query: str, limit: int = 10, min_score: float = 0.3) -> List[dict]:
+        """Foods whose names best match the query, best first"""
+        key = normalize_name(query)
+        if not key or not len(self):
+            return []
+
+        scores = Counter()
+        query_grams = trigrams(key)
+        postings = [self._trigrams[gram] for gram in query_grams if gram in self._trigrams]
+        if postings:
+            rows, shared = np.unique(np.concatenate(postings), return_counts=True)
+            # Dice coefficient of the two trigram sets
+            dice = 2 * shared / (len(query_grams) + self._trigram_counts[rows])
+            scores.update(dict(zip(rows.tolist(), dice.tolist())))
+
+        # Every query word starting a word of the name is a strong match
+        words = key.split()
+        prefix_hits = Counter()
+        for word in words:
+            for row in set(self._prefix_rows(word)):
+                prefix_hits[row] += 1
+        for row, hits in prefix_hits.items():
+            if hits == len(words):
+                scores[row] = max(scores[row], 0.8 + 0.1 * (len(key) / len(self._keys[row])))
+
+        exact = self._exact.get(key)
+        if exact is not None:
+            scores[exact] = 1.0
+
+        ranked = sorted(
+            ((score, row) for row, score in scores.items() if score >= min_score),
+            key=lambda item: (-item[0], len(self._keys[item[1]]), item[1]),
+        )
+        return [self.food(row, score) for score, row in ranked[:limit]]
+
+    def best_match(self, query: str, min_score: float = 0.5) -> Optional[dict]:
+        matches = self.search(query, limit=1, min_score=min_score)
+        return matches[0] if matches else None
+
+    def food(self, row: int, score: float = 1.0) -> dict:
+        """A row as per-100 g nutrients plus a nutrition dict for one serving"""
+        per_100g = {column: round(float(value), 2) for column, value in zip(COLUMNS, self.nutrients[row])}
+        serving_g = float(self.servings[row])
+        factor = serving_g / 100
+        nutrition = {
+            name: f"{round(per_100g[column] * factor, 1):g}{'' if unit == 'kcal' else unit}"
+            for name, (column, unit) in NUTRIENT_FIELDS.items()
+        }
+        return {
+            "name": self.names[row],
+            "score": round(score, 3),
+            "serving_g": serving_g,
+            "per_100g": per_100g,
+            "nutrition": nutrition,
+        }
+
+
+def load_food_database(path: str) -> FoodDatabase:
+    """Open a compiled table directory or load a CSV; an empty table if neither exists"""
+    if os.path.isdir(path):
+        return FoodDatabase.open(path)
+    if os.path.isfile(path):
+        return FoodDatabase.from_csv(path)
+    print(f"No local food database at {path}; offline nutrition lookup is disabled")
+    return FoodDatabase.empty()
@@ -0,0 +1,238 @@
+import abc
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+from typing import BinaryIO, Optional, Union
+
+import gridfs
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo.errors import DuplicateKeyError
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+IMAGE_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+THUMBNAIL_SIZE = (160, 160)
+THUMBNAIL_QUALITY = 70
+
+CONTENT_TYPES = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "GIF": "image/gif",
+    "WEBP": "image/webp",
+    "BMP": "image/bmp",
+    "HEIF": "image/heif",
+}
+
+
+# An image as bytes, or as a binary file (e.g. a spooled upload) read from its start
+ImageSource = Union[bytes, BinaryIO]
+
+
+def open_source(source: ImageSource) -> BinaryIO:
+    """A binary file positioned at the start of the image, without copying a file source"""
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    source.seek(0)
+    return source
+
+
+def read_source(source: ImageSource) -> bytes:
+    return source if isinstance(source, bytes) else open_source(source).read()
+
+
+def source_length(source: ImageSource) -> int:
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    return source.seek(0, io.SEEK_END)
+
+
+def image_id_for(source: ImageSource) -> str:
+    """Images are content-addressed: the id is the SHA-256 of the bytes"""
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    digest = hashlib.sha256()
+    file = open_source(source)
+    for chunk in iter(lambda: file.read(64 * 1024), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_valid_image_id(image_id: str) -> bool:
+    return bool(IMAGE_ID_PATTERN.match(image_id))
+
+
+def sniff_content_type(source: ImageSource, default: str = "application/octet-stream") -> str:
+    """Detect the image format from its header rather than trusting the client"""
+    try:
+        with Image.open(open_source(source)) as image:
+            return CONTENT_TYPES.get(image.format, default)
+    except (UnidentifiedImageError, OSError):
+        return default
+
+
+def make_thumbnail(source: ImageSource) -> Optional[str]:
+    """Small base64 JPEG preview for list views, or None if the bytes are not an image"""
+    try:
+        with Image.open(open_source(source)) as image:
+            # JPEGs can be decoded at a fraction of their size, far cheaper than full size
+            image.draft("RGB", THUMBNAIL_SIZE)
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(THUMBNAIL_SIZE)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+    except (UnidentifiedImageError, OSError):
+        return None
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+class StoredImage:
+    """Metadata of an image held in an ImageStore"""
+
+    def __init__(self, image_id: str, length: int, content_type: str):
+        self.image_id = image_id
+        self.length = length
+        self.content_type = content_type
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.image_id}"'
+
+
+class ImageStore(abc.ABC):
+    """Content-addressed async blob store for food images"""
+
+    @abc.abstractmethod
+    async def put(self, source: ImageSource, content_type: str, image_id: Optional[str] = None) -> str:
+        """Store the image once and return its id; storing it again is a no-op.
+
+        File sources are copied in chunks. Pass image_id when the content hash
+        is already known to save hashing the image again.
+        """
+
+    @abc.abstractmethod
+    async def info(self, image_id: str) -> Optional[StoredImage]:
+        """Length and content type of a stored image, or None if it is not stored"""
+
+    @abc.abstractmethod
+    def iter_range(self, image_id: str, start: int, end: int, chunk_size: int = 64 * 1024):
+        """Async iterator over the bytes in [start, end], in chunks"""
+
+
+class GridFSImageStore(ImageStore):
+    """Images kept in MongoDB GridFS, using the content hash as the file _id"""
+
+    def __init__(self, database, bucket_name: str = "images"):
+        self.database = database
+        self.bucket_name = bucket_name
+        self.files = database[f"{bucket_name}.files"]
+
+    def bucket(self) -> AsyncIOMotorGridFSBucket:
+        # Motor buckets bind to the event loop they are created on and are cheap
+        # to build, so make one per operation instead of at import time
+        return AsyncIOMotorGridFSBucket(self.database, bucket_name=self.bucket_name)
+
+    async def put(self, source: ImageSource, content_type: str, image_id: Optional[str] = None) -> str:
+        image_id = image_id or image_id_for(source)
+        if await self.files.find_one({"_id": image_id}, {"_id": 1}) is None:
+            try:
+                await self.bucket().upload_from_stream_with_id(
+                    image_id, image_id, open_source(source), metadata={"contentType": content_type}
+                )
+            except (DuplicateKeyError, gridfs.errors.FileExists):
+                # Another request stored the same image first
+                pass
+        return image_id
+
+    async def info(self, image_id: str) -> Optional[StoredImage]:
+        doc = await self.files.find_one({"_id": image_id}, {"length": 1, "metadata": 1})
+        if doc is None:
+            return None
+        content_type = (doc.get("metadata") or {}).get("contentType") or "application/octet-stream"
+        return StoredImage(image_id, doc["length"], content_type)
+
+    async def iter_range(self, image_id: str, start: int, end: int, chunk_size: int = 64 * 1024):
+        grid_out = await self.bucket().open_download_stream(image_id)
+        grid_out.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await grid_out.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class FileSystemImageStore(ImageStore):
+    """Images kept on local disk under root/<first two hex chars>/<id>.
+
+    File I/O runs in worker threads so it never blocks the event loop.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, image_id: str) -> str:
+        return os.path.join(self.root, image_id[:2], image_id)
+
+    def _write(self, image_id: str, source: ImageSource, content_type: str):
+        path = self._path(image_id)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file and rename so readers never see partial images
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                shutil.copyfileobj(open_source(source), f)
+            with open(f"{path}.json", "w") as f:
+                json.dump({"content_type": content_type}, f)
+            os.replace(tmp_path, path)
+
+    def _info(self, image_id: str) -> Optional[StoredImage]:
+        path = self._path(image_id)
+        try:
+            length = os.path.getsize(path)
+        except FileNotFoundError:
+            return None
+        try:
+            with open(f"{path}.json") as f:
+                content_type = json.load(f).get("content_type")
+        except (FileNotFoundError, ValueError):
+            content_type = None
+        return StoredImage(image_id, length, content_type or "application/octet-stream")
+
+    async def put(self, source: ImageSource, content_type: str, image_id: Optional[str] = None) -> str:
+        image_id = image_id or image_id_for(source)
+        await asyncio.to_thread(self._write, image_id, source, content_type)
+        return image_id
+
+    async def info(self, image_id: str) -> Optional[StoredImage]:
+        return await asyncio.to_thread(self._info, image_id)
+
+    async def iter_range(self, image_id: str, start: int, end: int, chunk_size: int = 64 * 1024):
+        f = await asyncio.to_thread(open, self._path(image_id), "rb")
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            f.close()
+
+
+def create_image_store(kind: str, database=None, path: Optional[str] = None) -> ImageStore:
+    """Build the image store selected by configuration ("gridfs" or "filesystem")"""
+    if kind == "gridfs":
+        return GridFSImageStore(database)
+    if kind == "filesystem":
+        return FileSystemImageStore(path or "images")
+    raise ValueError(f"Unknown image store: {kind}")
@@ -0,0 +1,82 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# Bulk imports deduplicate on a client-supplied key, unique per user
+IDEMPOTENCY_KEY_INDEX = IndexModel(
+    [("user_id", ASCENDING), ("idempotency_key", ASCENDING)],
+    name="user_idempotency_key",
+    unique=True,
+    partialFilterExpression={"idempotency_key": {"$exists": True}},
+)
+
+# Every index the application relies on, per collection. Reads filter on
+# user_id plus a timestamp range and sort on (timestamp, id), so one compound
+# index serves both the filter and the sort in either direction.
+INDEXES = {
+    "food_entries": [
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], name="user_timestamp"),
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        IDEMPOTENCY_KEY_INDEX,
+    ],
+    "weight_records": [
+        IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], name="user_timestamp"),
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        IDEMPOTENCY_KEY_INDEX,
+    ],
+    "daily_rollups": [
+        IndexModel([("user_id", ASCENDING), ("date", ASCENDING)], name="user_date", unique=True),
+    ],
+    "user_profiles": [
+        IndexModel([("user_id", ASCENDING)], name="user_id", unique=True),
+    ],
+    # Workers claim the oldest pending (or lease-expired) job; finished jobs expire after a week
+    "analysis_jobs": [
+        IndexModel([("id", ASCENDING)], name="id", unique=True),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created"),
+        IndexModel([("created_at", ASCENDING)], name="expire", expireAfterSeconds=7 * 24 * 3600),
+    ],
+}
+
+# Index options that make two indexes with the same keys different
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+def _index_differs(existing: dict, declared: dict) -> bool:
+    if list(existing["key"]) != list(declared["key"].items()):
+        return True
+    return any(existing.get(option) != declared.get(option) for option in COMPARED_OPTIONS)
+
+
+async def ensure_indexes(db, indexes: dict = None) -> dict:
+    """Create missing indexes and rebuild ones whose definition changed.
+
+    Indexes that are not declared here are left alone. Returns what was done
+    per collection so callers can log it.
+    """
+    report = {}
+    for collection_name, models in (indexes or INDEXES).items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        actions = {"created": [], "rebuilt": [], "failed": []}
+
+        for model in models:
+            declared = model.document
+            name = declared["name"]
+            current = existing.get(name)
+            if current is not None and not _index_differs(current, declared):
+                continue
+
+            try:
+                if current is not None:
+                    await collection.drop_index(name)
+                options = {option: value for option, value in declared.items() if option != "key"}
+                await collection.create_index(list(declared["key"].items()), **options)
+            except OperationFailure as e:
+                # e.g. a unique index over data that still has duplicates
+                print(f"Could not build index {collection_name}.{name}: {str(e)}")
+                actions["failed"].append(name)
+                continue
+            actions["rebuilt" if current is not None else "created"].append(name)
+
+        report[collection_name] = actions
+    return report
@@ -0,0 +1,210 @@
+"""Background jobs kept in MongoDB and run by a pool of worker tasks.
+
+A job is one document. Workers claim the oldest pending job with a lease; a
+job whose worker stopped without finishing it (a crash or a restart) is
+claimed again once the lease has run out, so queued work survives restarts
+and any worker process can pick it up. Jobs that keep failing that way are
+given up on after max_attempts claims.
+"""
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from pymongo import ASCENDING, ReturnDocument
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+
+class JobQueue:
+    """Job documents in one collection, claimed with leases"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def create(self, fields: dict) -> dict:
+        now = datetime.utcnow()
+        job = {
+            **fields,
+            "id": str(uuid.uuid4()),
+            "status": PENDING,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.collection.insert_one(job)
+        job.pop("_id", None)
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"id": job_id}, {"_id": 0})
+
+    async def claim(self, worker: str, lease: float) -> Optional[dict]:
+        """Take the oldest pending job, or a running one whose lease has expired"""
+        now = datetime.utcnow()
+        job = await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": PENDING},
+                {"status": RUNNING, "lease_expires_at": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "worker": worker,
+                    "lease_expires_at": now + timedelta(seconds=lease),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is not None:
+            job.pop("_id")
+        return job
+
+    async def finish(self, job_id: str, worker: str, status: str, fields: dict) -> bool:
+        """Record a job's outcome, unless its lease has passed to another worker"""
+        result = await self.collection.update_one(
+            {"id": job_id, "status": RUNNING, "worker": worker},
+            {
+                "$set": {**fields, "status": status, "updated_at": datetime.utcnow()},
+                "$unset": {"lease_expires_at": ""},
+            },
+        )
+        return result.modified_count > 0
+
+    async def release(self, job_id: str, worker: str):
+        """Put a job back in the queue without counting the interrupted attempt"""
+        await self.collection.update_one(
+            {"id": job_id, "status": RUNNING, "worker": worker},
+            {
+                "$set": {"status": PENDING, "updated_at": datetime.utcnow()},
+                "$unset": {"worker": "", "lease_expires_at": ""},
+                "$inc": {"attempts": -1},
+            },
+        )
+
+
+class JobWorkers:
+    """Worker tasks running queued jobs through `handler`.
+
+    The handler gets the job document and returns the fields to store with
+    the finished job; an exception fails the job with its message. Workers
+    poll the queue every poll_interval and are woken at once by notify().
+    """
+
+    def __init__(self, queue: JobQueue, handler: Callable[[dict], Awaitable[dict]], concurrency: int = 4,
+                 lease: float = 120.0, poll_interval: float = 1.0, max_attempts: int = 3):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._listeners: Dict[str, Set[asyncio.Event]] = {}
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self, timeout: float = 0.0):
+        """Stop claiming jobs and give running ones `timeout` seconds to finish.
+
+        Jobs still running after that are cancelled and go back to the queue.
+        """
+        self._stopping = True
+        self.notify()
+        if self._tasks and timeout > 0:
+            await asyncio.wait(self._tasks, timeout=timeout)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """A job was queued: wake an idle worker now instead of at its next poll"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _changed(self, job_id: str):
+        for event in self._listeners.get(job_id, ()):
+            event.set()
+
+    async def _work(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                job = await self.queue.claim(self.worker_id, self.lease)
+            except Exception as e:
+                print(f"Could not claim a job: {str(e)}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: dict):
+        job_id = job["id"]
+        self._changed(job_id)
+        try:
+            if job["attempts"] > self.max_attempts:
+                await self.queue.finish(job_id, self.worker_id, FAILED, {
+                    "error": f"Gave up after {self.max_attempts} interrupted attempts",
+                })
+                return
+            try:
+                fields = await self.handler(job)
+            except asyncio.CancelledError:
+                await asyncio.shield(self.queue.release(job_id, self.worker_id))
+                raise
+            except Exception as e:
+                print(f"Job {job_id} failed: {str(e)}")
+                await self.queue.finish(job_id, self.worker_id, FAILED, {"error": str(e)})
+            else:
+                await self.queue.finish(job_id, self.worker_id, DONE, fields)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The lease runs out and another worker retries the job
+            print(f"Could not record the outcome of job {job_id}: {str(e)}")
+        finally:
+            self._changed(job_id)
+
+    async def watch(self, job_id: str):
+        """Yield the job now and after every change (at least every poll_interval) until it finishes"""
+        event = asyncio.Event()
+        self._listeners.setdefault(job_id, set()).add(event)
+        try:
+            while True:
+                event.clear()
+                job = await self.queue.get(job_id)
+                if job is None:
+                    return
+                yield job
+                if job["status"] in FINISHED:
+                    return
+                try:
+                    await asyncio.wait_for(event.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            listeners = self._listeners.get(job_id)
+            if listeners is not None:
+                listeners.discard(event)
+                if not listeners:
+                    del self._listeners[job_id]
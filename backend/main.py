@@ -0,0 +1,84 @@
+"""Production entry point: uvicorn worker processes sharing one port.
+
+Run from the backend directory:
+
+    python main.py                  # WEB_CONCURRENCY workers, or one per available CPU core
+    python main.py --workers 4 --port 8001
+
+Every worker imports server:app itself and opens its own Mongo and HTTP
+pools in the app's lifespan. On SIGTERM the workers stop accepting
+connections, let in-flight requests finish, then give running analysis jobs
+up to SHUTDOWN_GRACE_SECONDS before closing their pools.
+
+With more than one worker, metrics are shared through snapshot files in
+METRICS_MULTIPROC_DIR (a temporary directory unless set), so GET /metrics
+reports the totals of all workers whichever one serves it.
+"""
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+
+import uvicorn
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def available_cpus() -> int:
+    """CPU cores this process may run on (fewer than the machine's in a limited container)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def default_workers() -> int:
+    return int(os.getenv("WEB_CONCURRENCY", "0")) or available_cpus()
+
+
+def prepare_metrics_dir() -> str:
+    """Point the workers at an empty metrics directory; returns it when it is a temporary one"""
+    directory = os.getenv("METRICS_MULTIPROC_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        # Snapshots of a previous run would be added to this run's totals
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            os.remove(path)
+        return None
+    os.environ["METRICS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="metrics-")
+    return os.environ["METRICS_MULTIPROC_DIR"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8001")))
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--grace", type=float, default=float(os.getenv("SHUTDOWN_GRACE_SECONDS", "30")),
+                        help="seconds in-flight requests, and then running jobs, get to finish on shutdown")
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    args = parser.parse_args()
+
+    # Workers are spawned processes that read their settings from the environment
+    os.environ["SHUTDOWN_GRACE_SECONDS"] = str(args.grace)
+    metrics_dir = prepare_metrics_dir() if args.workers > 1 else None
+    try:
+        uvicorn.run(
+            "server:app",
+            app_dir=BACKEND_DIR,
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            timeout_graceful_shutdown=int(args.grace),
+            proxy_headers=True,
+            forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+            log_level=args.log_level,
+        )
+    finally:
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Maintenance commands for the nutrition tracker database.
+
+Run from the backend directory, e.g.:
+
+    python manage.py migrate-images
+"""
+import asyncio
+
+import typer
+from pymongo import UpdateOne
+
+import server
+from food_db import FoodDatabase
+from nutrition import normalize_nutrition
+from rollups import check_rollups as find_rollup_mismatches, rebuild_rollups as recompute_rollups
+
+cli = typer.Typer(help="Nutrition tracker maintenance commands")
+
+
+async def _food_entries_changed(user_ids):
+    """Bump the users' food data version so clients revalidating after a repair get fresh data"""
+    await server.data_versions.bump("food_entries", [user_id for user_id in user_ids if user_id is not None])
+
+
+@cli.command("ensure-indexes")
+def ensure_indexes():
+    """Create or rebuild the indexes declared in indexes.py"""
+    report = asyncio.run(server.ensure_indexes(server.db))
+    for collection_name, actions in report.items():
+        summary = ", ".join(f"{action}: {', '.join(names)}" for action, names in actions.items() if names)
+        typer.echo(f"{collection_name}: {summary or 'up to date'}")
+
+
+async def _migrate_images(batch_size: int):
+    """Returns how many entries were migrated, and the ids of entries whose image could not be decoded"""
+    collection = server.food_entries.collection
+    migrated = 0
+    malformed = []
+    user_ids = set()
+    cursor = collection.find(
+        {"image_data": {"$exists": True}},
+        {"_id": 1, "user_id": 1, "image_data": 1},
+        batch_size=batch_size,
+    )
+    async for entry in cursor:
+        update = {"$unset": {"image_data": ""}}
+        if entry["image_data"]:
+            try:
+                image = server.decode_image_data(entry["image_data"])
+            except ValueError:
+                # Left in place for a look by hand; the rest of the entries still get migrated
+                malformed.append(entry["_id"])
+                continue
+            image_id, thumbnail = await server.store_image(image)
+            update["$set"] = {"image_id": image_id, "thumbnail": thumbnail}
+        await collection.update_one({"_id": entry["_id"]}, update)
+        user_ids.add(entry.get("user_id"))
+        migrated += 1
+    await _food_entries_changed(user_ids)
+    return migrated, malformed
+
+
+@cli.command("migrate-images")
+def migrate_images(batch_size: int = 100):
+    """Move inline base64 images out of food_entries into the image store"""
+    migrated, malformed = asyncio.run(_migrate_images(batch_size))
+    typer.echo(f"Migrated {migrated} food entries")
+    if malformed:
+        typer.echo(f"Skipped {len(malformed)} food entries whose image_data is not base64:")
+        for entry_id in malformed:
+            typer.echo(f"  {entry_id}")
+
+
+async def _backfill_nutrients(batch_size: int, all_entries: bool) -> int:
+    collection = server.food_entries.collection
+    query = {} if all_entries else {"nutrients": {"$exists": False}}
+    updated = 0
+    batch = []
+    user_ids = set()
+    async for entry in collection.find(query, {"_id": 1, "user_id": 1, "nutrition": 1}, batch_size=batch_size):
+        nutrients = normalize_nutrition(entry.get("nutrition"))
+        batch.append(UpdateOne({"_id": entry["_id"]}, {"$set": {"nutrients": nutrients}}))
+        user_ids.add(entry.get("user_id"))
+        if len(batch) >= batch_size:
+            updated += (await collection.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        updated += (await collection.bulk_write(batch, ordered=False)).modified_count
+    await _food_entries_changed(user_ids)
+    return updated
+
+
+@cli.command("backfill-nutrients")
+def backfill_nutrients(batch_size: int = 500, all_entries: bool = typer.Option(False, "--all")):
+    """Store normalized numeric nutrients on food entries saved before they existed"""
+    updated = asyncio.run(_backfill_nutrients(batch_size, all_entries))
+    typer.echo(f"Backfilled nutrients on {updated} food entries")
+
+
+async def _rebuild_rollups(user_id: str) -> int:
+    entries = server.food_entries.collection
+    if user_id:
+        user_ids = {user_id}
+    else:
+        # Users with entries, and users whose stale rollups are about to be deleted
+        user_ids = set(await entries.distinct("user_id")) | set(await server.daily_rollups.distinct("user_id"))
+    written = await recompute_rollups(entries, server.daily_rollups, user_id)
+    await _food_entries_changed(user_ids)
+    return written
+
+
+@cli.command("rebuild-rollups")
+def rebuild_rollups(user_id: str = typer.Option(None, help="Only rebuild this user's rollups")):
+    """Recompute daily_rollups from food_entries"""
+    written = asyncio.run(_rebuild_rollups(user_id))
+    typer.echo(f"Rebuilt {written} daily rollups")
+
+
+@cli.command("check-rollups")
+def check_rollups(user_id: str = typer.Option(None, help="Only check this user's rollups")):
+    """Compare daily_rollups with totals computed from food_entries"""
+    mismatches = asyncio.run(find_rollup_mismatches(server.food_entries.collection, server.daily_rollups, user_id))
+    for mismatch in mismatches:
+        fields = ", ".join(
+            f"{field} expected {values['expected']} stored {values['stored']}"
+            for field, values in mismatch["fields"].items()
+        )
+        typer.echo(f"{mismatch['user_id']} {mismatch['date']}: {fields}")
+    if mismatches:
+        typer.echo(f"{len(mismatches)} rollups out of date; run rebuild-rollups to repair")
+        raise typer.Exit(code=1)
+    typer.echo("Rollups are consistent")
+
+
+@cli.command("build-food-db")
+def build_food_db(csv_path: str, output_dir: str):
+    """Compile a nutrition CSV (e.g. a USDA export) into a memory-mapped food table"""
+    database = FoodDatabase.from_csv(csv_path)
+    database.save(output_dir)
+    typer.echo(f"Wrote {len(database)} foods to {output_dir}; set FOOD_DB_PATH={output_dir} to use it")
+
+
+if __name__ == "__main__":
+    cli()
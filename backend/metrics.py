@@ -0,0 +1,448 @@
+"""Request timing, named spans and Prometheus metrics.
+
+Metrics live in one in-process registry rendered in the Prometheus text
+format by GET /metrics. With several worker processes, METRICS_MULTIPROC_DIR
+names a directory where every worker writes snapshots of its registry, and
+/metrics adds up the snapshots of all workers (SharedMetrics).
+
+Handlers wrap their stages in span("name"); each span is observed in a
+histogram and listed in the response's Server-Timing header, so a slow
+request shows which stage took the time.
+
+Setting PROFILE_SLOW_REQUESTS to a number of seconds turns on a sampling
+profiler. Requests that take longer have the stacks sampled while they ran
+written to PROFILE_DIR as folded stacks, the input format of flame graph tools.
+"""
+import asyncio
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter as StackCounter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_LABEL_ESCAPES = str.maketrans({"\\": r"\\", '"': r"\"", "\n": r"\n"})
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value).translate(_LABEL_ESCAPES)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Metric:
+    """A named metric with labels; subclasses define how samples are rendered"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), function: Callable = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def set_function(self, function: Callable):
+        """Compute the values at scrape time: function returns {label values tuple: value}"""
+        self.function = function
+
+    def collect(self) -> dict:
+        """Current values by label values tuple"""
+        if self.function is not None:
+            return dict(self.function())
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, snapshots: List[Tuple[str, bool, dict]]) -> dict:
+        """Combine the values of every worker, given as (worker, alive, values): summed by default"""
+        merged = {}
+        for _, _, values in snapshots:
+            for key, value in values.items():
+                merged[key] = merged.get(key, 0.0) + value
+        return merged
+
+    @property
+    def merged_labelnames(self) -> Tuple[str, ...]:
+        return self.labelnames
+
+    def samples(self, values: dict = None, labelnames: Tuple[str, ...] = None):
+        values = self.collect() if values is None else values
+        labelnames = self.labelnames if labelnames is None else labelnames
+        for key, value in sorted(values.items()):
+            yield self.name, _format_labels(labelnames, key), value
+
+    def render(self, values: dict = None, labelnames: Tuple[str, ...] = None) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(
+            f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples(values, labelnames)
+        )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down.
+
+    Across workers only live processes count, combined as `aggregate` says:
+    "sum", "max", or "all" to keep each worker's value under a worker label.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), function: Callable = None,
+                 aggregate: str = "sum"):
+        super().__init__(name, documentation, labelnames, function)
+        self.aggregate = aggregate
+
+    def merge(self, snapshots):
+        live = [snapshot for snapshot in snapshots if snapshot[1]]
+        if self.aggregate == "all":
+            return {key + (worker,): value for worker, _, values in live for key, value in values.items()}
+        if self.aggregate == "max":
+            merged = {}
+            for _, _, values in live:
+                for key, value in values.items():
+                    merged[key] = max(merged.get(key, value), value)
+            return merged
+        return super().merge(live)
+
+    @property
+    def merged_labelnames(self):
+        return self.labelnames + ("worker",) if self.aggregate == "all" else self.labelnames
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+    def collect(self) -> dict:
+        with self._lock:
+            return {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+
+    def merge(self, snapshots):
+        merged = {}
+        for _, _, values in snapshots:
+            for key, (counts, total) in values.items():
+                merged_counts, merged_total = merged.get(key, ([0] * len(counts), 0.0))
+                merged[key] = ([a + b for a, b in zip(merged_counts, counts)], merged_total + total)
+        return merged
+
+    def samples(self, values: dict = None, labelnames: Tuple[str, ...] = None):
+        values = self.collect() if values is None else values
+        labelnames = self.labelnames if labelnames is None else labelnames
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket", _format_labels(labelnames, key, f'le="{le}"'), cumulative
+            yield f"{self.name}_sum", _format_labels(labelnames, key), total
+            yield f"{self.name}_count", _format_labels(labelnames, key), cumulative
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+    def snapshot(self) -> dict:
+        """Values of every metric in a JSON-serializable form"""
+        return {
+            name: [[list(key), value] for key, value in metric.collect().items()]
+            for name, metric in self._metrics.items()
+        }
+
+    def render_merged(self, snapshots: List[Tuple[str, bool, dict]]) -> str:
+        """Render the combined snapshots of several workers, given as (worker, alive, snapshot)"""
+        blocks = []
+        for name, metric in self._metrics.items():
+            values = [
+                (worker, alive, {tuple(key): value for key, value in snapshot.get(name, ())})
+                for worker, alive, snapshot in snapshots
+            ]
+            blocks.append(metric.render(metric.merge(values), metric.merged_labelnames))
+        return "\n".join(blocks) + "\n"
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedMetrics:
+    """Metrics of all worker processes, exchanged through snapshot files in one directory.
+
+    Each worker writes its registry to <directory>/<pid>.json every `interval`
+    seconds and when it stops; rendering writes this worker's file first and
+    then combines all of them, so other workers' values lag by up to
+    `interval`. Counters and histograms of workers that have exited are kept,
+    gauges only come from live workers.
+    """
+
+    def __init__(self, registry: Registry, directory: str, interval: float = 5.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self.path = os.path.join(directory, f"{os.getpid()}.json")
+
+    def write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as handle:
+            json.dump(self.registry.snapshot(), handle)
+        os.replace(temporary, self.path)
+
+    async def run(self):
+        """Write snapshots until cancelled"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.write()
+            except OSError as e:
+                print(f"Could not write metrics snapshot: {str(e)}")
+
+    def render(self) -> str:
+        self.write()
+        snapshots = []
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.json"))):
+            worker = os.path.splitext(os.path.basename(path))[0]
+            try:
+                with open(path) as handle:
+                    snapshot = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            alive = not worker.isdigit() or _process_alive(int(worker))
+            snapshots.append((worker, alive, snapshot))
+        return self.registry.render_merged(snapshots)
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests handled", ("method", "route", "status")
+))
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time to produce the response headers", ("method", "route")
+))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests being handled", aggregate="sum"
+))
+SPAN_DURATION = REGISTRY.register(Histogram(
+    "span_duration_seconds", "Time spent in named request stages", ("span",)
+))
+UPSTREAM_REQUESTS = REGISTRY.register(Counter(
+    "upstream_requests_total", "Calls to upstream APIs by outcome", ("service", "endpoint", "outcome")
+))
+UPSTREAM_DURATION = REGISTRY.register(Histogram(
+    "upstream_request_duration_seconds", "Latency of upstream API calls", ("service", "endpoint")
+))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "cache_lookups_total", "Cache lookups by result", ("cache", "result")
+))
+CACHE_HIT_RATIO = REGISTRY.register(Gauge(
+    "cache_hit_ratio", "Share of cache lookups that were hits", ("cache",), aggregate="all"
+))
+CIRCUIT_OPEN = REGISTRY.register(Gauge(
+    "upstream_circuit_open", "1 while the upstream circuit breaker is not closed", ("service",), aggregate="max"
+))
+
+_request_spans: ContextVar[Optional[list]] = ContextVar("request_spans", default=None)
+
+
+@contextmanager
+def span(name: str):
+    """Time a stage of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        SPAN_DURATION.observe(elapsed, span=name)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((name, elapsed))
+
+
+def server_timing(spans: list, total: float) -> str:
+    """Server-Timing header value with the time of each span name"""
+    durations = {}
+    for name, elapsed in spans:
+        durations[name] = durations.get(name, 0.0) + elapsed
+    parts = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in durations.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_label(path: str) -> str:
+    """Upstream path with ids replaced, to keep label values few ("/recipes/{id}/...")"""
+    return _ID_SEGMENT.sub("/{id}", path)
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that records rendering the body as the "serialize" span"""
+
+    def render(self, content) -> bytes:
+        with span("serialize"):
+            return super().render(content)
+
+
+class StackSampler:
+    """Samples the stacks of all threads at a fixed interval into a ring buffer"""
+
+    def __init__(self, interval: float = 0.005, window: float = 60.0):
+        self.interval = interval
+        self._samples = deque(maxlen=int(window / interval))
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self._samples.append((now, ";".join(reversed(stack))))
+
+    def folded(self, start: float, end: float) -> str:
+        """Samples taken between start and end (perf_counter) as folded stacks"""
+        counts = StackCounter(stack for taken, stack in list(self._samples) if start <= taken <= end)
+        return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+class SlowRequestProfiler:
+    """Writes the samples taken during requests slower than the threshold to files"""
+
+    def __init__(self, threshold: float, directory: str, interval: float = 0.005):
+        self.threshold = threshold
+        self.directory = directory
+        self.sampler = StackSampler(interval)
+
+    def record(self, route: str, start: float, end: float) -> Optional[str]:
+        if end - start < self.threshold:
+            return None
+        folded = self.sampler.folded(start, end)
+        if not folded:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{slug}-{int((end - start) * 1000)}ms.folded")
+        with open(path, "w") as handle:
+            handle.write(folded)
+        print(f"Slow request {route} took {end - start:.3f}s; profile written to {path}")
+        return path
+
+
+async def observe_request(request, call_next, profiler: Optional[SlowRequestProfiler] = None):
+    """HTTP middleware body: in-flight gauge, latency histogram, spans and Server-Timing"""
+    spans = []
+    token = _request_spans.set(spans)
+    IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - started
+        IN_FLIGHT.dec()
+        _request_spans.reset(token)
+        route = request.scope.get("route")
+        route = route.path if route is not None else "unmatched"
+        REQUESTS.inc(method=request.method, route=route, status=str(status))
+        REQUEST_DURATION.observe(elapsed, method=request.method, route=route)
+        if profiler is not None:
+            profiler.record(f"{request.method} {route}", started, started + elapsed)
+    response.headers["Server-Timing"] = server_timing(spans, elapsed)
+    return response
@@ -0,0 +1,119 @@
+import re
+from typing import Optional
+
+# Normalized nutrient fields stored on each food entry, with their canonical unit
+NUTRIENT_FIELDS = {
+    "calories": ("calories_kcal", "kcal"),
+    "carbs": ("carbs_g", "g"),
+    "protein": ("protein_g", "g"),
+    "fat": ("fat_g", "g"),
+    "fiber": ("fiber_g", "g"),
+    "sugar": ("sugar_g", "g"),
+}
+
+# Names used for the same nutrient in Spoonacular "nutrients"/"good"/"bad" lists
+NUTRIENT_ALIASES = {
+    "calories": "calories",
+    "energy": "calories",
+    "carbs": "carbs",
+    "carbohydrates": "carbs",
+    "protein": "protein",
+    "fat": "fat",
+    "total fat": "fat",
+    "fiber": "fiber",
+    "dietary fiber": "fiber",
+    "sugar": "sugar",
+    "sugars": "sugar",
+}
+
+# Factors converting a unit into the canonical unit of its dimension
+UNIT_FACTORS = {
+    "g": ("g", 1.0),
+    "mg": ("g", 0.001),
+    "µg": ("g", 0.000001),
+    "mcg": ("g", 0.000001),
+    "ug": ("g", 0.000001),
+    "kg": ("g", 1000.0),
+    "kcal": ("kcal", 1.0),
+    "cal": ("kcal", 1.0),
+    "calories": ("kcal", 1.0),
+    "kj": ("kcal", 1 / 4.184),
+}
+
+# A comma before exactly three digits groups thousands ("2,000"); otherwise it is a decimal comma ("0,5")
+AMOUNT_PATTERN = re.compile(
+    r"^\s*(?:(?P<grouped>\d{1,3}(?:,\d{3})+(?:\.\d+)?)|(?P<plain>\d+(?:[.,]\d+)?|\.\d+))\s*(?P<unit>[a-zA-Zµ]*)\s*$"
+)
+
+
+def parse_amount(value, canonical_unit: str) -> Optional[float]:
+    """Parse an amount such as "35g", "0.5 g", "250" or 120 into the canonical unit.
+
+    Values without a unit are taken to already be in the canonical unit.
+    Returns None when the value cannot be interpreted.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+
+    match = AMOUNT_PATTERN.match(value)
+    if not match:
+        return None
+    if match.group("grouped"):
+        amount = float(match.group("grouped").replace(",", ""))
+    else:
+        amount = float(match.group("plain").replace(",", "."))
+    unit = match.group("unit").lower()
+    if not unit:
+        return amount
+
+    dimension, factor = UNIT_FACTORS.get(unit, (None, None))
+    if dimension != canonical_unit:
+        return None
+    return amount * factor
+
+
+def _listed_amounts(nutrition: dict):
+    """Yield (nutrient, value) pairs from Spoonacular's list-shaped fields"""
+    for item in nutrition.get("nutrients") or []:
+        if isinstance(item, dict) and "name" in item:
+            amount = item.get("amount")
+            unit = item.get("unit")
+            yield item["name"], f"{amount}{unit}" if unit and amount is not None else amount
+    for key in ("good", "bad"):
+        for item in nutrition.get(key) or []:
+            if isinstance(item, dict) and "title" in item:
+                yield item["title"], item.get("amount")
+
+
+def normalize_nutrition(nutrition) -> dict:
+    """Convert a free-form nutrition dict into numeric fields with fixed units.
+
+    Top-level keys ("calories": "250", "carbs": "35g", ...) take precedence over
+    the per-nutrient lists of the Spoonacular nutrition widget. Nutrients that
+    are missing or unparseable are left out.
+    """
+    if not isinstance(nutrition, dict):
+        return {}
+
+    nutrients = {}
+    for name, (field, unit) in NUTRIENT_FIELDS.items():
+        amount = parse_amount(nutrition.get(name), unit)
+        if amount is not None:
+            nutrients[field] = round(amount, 3)
+
+    for listed_name, value in _listed_amounts(nutrition):
+        name = NUTRIENT_ALIASES.get(str(listed_name).strip().lower())
+        if name is None:
+            continue
+        field, unit = NUTRIENT_FIELDS[name]
+        if field in nutrients:
+            continue
+        amount = parse_amount(value, unit)
+        if amount is not None:
+            nutrients[field] = round(amount, 3)
+
+    return nutrients
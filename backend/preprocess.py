@@ -0,0 +1,68 @@
+"""Shrinking food photos before they are sent for recognition.
+
+Phones upload multi-megabyte photos, but food recognition only needs a
+modest resolution. Images are decoded, turned upright according to their
+EXIF orientation, downscaled and re-encoded as JPEG. Bytes that are not an
+image, or that would not get smaller, are sent as they are.
+"""
+import io
+import time
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from image_store import ImageSource, open_source, read_source, sniff_content_type, source_length
+
+EXIF_ORIENTATION = 0x0112
+
+
+class PreparedImage:
+    """Bytes to upload for recognition and what preprocessing did to get them"""
+
+    def __init__(self, data: bytes, content_type: str, original_bytes: int, elapsed_ms: float):
+        self.data = data
+        self.content_type = content_type
+        self.original_bytes = original_bytes
+        self.elapsed_ms = elapsed_ms
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data)
+
+    def report(self) -> dict:
+        return {
+            "original_bytes": self.original_bytes,
+            "upload_bytes": len(self.data),
+            "bytes_saved": self.bytes_saved,
+            "elapsed_ms": round(self.elapsed_ms, 2),
+        }
+
+
+def preprocess_image(source: ImageSource, max_side: int = 1024, quality: int = 85) -> PreparedImage:
+    """Downscale and re-encode an image for upload (CPU-bound; run it in a thread).
+
+    A file source is only read in full when it is sent as it is.
+    """
+    started = time.perf_counter()
+    original_bytes = source_length(source)
+    prepared, content_type = None, sniff_content_type(source, default="image/jpeg")
+    try:
+        with Image.open(open_source(source)) as image:
+            upright = image.getexif().get(EXIF_ORIENTATION, 1) == 1
+            if not (image.format == "JPEG" and upright and max(image.size) <= max_side):
+                # Let the JPEG decoder scale down while decoding instead of decoding full size
+                image.draft("RGB", (max_side, max_side))
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+                if image.mode != "RGB":
+                    image = image.convert("RGB")
+                buffer = io.BytesIO()
+                image.save(buffer, format="JPEG", quality=quality, optimize=True)
+                encoded = buffer.getvalue()
+                # A rotated image must be sent re-encoded even if that costs a few bytes
+                if len(encoded) < original_bytes or not upright:
+                    prepared, content_type = encoded, "image/jpeg"
+    except (UnidentifiedImageError, OSError):
+        pass
+    if prepared is None:
+        prepared = read_source(source)
+    return PreparedImage(prepared, content_type, original_bytes, (time.perf_counter() - started) * 1000)
@@ -0,0 +1,155 @@
+"""Pacing of calls to the upstream API.
+
+Token buckets keep the request rate under the provider's quota. The Mongo
+bucket keeps its state in one document so every worker process draws from
+the same bucket; the local bucket is for a single process. PrioritySemaphore
+bounds concurrency and lets interactive calls go ahead of background ones.
+"""
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a token would not be available within the allowed wait"""
+
+
+class TokenBucket:
+    """In-process token bucket: `rate` tokens per second, holding at most `burst`"""
+
+    def __init__(self, rate: float, burst: float, max_wait: float = 5.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+
+    def _wait_time(self, tokens: float) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    async def acquire(self, tokens: float = 1.0):
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            wait = self._wait_time(tokens)
+            if not wait:
+                return
+            if time.monotonic() + wait > deadline:
+                raise RateLimitExceeded(f"no token within {self.max_wait}s")
+            await asyncio.sleep(wait)
+
+
+class MongoTokenBucket:
+    """Token bucket shared by all workers through one MongoDB document.
+
+    The document holds the token count and when it was last updated. Takers
+    refill it for the time elapsed and write it back only if nobody else
+    changed it in the meantime, retrying otherwise.
+    """
+
+    def __init__(self, collection, name: str, rate: float, burst: float, max_wait: float = 5.0):
+        self.collection = collection
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+
+    async def _take(self, tokens: float) -> float:
+        """Take tokens if available; returns 0, or how long to wait before trying again"""
+        now = time.time()
+        doc = await self.collection.find_one({"_id": self.name})
+        if doc is None:
+            try:
+                await self.collection.insert_one({"_id": self.name, "tokens": self.burst - tokens, "updated_at": now})
+                return 0.0
+            except DuplicateKeyError:
+                return random.uniform(0, 0.005)
+
+        available = min(self.burst, doc["tokens"] + max(0.0, now - doc["updated_at"]) * self.rate)
+        if available < tokens:
+            return (tokens - available) / self.rate
+
+        result = await self.collection.update_one(
+            {"_id": self.name, "tokens": doc["tokens"], "updated_at": doc["updated_at"]},
+            {"$set": {"tokens": available - tokens, "updated_at": now}},
+        )
+        if result.matched_count:
+            return 0.0
+        # Another worker took a token first; retry shortly
+        return random.uniform(0, 0.005)
+
+    async def acquire(self, tokens: float = 1.0):
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            wait = await self._take(tokens)
+            if not wait:
+                return
+            if time.monotonic() + wait > deadline:
+                raise RateLimitExceeded(f"no token within {self.max_wait}s")
+            await asyncio.sleep(wait)
+
+
+def create_rate_limiter(kind: str, collection=None, name: str = "default", rate: float = 0.0,
+                        burst: float = 1.0, max_wait: float = 5.0):
+    """Build the configured token bucket, or None when rate limiting is off (rate <= 0)"""
+    if rate <= 0:
+        return None
+    if kind == "local":
+        return TokenBucket(rate, burst, max_wait)
+    if kind == "mongo":
+        return MongoTokenBucket(collection, name, rate, burst, max_wait)
+    raise ValueError(f"Unknown rate limiter: {kind}")
+
+
+class PrioritySemaphore:
+    """Semaphore that hands a freed slot to the waiter with the lowest priority number"""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters = []
+        self._order = itertools.count()
+
+    async def acquire(self, priority: int = 0):
+        if self._value > 0 and not self._waiters:
+            self._value -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # A slot handed over just as the waiter was cancelled goes to the next one
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._value += 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
@@ -0,0 +1,135 @@
+"""Per-day nutrition rollups.
+
+daily_rollups holds one document per (user_id, date) with the summed
+normalized nutrients of that day's food entries and their count. Writes to
+food_entries keep it current with atomic $inc updates, so summaries read one
+small document per day instead of scanning entries. The functions here can
+also rebuild rollups from food_entries and compare the two.
+"""
+from typing import Dict, List, Optional
+
+from pymongo import ReplaceOne, UpdateOne
+
+from nutrition import NUTRIENT_FIELDS
+
+ROLLUP_FIELDS = [field for field, _ in NUTRIENT_FIELDS.values()]
+
+# Sums that differ by less than this are float noise from repeated $inc
+TOLERANCE = 0.01
+
+
+def entry_date(entry: dict) -> str:
+    """Day an entry counts towards; timestamps are ISO strings"""
+    return entry["timestamp"][:10]
+
+
+def nutrient_increments(old: Optional[dict], new: Optional[dict]) -> dict:
+    """$inc document moving a day's totals from the old nutrients to the new ones"""
+    old = old or {}
+    new = new or {}
+    increments = {}
+    for field in ROLLUP_FIELDS:
+        delta = (new.get(field) or 0) - (old.get(field) or 0)
+        if delta:
+            increments[field] = delta
+    return increments
+
+
+async def apply_entry(rollups, entry: dict, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) an entry from its day's rollup"""
+    nutrients = entry.get("nutrients") or {}
+    increments = nutrient_increments(None, nutrients) if sign > 0 else nutrient_increments(nutrients, None)
+    increments["entries_count"] = sign
+    key = {"user_id": entry["user_id"], "date": entry_date(entry)}
+    await rollups.update_one(key, {"$inc": increments}, upsert=True)
+    if sign < 0:
+        await rollups.delete_one({**key, "entries_count": {"$lte": 0}})
+
+
+async def apply_entries(rollups, entries: List[dict]):
+    """Add many new entries with one $inc per (user_id, date)"""
+    days = {}
+    for entry in entries:
+        key = (entry["user_id"], entry_date(entry))
+        increments = days.setdefault(key, {"entries_count": 0})
+        increments["entries_count"] += 1
+        for field, amount in nutrient_increments(None, entry.get("nutrients")).items():
+            increments[field] = increments.get(field, 0) + amount
+    if days:
+        await rollups.bulk_write(
+            [
+                UpdateOne({"user_id": user_id, "date": date}, {"$inc": increments}, upsert=True)
+                for (user_id, date), increments in days.items()
+            ],
+            ordered=False,
+        )
+
+
+async def apply_edit(rollups, before: dict, after: dict):
+    """Move a day's totals from an entry's old nutrients to its edited ones"""
+    increments = nutrient_increments(before.get("nutrients"), after.get("nutrients"))
+    if increments:
+        await rollups.update_one(
+            {"user_id": before["user_id"], "date": entry_date(before)},
+            {"$inc": increments},
+            upsert=True,
+        )
+
+
+async def read_rollups(rollups, user_id: str, start_date: str, end_date: str) -> Dict[str, dict]:
+    """Rollups for the days in [start_date, end_date), keyed by date"""
+    query = {"user_id": user_id, "date": {"$gte": start_date, "$lt": end_date}}
+    return {doc.pop("date"): doc async for doc in rollups.find(query, {"_id": 0, "user_id": 0})}
+
+
+async def aggregate_rollups(entries, user_id: Optional[str] = None) -> List[dict]:
+    """Compute rollups from scratch by grouping food_entries by user and day"""
+    group = {field: {"$sum": f"$nutrients.{field}"} for field in ROLLUP_FIELDS}
+    group["_id"] = {"user_id": "$user_id", "date": {"$substr": ["$timestamp", 0, 10]}}
+    group["entries_count"] = {"$sum": 1}
+
+    pipeline = [{"$match": {"user_id": user_id}}] if user_id else []
+    pipeline.append({"$group": group})
+
+    computed = []
+    async for row in entries.aggregate(pipeline):
+        key = row.pop("_id")
+        computed.append({**key, **row})
+    return computed
+
+
+async def rebuild_rollups(entries, rollups, user_id: Optional[str] = None) -> int:
+    """Replace rollups with ones recomputed from food_entries; returns how many were written"""
+    computed = await aggregate_rollups(entries, user_id)
+    await rollups.delete_many({"user_id": user_id} if user_id else {})
+    if computed:
+        await rollups.bulk_write(
+            [ReplaceOne({"user_id": doc["user_id"], "date": doc["date"]}, doc, upsert=True) for doc in computed],
+            ordered=False,
+        )
+    return len(computed)
+
+
+async def check_rollups(entries, rollups, user_id: Optional[str] = None) -> List[dict]:
+    """List the (user_id, date) rollups that disagree with food_entries"""
+    expected = {(doc["user_id"], doc["date"]): doc for doc in await aggregate_rollups(entries, user_id)}
+    stored = {
+        (doc["user_id"], doc["date"]): doc
+        async for doc in rollups.find({"user_id": user_id} if user_id else {}, {"_id": 0})
+    }
+
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        want = expected.get(key, {})
+        have = stored.get(key, {})
+        fields = [
+            field for field in ROLLUP_FIELDS + ["entries_count"]
+            if abs((want.get(field) or 0) - (have.get(field) or 0)) > TOLERANCE
+        ]
+        if fields:
+            mismatches.append({
+                "user_id": key[0],
+                "date": key[1],
+                "fields": {field: {"expected": want.get(field) or 0, "stored": have.get(field) or 0} for field in fields},
+            })
+    return mismatches
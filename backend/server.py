@@ -1,20 +1,106 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Body
+from fastapi import FastAPI, File, UploadFile, HTTPException, Body, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pymongo import MongoClient
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from bson import ObjectId
+import asyncio
+from contextlib import asynccontextmanager
+import hashlib
 import os
-import requests
 import base64
-from datetime import datetime, timedelta
+import binascii
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
 from typing import Optional, List, Dict
 import json
+import re
+import tempfile
 import uuid
 from dotenv import load_dotenv
 
+from cache import LRUCache, SingleFlight, TieredCache, VersionStamp
+from circuit_breaker import CircuitBreaker
+from database import (
+    DUPLICATE_KEY_ERROR,
+    DataVersionRepository,
+    FoodEntryRepository,
+    UserProfileRepository,
+    WeightRecordRepository,
+    create_client,
+)
+from food_db import load_food_database
+from indexes import ensure_indexes
+from jobs import DONE, JobQueue, JobWorkers
+import metrics
+from metrics import SharedMetrics, SlowRequestProfiler, TimedJSONResponse, observe_request, span
+from nutrition import normalize_nutrition
+from preprocess import preprocess_image
+from rollups import apply_edit, apply_entries, apply_entry, read_rollups
+from image_store import ImageSource, create_image_store, is_valid_image_id, make_thumbnail, sniff_content_type
+from ratelimit import create_rate_limiter
+from spoonacular import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, SpoonacularClient, SpoonacularError
+from trends import weight_trend
+from uploads import BodySizeLimit, read_upload, set_spool_threshold
+
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+# Seconds a stopping worker gives running analysis jobs to finish
+SHUTDOWN_GRACE_SECONDS = float(os.getenv("SHUTDOWN_GRACE_SECONDS", "30"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-process resources: opened before the first request, drained and closed on shutdown.
+    
+    Every worker process runs this for itself, so each has its own Mongo and
+    HTTP connection pools and its own background tasks.
+    """
+    await spoonacular.start()
+    await ensure_collection_indexes()
+    profile_watcher = None
+    if PROFILE_CACHE_POLL_INTERVAL > 0:
+        profile_watcher = asyncio.create_task(profile_version.watch(profile_cache, PROFILE_CACHE_POLL_INTERVAL))
+    if slow_request_profiler is not None:
+        slow_request_profiler.sampler.start()
+    metrics_writer = asyncio.create_task(shared_metrics.run()) if shared_metrics is not None else None
+    analysis_workers.start()
+    try:
+        yield
+    finally:
+        # Requests have drained by now; let running jobs finish before closing the pools they use
+        await analysis_workers.stop(SHUTDOWN_GRACE_SECONDS)
+        if profile_watcher is not None:
+            profile_watcher.cancel()
+        if slow_request_profiler is not None:
+            slow_request_profiler.sampler.stop()
+        if metrics_writer is not None:
+            metrics_writer.cancel()
+            # Keep this worker's final counts in the totals the others serve
+            shared_metrics.write()
+        await spoonacular.close()
+        client.close()
+
+app = FastAPI(default_response_class=TimedJSONResponse, lifespan=lifespan)
+
+# Largest accepted image, and the size above which uploads are spooled to disk instead of memory
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(16 * 1024 * 1024)))
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+set_spool_threshold(UPLOAD_SPOOL_BYTES)
+# Room for the multipart boundaries and part headers around a single file
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+ANALYZE_BATCH_MAX_BYTES = int(os.getenv("ANALYZE_BATCH_MAX_BYTES", str(64 * 1024 * 1024)))
+BULK_MAX_BYTES = int(os.getenv("BULK_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Upload and bulk bodies over their limit are refused with 413 as soon as that is known. Added
+# first so it runs inside the CORS and metrics middleware, which see its 413s too.
+BODY_SIZE_LIMITS = {
+    "/api/analyze-food": UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES,
+    "/api/analyze-food/batch": ANALYZE_BATCH_MAX_BYTES,
+    "/api/analyze-food/jobs": UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES,
+    "/api/food-entries/bulk": BULK_MAX_BYTES,
+    "/api/weight/bulk": BULK_MAX_BYTES,
+}
+app.add_middleware(BodySizeLimit, limits=BODY_SIZE_LIMITS)
 
 # CORS middleware
 app.add_middleware(
@@ -25,120 +111,892 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in sampling profiler for requests slower than PROFILE_SLOW_REQUESTS seconds
+PROFILE_SLOW_REQUESTS = float(os.getenv("PROFILE_SLOW_REQUESTS", "0"))
+slow_request_profiler = SlowRequestProfiler(
+    PROFILE_SLOW_REQUESTS,
+    directory=os.getenv("PROFILE_DIR", "profiles"),
+    interval=float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005")),
+) if PROFILE_SLOW_REQUESTS > 0 else None
+
+# Metrics of all worker processes, shared through files in METRICS_MULTIPROC_DIR (set by main.py)
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+shared_metrics = SharedMetrics(
+    metrics.REGISTRY,
+    METRICS_MULTIPROC_DIR,
+    interval=float(os.getenv("METRICS_WRITE_INTERVAL", "5")),
+) if METRICS_MULTIPROC_DIR else None
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    return await observe_request(request, call_next, slow_request_profiler)
+
 # MongoDB connection
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "nutrition_tracker")
 
-client = MongoClient(MONGO_URL)
+# Motor connects on first use, so each worker process opens its own pool in
+# its lifespan (after the fork or spawn) and closes it on shutdown
+client = create_client(MONGO_URL)
 db = client[DB_NAME]
 
 # Collections
-food_entries = db.food_entries
-weight_records = db.weight_records
-user_profiles = db.user_profiles
+food_entries = FoodEntryRepository(db.food_entries)
+weight_records = WeightRecordRepository(db.weight_records)
+user_profiles = UserProfileRepository(db.user_profiles)
+daily_rollups = db.daily_rollups
+data_versions = DataVersionRepository(db.data_versions)
+
+# In-process caches are per worker. Analyses and recipe nutrition never change
+# for a key, so copies in different workers cannot disagree; the other caches
+# are invalidated across workers through Mongo as noted on each.
+
+# Food-image analysis results keyed by SHA-256 of the image bytes
+analysis_cache = TieredCache(
+    db.analysis_cache,
+    max_entries=int(os.getenv("ANALYSIS_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 24 * 3600))),
+)
+
+# Recipe nutrition keyed by Spoonacular recipe id (immutable, so no TTL)
+recipe_nutrition_cache = TieredCache(
+    db.recipe_nutrition,
+    max_entries=int(os.getenv("RECIPE_NUTRITION_CACHE_SIZE", "4096")),
+)
+
+# Food images, stored once per content hash ("gridfs" or "filesystem")
+image_store = create_image_store(
+    os.getenv("IMAGE_STORE", "gridfs"),
+    database=db,
+    path=os.getenv("IMAGE_STORE_PATH", "images"),
+)
+
+# Bundled per-100 g nutrition table for offline lookups (a CSV, or a directory built by manage.py)
+food_database = load_food_database(
+    os.getenv("FOOD_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "foods.csv"))
+)
+
+# The latest weight trend per (user, window), stamped with the user's shared weights
+# version and goal so a write in any worker makes it stale
+weight_trend_cache = LRUCache(
+    max_entries=int(os.getenv("WEIGHT_TREND_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("WEIGHT_TREND_CACHE_TTL", "3600")),
+)
+
+# Profiles per user, dropped on update here and, through the version stamp, in other workers
+profile_cache = LRUCache(
+    max_entries=int(os.getenv("PROFILE_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("PROFILE_CACHE_TTL", "300")),
+)
+profile_version = VersionStamp(db.cache_versions, "user_profiles")
+PROFILE_CACHE_POLL_INTERVAL = float(os.getenv("PROFILE_CACHE_POLL_INTERVAL", "5"))
+
+# Photos are downscaled to this many pixels on the longest side before recognition
+RECOGNITION_MAX_SIDE = int(os.getenv("RECOGNITION_MAX_SIDE", "1024"))
+RECOGNITION_JPEG_QUALITY = int(os.getenv("RECOGNITION_JPEG_QUALITY", "85"))
 
 # Spoonacular API key
-SPOONACULAR_API_KEY = "673ea16ce3cd48328b7117f37d323d6c"
+SPOONACULAR_API_KEY = os.getenv("SPOONACULAR_API_KEY", "673ea16ce3cd48328b7117f37d323d6c")
+
+# Shared Spoonacular client (pooled keep-alive connections, retries, bounded concurrency)
+spoonacular = SpoonacularClient(
+    api_key=SPOONACULAR_API_KEY,
+    base_url=os.getenv("SPOONACULAR_BASE_URL", "https://api.spoonacular.com"),
+    timeout=float(os.getenv("SPOONACULAR_TIMEOUT", "10")),
+    max_connections=int(os.getenv("SPOONACULAR_MAX_CONNECTIONS", "20")),
+    max_concurrency=int(os.getenv("SPOONACULAR_MAX_CONCURRENCY", "10")),
+    max_retries=int(os.getenv("SPOONACULAR_MAX_RETRIES", "2")),
+    # Token bucket for the plan's quota, shared by all workers through Mongo ("mongo" or "local")
+    rate_limiter=create_rate_limiter(
+        os.getenv("SPOONACULAR_RATE_LIMITER", "mongo"),
+        collection=db.rate_limits,
+        name="spoonacular",
+        rate=float(os.getenv("SPOONACULAR_RATE_LIMIT", "5")),
+        burst=float(os.getenv("SPOONACULAR_RATE_BURST", "10")),
+        max_wait=float(os.getenv("SPOONACULAR_RATE_MAX_WAIT", "5")),
+    ),
+    # Fail fast with fallback data while Spoonacular is erroring or slow
+    circuit_breaker=CircuitBreaker(
+        failure_rate=float(os.getenv("SPOONACULAR_BREAKER_FAILURE_RATE", "0.5")),
+        slow_call_seconds=float(os.getenv("SPOONACULAR_BREAKER_SLOW_CALL_SECONDS", "5")),
+        reset_timeout=float(os.getenv("SPOONACULAR_BREAKER_RESET_TIMEOUT", "30")),
+    ),
+)
+
+# Concurrent uploads of the same image, or lookups of the same recipe, share one upstream call
+recognition_flights = SingleFlight()
+recipe_nutrition_flights = SingleFlight()
+
+async def ensure_collection_indexes():
+    report = await ensure_indexes(db)
+    for collection_name, actions in report.items():
+        for action, names in actions.items():
+            if names:
+                print(f"Indexes {action} on {collection_name}: {', '.join(names)}")
+    await analysis_cache.ensure_indexes()
+
+async def fetch_recipe_nutrition(recipe_id, priority: int) -> dict:
+    with span("upstream.nutrition"):
+        nutrition = await spoonacular.recipe_nutrition(recipe_id, priority=priority)
+    await recipe_nutrition_cache.set(str(recipe_id), nutrition)
+    return nutrition
+
+async def get_recipe_nutrition(recipe_id, priority: int = PRIORITY_INTERACTIVE) -> dict:
+    """Get recipe nutrition from the cache, fetching it from Spoonacular on a miss"""
+    key = str(recipe_id)
+    with span("cache.recipe_nutrition"):
+        nutrition = await recipe_nutrition_cache.get(key)
+    if nutrition is None:
+        nutrition = await recipe_nutrition_flights.run(key, fetch_recipe_nutrition, recipe_id, priority)
+    return nutrition
+
+def inspect_image(image: ImageSource):
+    """Detect the image type and build its list-view thumbnail (CPU-bound)"""
+    return sniff_content_type(image), make_thumbnail(image)
+
+async def store_image(image: ImageSource, image_id: Optional[str] = None):
+    """Put an image (bytes or a file) in the image store; returns its id and thumbnail"""
+    with span("image.inspect"):
+        content_type, thumbnail = await run_in_threadpool(inspect_image, image)
+    with span("image.store"):
+        image_id = await image_store.put(image, content_type, image_id)
+    return image_id, thumbnail
+
+async def open_stored_image(image_id: str):
+    """A stored image copied in chunks into a spooled temporary file"""
+    info = await image_store.info(image_id)
+    if info is None:
+        raise ValueError(f"Image {image_id} is not in the image store")
+    image = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+    async for chunk in image_store.iter_range(image_id, 0, info.length - 1):
+        image.write(chunk)
+    return image
 
 @app.get("/")
 async def root():
     return {"message": "Nutrition Tracker API"}
 
+async def recognize_image(image_id: str):
+    """Analysis of a stored image, where it came from, and the preprocessing report.
+    
+    The image must be in the image store already. The source is "cache" or
+    "live"; when Spoonacular is unavailable the analysis is None and the
+    source "fallback". The report is None when the analysis came from the
+    cache and nothing was uploaded.
+    """
+    # Identical images get identical results, so look the analysis up by content hash
+    with span("cache.analysis"):
+        analysis = await analysis_cache.get(image_id)
+    if analysis is not None:
+        return analysis, "cache", None
+    return await recognition_flights.run(image_id, fetch_analysis, image_id)
+
+async def fetch_analysis(image_id: str):
+    """Recognize a stored image with Spoonacular and cache the analysis (never the fallback)"""
+    # Read from the store rather than a caller's upload, which callers
+    # sharing this flight cannot rely on staying open
+    image = await open_stored_image(image_id)
+    try:
+        # Upload a downscaled copy; recognition does not need the full-size photo
+        with span("preprocess"):
+            prepared = await run_in_threadpool(
+                preprocess_image, image, RECOGNITION_MAX_SIDE, RECOGNITION_JPEG_QUALITY
+            )
+    finally:
+        image.close()
+    # Returned with the analysis and timed by the "preprocess" span, so not logged per image
+    preprocessing = prepared.report()
+    
+    # Send to Spoonacular Food Recognition API
+    try:
+        with span("upstream.recognition"):
+            result = await spoonacular.analyze_image(prepared.data, content_type=prepared.content_type)
+    except SpoonacularError as e:
+        print(f"Spoonacular recognition failed: {str(e)}")
+        return None, "fallback", preprocessing
+    
+    category = result.get("category", {}).get("name", "Unknown")
+    
+    # Get detailed nutrition information if we have a recipe
+    nutrition_info = {}
+    nutrition_source = None
+    lookup_failed = False
+    if result.get("recipes") and len(result["recipes"]) > 0:
+        recipe_id = result["recipes"][0].get("id")
+        if recipe_id:
+            try:
+                nutrition_info = await get_recipe_nutrition(recipe_id)
+                nutrition_source = "spoonacular"
+            except SpoonacularError as e:
+                print(f"Spoonacular nutrition lookup failed: {str(e)}")
+                lookup_failed = True
+    
+    # Otherwise estimate from the local food table by category name
+    if not nutrition_info:
+        match = food_database.best_match(category)
+        if match is not None:
+            nutrition_info = match["nutrition"]
+            nutrition_source = "local"
+    
+    analysis = {
+        "category": category,
+        "probability": result.get("category", {}).get("probability", 0),
+        "nutrition": nutrition_info,
+        "nutrition_source": nutrition_source,
+        "recipes": result.get("recipes", []),
+    }
+    # A failed lookup is retried next time rather than cached with the estimate
+    if not lookup_failed:
+        await analysis_cache.set(image_id, analysis)
+    return analysis, "live", preprocessing
+
+def food_analysis(analysis: Optional[dict], source: str, image_id: str, thumbnail: Optional[str]) -> dict:
+    """Response data for an analyzed image, with mock data when there is no analysis"""
+    if analysis is not None:
+        nutrition_data = {
+            "id": str(uuid.uuid4()),
+            "source": source,
+            "category": analysis["category"],
+            "probability": analysis["probability"],
+            "nutrition": analysis["nutrition"],
+            "nutrition_source": analysis.get("nutrition_source", "spoonacular"),
+            "nutrients": normalize_nutrition(analysis["nutrition"]),
+            "recipes": analysis["recipes"],
+            "image_id": image_id,
+            "thumbnail": thumbnail,
+            "timestamp": datetime.now().isoformat()
+        }
+        return nutrition_data
+    
+    # Fallback with mock data for demo
+    mock_nutrition = {
+        "id": str(uuid.uuid4()),
+        "source": "fallback",
+        "category": "Food",
+        "probability": 0.85,
+        "nutrition": {
+            "calories": "250",
+            "carbs": "35g",
+            "protein": "12g",
+            "fat": "8g",
+            "fiber": "4g",
+            "sugar": "15g"
+        },
+        "recipes": [],
+        "image_id": image_id,
+        "thumbnail": thumbnail,
+        "timestamp": datetime.now().isoformat()
+    }
+    mock_nutrition["nutrients"] = normalize_nutrition(mock_nutrition["nutrition"])
+    return mock_nutrition
+
 @app.post("/api/analyze-food")
 async def analyze_food_image(file: UploadFile = File(...)):
     """Analyze food image using Spoonacular API"""
     try:
-        # Read image file
-        image_data = await file.read()
+        # Hash the spooled upload in chunks; it is never loaded into memory as a whole
+        with span("upload.read"):
+            upload = await read_upload(file, UPLOAD_MAX_BYTES)
         
-        # Send to Spoonacular Food Recognition API
-        url = "https://api.spoonacular.com/food/images/analyze"
+        # Keep the image once in the image store; responses only carry its id and a thumbnail
+        image_id, thumbnail = await store_image(upload.file, upload.sha256)
         
-        files = {"file": ("image.jpg", image_data, "image/jpeg")}
-        params = {"apiKey": SPOONACULAR_API_KEY}
+        analysis, source, preprocessing = await recognize_image(image_id)
+        return {
+            "success": True,
+            "data": food_analysis(analysis, source, image_id, thumbnail),
+            "preprocessing": preprocessing,
+        }
+            
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error analyzing food: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Batch analysis: how many images may be analyzed at once per request, and per request at most
+ANALYZE_BATCH_CONCURRENCY = int(os.getenv("ANALYZE_BATCH_CONCURRENCY", "5"))
+ANALYZE_BATCH_MAX_FILES = int(os.getenv("ANALYZE_BATCH_MAX_FILES", "20"))
+
+@app.post("/api/analyze-food/batch")
+async def analyze_food_batch(files: List[UploadFile] = File(...)):
+    """Analyze several food images concurrently, streaming NDJSON results as each one finishes"""
+    if len(files) > ANALYZE_BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {ANALYZE_BATCH_MAX_FILES} files per batch")
+    
+    # Identical photos are analyzed once and answered for every upload that carried them.
+    # The spooled files are detached because the results are produced after this returns.
+    images = {}
+    try:
+        for index, file in enumerate(files):
+            upload = await read_upload(file, UPLOAD_MAX_BYTES, detach=True)
+            if upload.sha256 in images:
+                upload.close()
+            else:
+                images[upload.sha256] = {"upload": upload, "uploads": []}
+            images[upload.sha256]["uploads"].append((index, file.filename))
+    except HTTPException:
+        for image in images.values():
+            image["upload"].close()
+        raise
+    
+    semaphore = asyncio.Semaphore(ANALYZE_BATCH_CONCURRENCY)
+    
+    async def analyze(image_id: str, image: ImageSource):
+        async with semaphore:
+            try:
+                _, thumbnail = await store_image(image, image_id)
+                analysis, source, preprocessing = await recognize_image(image_id)
+                return image_id, food_analysis(analysis, source, image_id, thumbnail), preprocessing, None
+            except Exception as e:
+                print(f"Error analyzing food: {str(e)}")
+                return image_id, None, None, str(e)
+    
+    async def results():
+        tasks = [asyncio.ensure_future(analyze(image_id, image["upload"].file)) for image_id, image in images.items()]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                image_id, data, preprocessing, error = await next_result
+                for position, (index, filename) in enumerate(images[image_id]["uploads"]):
+                    line = {"index": index, "filename": filename, "success": error is None}
+                    if error is None:
+                        # Duplicates are separate food entries once saved
+                        line["data"] = data if position == 0 else {**data, "id": str(uuid.uuid4())}
+                        line["preprocessing"] = preprocessing if position == 0 else None
+                    else:
+                        line["error"] = error
+                    yield json.dumps(line) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+            for image in images.values():
+                image["upload"].close()
+    
+    return StreamingResponse(results(), media_type=NDJSON_MEDIA_TYPE)
+
+async def run_analysis_job(job: dict) -> dict:
+    """Analyze the image of a queued job; returns the fields stored with the finished job"""
+    image_id = job["image_id"]
+    image = await open_stored_image(image_id)
+    try:
+        with span("image.inspect"):
+            thumbnail = await run_in_threadpool(make_thumbnail, image)
+    finally:
+        image.close()
+    analysis, source, preprocessing = await recognize_image(image_id)
+    return {"result": food_analysis(analysis, source, image_id, thumbnail), "preprocessing": preprocessing}
+
+# Asynchronous analysis: jobs persist in Mongo and are run by worker tasks in
+# every server process (ANALYSIS_JOB_WORKERS=0 leaves them to other processes)
+analysis_jobs = JobQueue(db.analysis_jobs)
+analysis_workers = JobWorkers(
+    analysis_jobs,
+    run_analysis_job,
+    concurrency=int(os.getenv("ANALYSIS_JOB_WORKERS", "4")),
+    lease=float(os.getenv("ANALYSIS_JOB_LEASE", "120")),
+    poll_interval=float(os.getenv("ANALYSIS_JOB_POLL_INTERVAL", "1")),
+    max_attempts=int(os.getenv("ANALYSIS_JOB_MAX_ATTEMPTS", "3")),
+)
+
+def job_view(job: dict) -> dict:
+    view = {
+        "id": job["id"],
+        "status": job["status"],
+        "filename": job.get("filename"),
+        "image_id": job["image_id"],
+        "attempts": job["attempts"],
+        "created_at": job["created_at"].isoformat(),
+        "updated_at": job["updated_at"].isoformat(),
+    }
+    if job["status"] == DONE:
+        view["result"] = job["result"]
+        view["preprocessing"] = job.get("preprocessing")
+    elif "error" in job:
+        view["error"] = job["error"]
+    return view
+
+@app.post("/api/analyze-food/jobs", status_code=202)
+async def create_analysis_job(response: Response, file: UploadFile = File(...)):
+    """Queue a food image for analysis and return the job at once"""
+    try:
+        with span("upload.read"):
+            upload = await read_upload(file, UPLOAD_MAX_BYTES)
         
-        response = requests.post(url, files=files, params=params)
+        # The image is stored before the job is queued, so whichever worker claims it can read it
+        with span("image.inspect"):
+            content_type = await run_in_threadpool(sniff_content_type, upload.file)
+        with span("image.store"):
+            image_id = await image_store.put(upload.file, content_type, upload.sha256)
         
-        if response.status_code == 200:
-            result = response.json()
-            
-            # Get detailed nutrition information if we have a recipe
-            nutrition_info = {}
-            if result.get("recipes") and len(result["recipes"]) > 0:
-                recipe_id = result["recipes"][0].get("id")
-                if recipe_id:
-                    nutrition_url = f"https://api.spoonacular.com/recipes/{recipe_id}/nutritionWidget.json"
-                    nutrition_params = {"apiKey": SPOONACULAR_API_KEY}
-                    nutrition_response = requests.get(nutrition_url, params=nutrition_params)
-                    
-                    if nutrition_response.status_code == 200:
-                        nutrition_info = nutrition_response.json()
-            
-            # Convert image to base64 for storage
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
-            
-            # Extract nutrition data
-            nutrition_data = {
-                "id": str(uuid.uuid4()),
-                "category": result.get("category", {}).get("name", "Unknown"),
-                "probability": result.get("category", {}).get("probability", 0),
-                "nutrition": nutrition_info,
-                "recipes": result.get("recipes", []),
-                "image_data": image_base64,
-                "timestamp": datetime.now().isoformat()
-            }
-            
-            return {"success": True, "data": nutrition_data}
-        else:
-            # Fallback with mock data for demo
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
-            mock_nutrition = {
-                "id": str(uuid.uuid4()),
-                "category": "Food",
-                "probability": 0.85,
-                "nutrition": {
-                    "calories": "250",
-                    "carbs": "35g",
-                    "protein": "12g",
-                    "fat": "8g",
-                    "fiber": "4g",
-                    "sugar": "15g"
-                },
-                "recipes": [],
-                "image_data": image_base64,
-                "timestamp": datetime.now().isoformat()
+        job = await analysis_jobs.create({"image_id": image_id, "filename": file.filename})
+        analysis_workers.notify()
+        response.headers["Location"] = f"/api/analyze-food/jobs/{job['id']}"
+        return {"success": True, "data": job_view(job)}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error queueing food analysis: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/analyze-food/jobs/{job_id}")
+async def get_analysis_job(job_id: str):
+    """Status of an analysis job, with the analysis once it is done"""
+    try:
+        job = await analysis_jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return {"success": True, "data": job_view(job)}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error fetching analysis job: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Comment lines sent while a job is unchanged keep proxies from closing the stream
+SSE_KEEPALIVE_SECONDS = 15
+
+@app.get("/api/analyze-food/jobs/{job_id}/events")
+async def stream_analysis_job(job_id: str):
+    """Server-sent events with the job each time its status changes, ending when it finishes"""
+    if await analysis_jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        last_update = None
+        last_sent = asyncio.get_running_loop().time()
+        async for job in analysis_workers.watch(job_id):
+            now = asyncio.get_running_loop().time()
+            if job["updated_at"] != last_update:
+                last_update = job["updated_at"]
+                last_sent = now
+                yield f"event: {job['status']}\ndata: {json.dumps(job_view(job))}\n\n"
+            elif now - last_sent >= SSE_KEEPALIVE_SECONDS:
+                last_sent = now
+                yield ": keep-alive\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/foods/search")
+async def search_foods(q: str = Query(""), limit: int = Query(10, ge=1, le=50)):
+    """Fuzzy search of the local food table by name"""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="q is required")
+    return {"success": True, "data": food_database.search(q, limit=limit)}
+
+@app.get("/api/cache-stats")
+async def get_cache_stats():
+    """Get hit/miss counters for the upstream result caches"""
+    return {
+        "success": True,
+        "data": {
+            "analysis": {**analysis_cache.stats(), "coalesced": recognition_flights.coalesced},
+            "recipe_nutrition": {**recipe_nutrition_cache.stats(), "coalesced": recipe_nutrition_flights.coalesced},
+        }
+    }
+
+def result_cache_stats() -> dict:
+    return {"analysis": analysis_cache.stats(), "recipe_nutrition": recipe_nutrition_cache.stats()}
+
+# Values computed when /metrics is scraped
+metrics.CACHE_HIT_RATIO.set_function(
+    lambda: {(name,): stats["hit_ratio"] for name, stats in result_cache_stats().items()}
+)
+metrics.CACHE_LOOKUPS.set_function(lambda: {
+    (name, result): stats[field]
+    for name, stats in result_cache_stats().items()
+    for result, field in (("hit_memory", "hits_memory"), ("hit_store", "hits_store"), ("miss", "misses"))
+})
+metrics.CIRCUIT_OPEN.set_function(lambda: {
+    ("spoonacular",): 0 if spoonacular.circuit_breaker is None or spoonacular.circuit_breaker.state == "closed" else 1
+})
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics, summed over all worker processes when they share a metrics directory"""
+    if shared_metrics is not None:
+        return Response(await run_in_threadpool(shared_metrics.render), media_type=metrics.CONTENT_TYPE)
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/upstream-status")
+async def get_upstream_status():
+    """Get the state of the Spoonacular circuit breaker"""
+    breaker = spoonacular.circuit_breaker
+    return {"success": True, "data": {"spoonacular": breaker.stats() if breaker is not None else None}}
+
+@app.post("/api/admin/warm-recipe-nutrition")
+async def warm_recipe_nutrition(payload: dict = Body(...)):
+    """Bulk-load nutrition for a list of recipe ids into the cache"""
+    try:
+        recipe_ids = payload.get("recipe_ids", [])
+        if not isinstance(recipe_ids, list) or not all(
+            isinstance(recipe_id, (int, str)) and not isinstance(recipe_id, bool) for recipe_id in recipe_ids
+        ):
+            raise HTTPException(status_code=400, detail="recipe_ids must be a list of integers or strings")
+        recipe_ids = list(dict.fromkeys(str(recipe_id) for recipe_id in recipe_ids))
+        # Warming is not a lookup by a user, so it must not show up in the cache hit ratio
+        missing = [recipe_id for recipe_id in recipe_ids if not await recipe_nutrition_cache.contains(recipe_id)]
+        
+        # The shared client bounds how many of these run against Spoonacular at once,
+        # and user requests waiting for a slot are served before these
+        results = await asyncio.gather(
+            *(
+                recipe_nutrition_flights.run(recipe_id, fetch_recipe_nutrition, recipe_id, PRIORITY_BACKGROUND)
+                for recipe_id in missing
+            ),
+            return_exceptions=True
+        )
+        failed = [
+            {"recipe_id": recipe_id, "error": str(result)}
+            for recipe_id, result in zip(missing, results)
+            if isinstance(result, Exception)
+        ]
+        
+        return {
+            "success": True,
+            "data": {
+                "requested": len(recipe_ids),
+                "already_cached": len(recipe_ids) - len(missing),
+                "fetched": len(missing) - len(failed),
+                "failed": failed
             }
-            return {"success": True, "data": mock_nutrition}
-            
+        }
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error analyzing food: {str(e)}")
+        print(f"Error warming recipe nutrition: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def parse_range_header(range_header: str, length: int):
+    """Parse a single "bytes=start-end" range; returns None if it cannot be satisfied"""
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start, _, end = spec.strip().partition("-")
+    try:
+        if start:
+            start = int(start)
+            end = min(int(end), length - 1) if end else length - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(length - int(end), 0)
+            end = length - 1
+    except ValueError:
+        return None
+    if start > end or start >= length:
+        return None
+    return start, end
+
+@app.get("/api/images/{image_id}")
+async def get_image(image_id: str, request: Request):
+    """Stream a stored food image"""
+    if not is_valid_image_id(image_id):
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    info = await image_store.info(image_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    # Images are content-addressed, so they never change under the same id
+    headers = {
+        "ETag": info.etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if etag_matches(request, info.etag):
+        return Response(status_code=304, headers=headers)
+    
+    start, end = 0, info.length - 1
+    status_code = 200
+    range_header = request.headers.get("range")
+    if range_header and info.length:
+        byte_range = parse_range_header(range_header, info.length)
+        if byte_range is None:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{info.length}"})
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{info.length}"
+    headers["Content-Length"] = str(end - start + 1)
+    
+    return StreamingResponse(
+        image_store.iter_range(image_id, start, end),
+        status_code=status_code,
+        media_type=info.content_type,
+        headers=headers
+    )
+
+def decode_image_data(image_base64: str) -> bytes:
+    """Bytes of an inline base64 image, rejecting anything that is not strictly base64"""
+    try:
+        return base64.b64decode(image_base64, validate=True)
+    except (binascii.Error, TypeError):
+        raise ValueError("image_data must be base64")
+
+def document_user_id(data: dict) -> str:
+    """The user a new document belongs to; rollups and version stamps need it to be a string"""
+    user_id = data.get("user_id", "default_user")
+    if not isinstance(user_id, str) or not user_id:
+        raise ValueError("user_id must be a non-empty string")
+    return user_id
+
+async def prepare_food_entry(entry_data: dict, timestamp: Optional[str] = None) -> dict:
+    """Fill in the server-side fields of a new food entry"""
+    # Add unique ID and timestamp
+    entry_data["id"] = str(uuid.uuid4())
+    entry_data["timestamp"] = timestamp or datetime.now().isoformat()
+    entry_data["user_id"] = document_user_id(entry_data)
+    
+    # Numeric nutrients with fixed units, so summaries never re-parse "35g" strings
+    entry_data["nutrients"] = normalize_nutrition(entry_data.get("nutrition"))
+    
+    # Older clients send the whole image inline; move it to the image store
+    image_base64 = entry_data.pop("image_data", None)
+    if image_base64 and not entry_data.get("image_id"):
+        image_id, thumbnail = await store_image(decode_image_data(image_base64))
+        entry_data["image_id"] = image_id
+        entry_data["thumbnail"] = thumbnail
+    
+    return entry_data
+
 @app.post("/api/save-food-entry")
 async def save_food_entry(entry_data: dict = Body(...)):
     """Save food entry to database"""
     try:
-        # Add unique ID and timestamp
-        entry_data["id"] = str(uuid.uuid4())
-        entry_data["timestamp"] = datetime.now().isoformat()
-        entry_data["user_id"] = entry_data.get("user_id", "default_user")
+        try:
+            await prepare_food_entry(entry_data)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # Save to MongoDB
-        result = food_entries.insert_one(entry_data)
+        with span("db.write"):
+            await food_entries.insert(entry_data)
+            await apply_entry(daily_rollups, entry_data)
+            await data_versions.bump("food_entries", [entry_data["user_id"]])
         
         return {"success": True, "id": entry_data["id"]}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error saving food entry: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Fields of a food entry that edits may not change
+IMMUTABLE_ENTRY_FIELDS = ["_id", "id", "user_id", "timestamp", "nutrients"]
+
+@app.put("/api/food-entries/{entry_id}")
+async def update_food_entry(entry_id: str, entry_data: dict = Body(...)):
+    """Edit a food entry"""
+    try:
+        update = {key: value for key, value in entry_data.items() if key not in IMMUTABLE_ENTRY_FIELDS}
+        if "nutrition" in update:
+            update["nutrients"] = normalize_nutrition(update["nutrition"])
+        # An inline image replaces the entry's image, stored like one sent with a new entry
+        image_base64 = update.pop("image_data", None)
+        if image_base64:
+            try:
+                image = decode_image_data(image_base64)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            update["image_id"], update["thumbnail"] = await store_image(image)
+        update["updated_at"] = datetime.now().isoformat()
+        
+        before = await food_entries.update(entry_id, update)
+        if before is None:
+            raise HTTPException(status_code=404, detail="Food entry not found")
+        if "nutrients" in update:
+            await apply_edit(daily_rollups, before, update)
+        await data_versions.bump("food_entries", [before["user_id"]])
+        
+        return {"success": True, "id": entry_id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error updating food entry: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/food-entries/{entry_id}")
+async def delete_food_entry(entry_id: str):
+    """Delete a food entry"""
+    try:
+        deleted = await food_entries.delete(entry_id)
+        if deleted is None:
+            raise HTTPException(status_code=404, detail="Food entry not found")
+        await apply_entry(daily_rollups, deleted, sign=-1)
+        await data_versions.bump("food_entries", [deleted["user_id"]])
+        
+        return {"success": True, "id": entry_id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error deleting food entry: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Read endpoints may be stored by the browser but must be revalidated before each use
+READ_CACHE_CONTROL = "private, no-cache"
+
+async def data_validator(request: Request, user_id: str, kind: str, *depends_on) -> dict:
+    """Caching headers for a response built from a user's data of one kind.
+    
+    The ETag covers the data version plus whatever else the response depends
+    on (the date, the requested representation, goals), so it changes exactly
+    when the payload can.
+    """
+    with span("db.version"):
+        version, updated_at = await data_versions.get(user_id, kind)
+    representation = "ndjson" if NDJSON_MEDIA_TYPE in request.headers.get("accept", "") else "json"
+    key = json.dumps([kind, user_id, version, representation, *depends_on], default=str, sort_keys=True)
+    headers = {
+        "ETag": f'"{hashlib.sha256(key.encode()).hexdigest()[:24]}"',
+        "Cache-Control": READ_CACHE_CONTROL,
+        "Vary": "Accept",
+    }
+    if updated_at is not None:
+        headers["Last-Modified"] = format_datetime(updated_at.replace(tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether If-None-Match names the current ETag (weak comparison)"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+def with_headers(result, response: Response, headers: dict):
+    """Add headers to a handler's result, whether it is a Response or a dict"""
+    (result if isinstance(result, Response) else response).headers.update(headers)
+    return result
+
+# Large fields left out of list responses unless requested with fields=
+FOOD_ENTRY_HEAVY_FIELDS = ["image_data", "recipes"]
+
+FIELD_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$")
+
+def build_projection(fields: Optional[str], heavy_fields: List[str]) -> Dict[str, int]:
+    """Map a fields= query parameter to a MongoDB projection.
+    
+    No value gives the lean default (everything but heavy_fields), "*" gives
+    every field, and a comma-separated list selects just those fields. "id"
+    and "timestamp" are always returned. "_id" is never returned.
+    """
+    if fields is None or not fields.strip():
+        projection = {field: 0 for field in heavy_fields}
+        projection["_id"] = 0
+        return projection
+    if fields.strip() == "*":
+        return {"_id": 0}
+    
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    invalid = [name for name in names if not FIELD_NAME_PATTERN.match(name) or name == "_id"]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid fields: {', '.join(invalid)}")
+    
+    projection = {name: 1 for name in names}
+    projection.update({"id": 1, "timestamp": 1, "_id": 0})
+    return projection
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def encode_cursor(document: dict) -> str:
+    """Opaque pagination cursor for the (timestamp, id) position of a document"""
+    position = json.dumps([document["timestamp"], document["id"]])
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not (isinstance(position, list) and len(position) == 2 and all(isinstance(part, str) for part in position)):
+            raise ValueError(cursor)
+        timestamp, entry_id = position
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return timestamp, entry_id
+
+async def list_documents(
+    request: Request,
+    repository,
+    query: dict,
+    projection: dict,
+    direction: int,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+):
+    """List documents ordered by (timestamp, id), optionally one page at a time.
+    
+    Pages are keyset-based: the cursor holds the (timestamp, id) of the last
+    document returned, so each page is an index range scan rather than a skip.
+    With "Accept: application/x-ndjson" documents are streamed one per line
+    straight from the Mongo cursor; if there is another page, the last line is
+    {"next_cursor": ...}.
+    """
+    if cursor:
+        timestamp, entry_id = decode_cursor(cursor)
+        after = "$lt" if direction < 0 else "$gt"
+        query = {
+            "$and": [
+                query,
+                {"$or": [
+                    {"timestamp": {after: timestamp}},
+                    {"timestamp": timestamp, "id": {after: entry_id}}
+                ]}
+            ]
+        }
+    
+    # Fetch one extra document to know whether there is a next page
+    documents = repository.find(query, projection).sort([("timestamp", direction), ("id", direction)])
+    if limit:
+        documents = documents.limit(limit + 1)
+    
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        async def stream():
+            count = 0
+            last = None
+            async for document in documents:
+                if limit and count == limit:
+                    yield json.dumps({"next_cursor": encode_cursor(last)}) + "\n"
+                    break
+                count += 1
+                last = document
+                yield json.dumps(document, default=str) + "\n"
+        
+        return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
+    
+    with span("db.query"):
+        data = await documents.to_list(None)
+    next_cursor = None
+    if limit and len(data) > limit:
+        data = data[:limit]
+        next_cursor = encode_cursor(data[-1])
+    
+    return {"success": True, "data": data, "next_cursor": next_cursor}
+
 @app.get("/api/food-entries")
-async def get_food_entries(user_id: str = "default_user", days: int = 7):
-    """Get food entries for user"""
+async def get_food_entries(
+    request: Request,
+    response: Response,
+    user_id: str = "default_user",
+    days: int = 7,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    """Get food entries for user, newest first"""
+    projection = build_projection(fields, FOOD_ENTRY_HEAVY_FIELDS)
     try:
         # Calculate date range
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days)
         
+        # The window moves with the date, so the validator does too
+        headers = await data_validator(request, user_id, "food_entries", end_date.date())
+        if etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        
         # Query food entries
         query = {
             "user_id": user_id,
@@ -148,94 +1006,170 @@ async def get_food_entries(user_id: str = "default_user", days: int = 7):
             }
         }
         
-        entries = list(food_entries.find(query).sort("timestamp", -1))
-        
-        # Convert ObjectId to string
-        for entry in entries:
-            if "_id" in entry:
-                del entry["_id"]
-        
-        return {"success": True, "data": entries}
+        result = await list_documents(request, food_entries, query, projection, -1, limit, cursor)
+        return with_headers(result, response, headers)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching food entries: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Normalized nutrient fields that summaries add up, and the summary keys they map to
+SUMMARY_FIELDS = {
+    "calories_kcal": "total_calories",
+    "carbs_g": "total_carbs",
+    "protein_g": "total_protein",
+    "fat_g": "total_fat",
+    "fiber_g": "total_fiber",
+}
+
+DEFAULT_GOALS = {
+    "goal_calories": 2000,
+    "goal_carbs": 250,
+    "goal_protein": 150,
+    "goal_fat": 65
+}
+
+# Profile fields that override DEFAULT_GOALS
+PROFILE_GOAL_FIELDS = {
+    "goal_calories": "daily_calorie_goal",
+    "goal_carbs": "daily_carbs_goal",
+    "goal_protein": "daily_protein_goal",
+    "goal_fat": "daily_fat_goal"
+}
+
+SUMMARY_GRANULARITIES = ("day", "week", "month")
+
+# Longest range /api/summary-range will aggregate in one request
+MAX_SUMMARY_DAYS = 3 * 366
+
+def profile_goals(profile: dict) -> dict:
+    """Summary goals from a profile, with defaults for goals it does not set"""
+    goals = dict(DEFAULT_GOALS)
+    for goal, field in PROFILE_GOAL_FIELDS.items():
+        value = profile.get(field)
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+            goals[goal] = value
+    return goals
+
+def parse_date(value: str, name: str) -> datetime:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be a YYYY-MM-DD date")
+
+def period_start(day: datetime, granularity: str) -> datetime:
+    """First day of the day/week (Monday)/month bucket that contains day"""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+def period_label(start: datetime, granularity: str) -> str:
+    if granularity == "week":
+        year, week, _ = start.isocalendar()
+        return f"{year}-W{week:02d}"
+    if granularity == "month":
+        return start.strftime("%Y-%m")
+    return start.strftime("%Y-%m-%d")
+
+async def summarize_range(user_id: str, start_date: datetime, end_date: datetime, granularity: str) -> List[dict]:
+    """Nutrition totals for every day/week/month bucket from start_date to end_date inclusive.
+    
+    Reads one precomputed daily_rollups document per day. Buckets without
+    entries are included with zero totals.
+    """
+    with span("db.rollups"):
+        days = await read_rollups(
+            daily_rollups,
+            user_id,
+            start_date.strftime("%Y-%m-%d"),
+            (end_date + timedelta(days=1)).strftime("%Y-%m-%d")
+        )
+    
+    series = {}
+    day = start_date
+    while day <= end_date:
+        bucket_start = period_start(day, granularity)
+        label = period_label(bucket_start, granularity)
+        bucket = series.get(label)
+        if bucket is None:
+            bucket = series[label] = {
+                "date": bucket_start.strftime("%Y-%m-%d"),
+                "period": label,
+                **{key: 0 for key in SUMMARY_FIELDS.values()},
+                "entries_count": 0
+            }
+        totals = days.get(day.strftime("%Y-%m-%d"))
+        if totals:
+            for field, key in SUMMARY_FIELDS.items():
+                bucket[key] += totals.get(field) or 0
+            bucket["entries_count"] += totals["entries_count"]
+        day += timedelta(days=1)
+    
+    for bucket in series.values():
+        for key in SUMMARY_FIELDS.values():
+            bucket[key] = round(bucket[key], 1)
+    return list(series.values())
+
 @app.get("/api/daily-summary")
-async def get_daily_summary(user_id: str = "default_user", date: str = None):
+async def get_daily_summary(request: Request, response: Response, user_id: str = "default_user", date: str = None):
     """Get daily nutrition summary"""
+    if not date:
+        date = datetime.now().strftime("%Y-%m-%d")
+    day = parse_date(date, "date")
     try:
-        if not date:
-            date = datetime.now().strftime("%Y-%m-%d")
+        goals = profile_goals(await get_profile(user_id))
+        headers = await data_validator(request, user_id, "food_entries", day.date(), goals)
+        if etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
         
-        # Get entries for the day
-        start_date = datetime.strptime(date, "%Y-%m-%d")
-        end_date = start_date + timedelta(days=1)
+        summary = (await summarize_range(user_id, day, day, "day"))[0]
+        del summary["period"]
+        summary.update(goals)
         
-        query = {
-            "user_id": user_id,
-            "timestamp": {
-                "$gte": start_date.isoformat(),
-                "$lt": end_date.isoformat()
-            }
-        }
+        return with_headers({"success": True, "data": summary}, response, headers)
+    except Exception as e:
+        print(f"Error fetching daily summary: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/summary-range")
+async def get_summary_range(
+    start: str,
+    end: str,
+    user_id: str = "default_user",
+    granularity: str = "day"
+):
+    """Get nutrition totals per day, week or month over a date range"""
+    start_date = parse_date(start, "start")
+    end_date = parse_date(end, "end")
+    if granularity not in SUMMARY_GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(SUMMARY_GRANULARITIES)}")
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if (end_date - start_date).days >= MAX_SUMMARY_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_SUMMARY_DAYS} days")
+    try:
+        series = await summarize_range(user_id, start_date, end_date, granularity)
         
-        entries = list(food_entries.find(query))
-        
-        # Calculate totals
-        total_calories = 0
-        total_carbs = 0
-        total_protein = 0
-        total_fat = 0
-        total_fiber = 0
-        
-        for entry in entries:
-            nutrition = entry.get("nutrition", {})
-            if isinstance(nutrition, dict):
-                # Extract numeric values from strings
-                calories = nutrition.get("calories", "0")
-                if isinstance(calories, str):
-                    calories = "".join(filter(str.isdigit, calories))
-                total_calories += int(calories) if calories else 0
-                
-                carbs = nutrition.get("carbs", "0g")
-                if isinstance(carbs, str):
-                    carbs = "".join(filter(str.isdigit, carbs.replace("g", "")))
-                total_carbs += int(carbs) if carbs else 0
-                
-                protein = nutrition.get("protein", "0g")
-                if isinstance(protein, str):
-                    protein = "".join(filter(str.isdigit, protein.replace("g", "")))
-                total_protein += int(protein) if protein else 0
-                
-                fat = nutrition.get("fat", "0g")
-                if isinstance(fat, str):
-                    fat = "".join(filter(str.isdigit, fat.replace("g", "")))
-                total_fat += int(fat) if fat else 0
-                
-                fiber = nutrition.get("fiber", "0g")
-                if isinstance(fiber, str):
-                    fiber = "".join(filter(str.isdigit, fiber.replace("g", "")))
-                total_fiber += int(fiber) if fiber else 0
-        
-        summary = {
-            "date": date,
-            "total_calories": total_calories,
-            "total_carbs": total_carbs,
-            "total_protein": total_protein,
-            "total_fat": total_fat,
-            "total_fiber": total_fiber,
-            "entries_count": len(entries),
-            "goal_calories": 2000,  # Default goal
-            "goal_carbs": 250,
-            "goal_protein": 150,
-            "goal_fat": 65
+        return {
+            "success": True,
+            "data": {
+                "start": start,
+                "end": end,
+                "granularity": granularity,
+                "goals": profile_goals(await get_profile(user_id)),
+                "series": series
+            }
         }
-        
-        return {"success": True, "data": summary}
     except Exception as e:
-        print(f"Error fetching daily summary: {str(e)}")
+        print(f"Error fetching summary range: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def weights_changed(records: List[dict]):
+    await data_versions.bump("weight_records", {record["user_id"] for record in records})
+
 @app.post("/api/save-weight")
 async def save_weight(weight_data: dict = Body(...)):
     """Save weight record"""
@@ -244,21 +1178,258 @@ async def save_weight(weight_data: dict = Body(...)):
         weight_data["timestamp"] = datetime.now().isoformat()
         weight_data["user_id"] = weight_data.get("user_id", "default_user")
         
-        result = weight_records.insert_one(weight_data)
+        await weight_records.insert(weight_data)
+        await weights_changed([weight_data])
         
         return {"success": True, "id": weight_data["id"]}
     except Exception as e:
         print(f"Error saving weight: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Bulk ingestion limits
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "10000"))
+MAX_IDEMPOTENCY_KEY_LENGTH = 200
+
+def too_many_bulk_items() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Bulk requests are limited to {BULK_MAX_ITEMS} items")
+
+async def iter_bulk_items(request: Request):
+    """Yield (item, error) for each item of a bulk body: a JSON array or NDJSON lines.
+    
+    NDJSON is parsed line by line as it arrives, so large imports are never
+    held in memory as a whole. Either body is capped at BULK_MAX_BYTES by the
+    BodySizeLimit middleware.
+    """
+    if NDJSON_MEDIA_TYPE in request.headers.get("content-type", ""):
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    try:
+                        yield json.loads(line), None
+                    except ValueError:
+                        yield None, "Invalid JSON"
+        if buffer.strip():
+            try:
+                yield json.loads(buffer), None
+            except ValueError:
+                yield None, "Invalid JSON"
+        return
+    
+    try:
+        items = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if len(items) > BULK_MAX_ITEMS:
+        raise too_many_bulk_items()
+    for item in items:
+        yield item, None
+
+def bulk_item_timestamp(item: dict) -> str:
+    """Client-supplied timestamp of an imported item in server-local time, or now"""
+    timestamp = item.get("timestamp")
+    if timestamp is None:
+        return datetime.now().isoformat()
+    try:
+        parsed = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        raise ValueError("timestamp must be an ISO 8601 date-time")
+    # Stored timestamps are naive local times; convert offsets rather than dropping them
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.isoformat()
+
+def check_idempotency_key(item: dict):
+    key = item.get("idempotency_key")
+    if key is None:
+        item.pop("idempotency_key", None)
+    elif not isinstance(key, str) or not key or len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise ValueError(f"idempotency_key must be a non-empty string of at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters")
+
+async def prepare_bulk_food_entry(item: dict) -> dict:
+    check_idempotency_key(item)
+    if "nutrition" in item and not isinstance(item["nutrition"], dict):
+        raise ValueError("nutrition must be an object")
+    return await prepare_food_entry(item, bulk_item_timestamp(item))
+
+async def prepare_bulk_weight(item: dict) -> dict:
+    check_idempotency_key(item)
+    weight = item.get("weight")
+    if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight <= 0:
+        raise ValueError("weight must be a positive number")
+    item["timestamp"] = bulk_item_timestamp(item)
+    item["id"] = str(uuid.uuid4())
+    item["user_id"] = document_user_id(item)
+    return item
+
+async def bulk_ingest(request: Request, repository, prepare, on_inserted=None) -> dict:
+    """Validate, deduplicate and insert the items of a bulk request in batches.
+    
+    Items with an idempotency_key that was already stored for the same user
+    (or appears earlier in the request) are reported as duplicates with the
+    id of the stored document instead of being inserted twice.
+    
+    A stream going past BULK_MAX_ITEMS is rejected with 413 without reading
+    the rest; batches flushed before that stay stored, so clients retry the
+    import with the same idempotency keys.
+    """
+    results = []
+    batch = []
+    seen_keys = {}
+    
+    async def flush():
+        documents = [document for _, document in batch]
+        failed = await repository.insert_unordered(documents)
+        
+        duplicate_keys = [
+            (document["user_id"], document["idempotency_key"])
+            for position, document in enumerate(documents)
+            if failed.get(position) == DUPLICATE_KEY_ERROR and "idempotency_key" in document
+        ]
+        existing_ids = await repository.ids_for_idempotency_keys(duplicate_keys)
+        
+        inserted = []
+        for position, (index, document) in enumerate(batch):
+            error = failed.get(position)
+            if error is None:
+                inserted.append(document)
+                results.append({"index": index, "status": "created", "id": document["id"]})
+            elif error == DUPLICATE_KEY_ERROR and "idempotency_key" in document:
+                existing_id = existing_ids.get((document["user_id"], document["idempotency_key"]))
+                results.append({"index": index, "status": "duplicate", "id": existing_id})
+            else:
+                results.append({"index": index, "status": "error", "error": f"Write failed with code {error}"})
+        if inserted and on_inserted:
+            await on_inserted(inserted)
+        batch.clear()
+    
+    index = 0
+    async for item, error in iter_bulk_items(request):
+        if index >= BULK_MAX_ITEMS:
+            raise too_many_bulk_items()
+        if error is None and not isinstance(item, dict):
+            error = "Item must be an object"
+        
+        document = None
+        if error is None:
+            item.pop("_id", None)
+            try:
+                document = await prepare(item)
+            except ValueError as e:
+                error = str(e)
+        
+        if error is not None:
+            results.append({"index": index, "status": "invalid", "error": error})
+        elif "idempotency_key" in document and (document["user_id"], document["idempotency_key"]) in seen_keys:
+            first = seen_keys[(document["user_id"], document["idempotency_key"])]
+            results.append({"index": index, "status": "duplicate", "id": first})
+        else:
+            if "idempotency_key" in document:
+                seen_keys[(document["user_id"], document["idempotency_key"])] = document["id"]
+            batch.append((index, document))
+            if len(batch) >= BULK_BATCH_SIZE:
+                await flush()
+        index += 1
+    
+    if batch:
+        await flush()
+    
+    results.sort(key=lambda result: result["index"])
+    counts = {status: 0 for status in ("created", "duplicate", "invalid", "error")}
+    for result in results:
+        counts[result["status"]] += 1
+    return {**counts, "results": results}
+
+@app.post("/api/food-entries/bulk")
+async def bulk_save_food_entries(request: Request):
+    """Save many food entries from a JSON array or an NDJSON stream"""
+    try:
+        async def update_rollups(entries):
+            await apply_entries(daily_rollups, entries)
+            await data_versions.bump("food_entries", (entry["user_id"] for entry in entries))
+        
+        data = await bulk_ingest(request, food_entries, prepare_bulk_food_entry, update_rollups)
+        return {"success": True, "data": data}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error saving food entries in bulk: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/weight/bulk")
+async def bulk_save_weights(request: Request):
+    """Save many weight records from a JSON array or an NDJSON stream"""
+    try:
+        data = await bulk_ingest(request, weight_records, prepare_bulk_weight, weights_changed)
+        return {"success": True, "data": data}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error saving weights in bulk: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/weight-trend")
+async def get_weight_trend(user_id: str = "default_user", days: int = Query(90, ge=1, le=3650)):
+    """Get smoothed weight, moving averages, weekly rate and goal projection"""
+    try:
+        today = datetime.now().date()
+        goal_weight = (await get_profile(user_id)).get("goal_weight")
+        if isinstance(goal_weight, bool) or not isinstance(goal_weight, (int, float)):
+            goal_weight = None
+        
+        # Trends only change when the user's weights or goal do, or the day rolls over. The
+        # shared weights version also catches writes handled by other worker processes.
+        version, _ = await data_versions.get(user_id, "weight_records")
+        key = (today.isoformat(), version, goal_weight)
+        cached = weight_trend_cache.get((user_id, days))
+        if cached is not None and cached[0] == key:
+            return {"success": True, "data": cached[1]}
+        
+        # Readings from before the window still feed its 30-day average
+        start_date = today - timedelta(days=days - 1)
+        query = {
+            "user_id": user_id,
+            "timestamp": {"$gte": (start_date - timedelta(days=29)).isoformat()},
+            "weight": {"$type": "number"}
+        }
+        timestamps, weights = [], []
+        async for record in weight_records.find(query, {"_id": 0, "timestamp": 1, "weight": 1}).sort("timestamp", 1):
+            timestamps.append(record["timestamp"])
+            weights.append(record["weight"])
+        
+        trend = await run_in_threadpool(weight_trend, timestamps, weights, goal_weight, start_date)
+        weight_trend_cache.set((user_id, days), (key, trend))
+        return {"success": True, "data": trend}
+    except Exception as e:
+        print(f"Error computing weight trend: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/weight-history")
-async def get_weight_history(user_id: str = "default_user", days: int = 30):
-    """Get weight history for user"""
+async def get_weight_history(
+    request: Request,
+    response: Response,
+    user_id: str = "default_user",
+    days: int = 30,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None
+):
+    """Get weight history for user, oldest first"""
+    projection = build_projection(fields, [])
     try:
         # Calculate date range
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days)
         
+        headers = await data_validator(request, user_id, "weight_records", end_date.date())
+        if etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        
         query = {
             "user_id": user_id,
             "timestamp": {
@@ -267,41 +1438,39 @@ async def get_weight_history(user_id: str = "default_user", days: int = 30):
             }
         }
         
-        records = list(weight_records.find(query).sort("timestamp", 1))
-        
-        # Convert ObjectId to string
-        for record in records:
-            if "_id" in record:
-                del record["_id"]
-        
-        return {"success": True, "data": records}
+        result = await list_documents(request, weight_records, query, projection, 1, limit, cursor)
+        return with_headers(result, response, headers)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching weight history: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+DEFAULT_PROFILE = {
+    "name": "User",
+    "age": 30,
+    "height": 170,
+    "goal_weight": 70,
+    "activity_level": "moderate",
+    "daily_calorie_goal": 2000
+}
+
+async def get_profile(user_id: str) -> dict:
+    """Get a user's profile through the profile cache, creating a default profile on first access"""
+    profile = profile_cache.get(user_id)
+    if profile is None:
+        profile = await user_profiles.get_or_create(
+            user_id,
+            {**DEFAULT_PROFILE, "created_at": datetime.now().isoformat()}
+        )
+        profile_cache.set(user_id, profile)
+    return profile
+
 @app.get("/api/user-profile")
 async def get_user_profile(user_id: str = "default_user"):
     """Get user profile"""
     try:
-        profile = user_profiles.find_one({"user_id": user_id})
-        
-        if not profile:
-            # Create default profile
-            profile = {
-                "user_id": user_id,
-                "name": "User",
-                "age": 30,
-                "height": 170,
-                "goal_weight": 70,
-                "activity_level": "moderate",
-                "daily_calorie_goal": 2000,
-                "created_at": datetime.now().isoformat()
-            }
-            user_profiles.insert_one(profile)
-        
-        # Remove ObjectId
-        if "_id" in profile:
-            del profile["_id"]
+        profile = await get_profile(user_id)
         
         return {"success": True, "data": profile}
     except Exception as e:
@@ -315,17 +1484,16 @@ async def update_user_profile(profile_data: dict = Body(...)):
         user_id = profile_data.get("user_id", "default_user")
         profile_data["updated_at"] = datetime.now().isoformat()
         
-        result = user_profiles.update_one(
-            {"user_id": user_id},
-            {"$set": profile_data},
-            upsert=True
-        )
+        modified = await user_profiles.update(user_id, profile_data)
+        profile_cache.delete(user_id)
+        await profile_version.bump()
         
-        return {"success": True, "modified": result.modified_count > 0}
+        return {"success": True, "modified": modified}
     except Exception as e:
         print(f"Error updating user profile: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    # Same as main.py: one worker process per CPU core
+    import main
+    main.main()
\ No newline at end of file
@@ -0,0 +1,196 @@
+import asyncio
+import random
+import time
+from typing import Optional
+
+import httpx
+
+from circuit_breaker import CircuitOpenError
+from metrics import UPSTREAM_DURATION, UPSTREAM_REQUESTS, endpoint_label
+from ratelimit import PrioritySemaphore, RateLimitExceeded
+
+SPOONACULAR_BASE_URL = "https://api.spoonacular.com"
+
+# Status codes worth retrying: rate limiting and transient upstream failures
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Not retried, but a bad key or an exhausted plan fails every call, so these trip the breaker too
+BREAKER_FAILURE_STATUS_CODES = RETRY_STATUS_CODES | {401, 402, 403}
+
+# Lower numbers get free slots first: user-facing calls before warm-up jobs
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+
+class SpoonacularError(Exception):
+    """Raised when Spoonacular does not return a usable response"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SpoonacularClient:
+    """Shared async client for the Spoonacular API.
+
+    One instance lives for the whole app so that every request reuses the same
+    pool of keep-alive connections. Concurrency towards the provider is bounded
+    by a priority semaphore, an optional rate limiter paces calls to stay within
+    the quota, and failed calls are retried with exponential backoff. An optional
+    circuit breaker makes calls fail fast while the provider is down or slow.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = SPOONACULAR_BASE_URL,
+        timeout: float = 10.0,
+        connect_timeout: float = 3.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        max_concurrency: int = 10,
+        max_retries: int = 2,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        rate_limiter=None,
+        circuit_breaker=None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[PrioritySemaphore] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                transport=self._transport,
+            )
+        return self._client
+
+    @property
+    def semaphore(self) -> PrioritySemaphore:
+        if self._semaphore is None:
+            self._semaphore = PrioritySemaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def start(self):
+        """Open the connection pool"""
+        self.client
+
+    async def close(self):
+        """Close the connection pool"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._semaphore = None
+
+    def _backoff_delay(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        # Full jitter so that concurrent retries do not hit the provider in lockstep
+        return random.uniform(0, delay)
+
+    async def _send(self, method: str, path: str, priority: int, **kwargs) -> httpx.Response:
+        """One attempt: pass the circuit breaker, wait for a slot and a token, then send"""
+        endpoint = endpoint_label(path)
+        breaker = self.circuit_breaker
+        if breaker is not None:
+            try:
+                breaker.before_call()
+            except CircuitOpenError as e:
+                UPSTREAM_REQUESTS.inc(service="spoonacular", endpoint=endpoint, outcome="circuit_open")
+                raise SpoonacularError(f"{method} {path} not sent: {e}", status_code=503)
+
+        started = None
+        success = None
+        outcome = None
+        try:
+            async with self.semaphore.slot(priority):
+                if self.rate_limiter is not None:
+                    try:
+                        await self.rate_limiter.acquire()
+                    except RateLimitExceeded as e:
+                        outcome = "rate_limited"
+                        raise SpoonacularError(f"{method} {path} not sent: rate limit reached ({e})", status_code=429)
+                started = time.monotonic()
+                try:
+                    response = await self.client.request(method, path, **kwargs)
+                except httpx.TransportError:
+                    success = False
+                    outcome = "transport_error"
+                    raise
+            success = response.status_code not in BREAKER_FAILURE_STATUS_CODES
+            outcome = "ok" if response.status_code == 200 else f"http_{response.status_code}"
+            return response
+        finally:
+            if outcome is not None:
+                UPSTREAM_REQUESTS.inc(service="spoonacular", endpoint=endpoint, outcome=outcome)
+            if started is not None and success is not None:
+                UPSTREAM_DURATION.observe(time.monotonic() - started, service="spoonacular", endpoint=endpoint)
+            if breaker is not None:
+                # Calls that were never sent, or were cancelled, say nothing about the provider
+                if success is None:
+                    breaker.release()
+                else:
+                    breaker.record(success, time.monotonic() - started)
+
+    async def request(
+        self, method: str, path: str, priority: int = PRIORITY_INTERACTIVE, **kwargs
+    ) -> httpx.Response:
+        """Send a request to Spoonacular, retrying transient failures"""
+        params = dict(kwargs.pop("params", None) or {})
+        params["apiKey"] = self.api_key
+
+        last_error: Optional[SpoonacularError] = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self._backoff_delay(attempt - 1))
+            try:
+                response = await self._send(method, path, priority, params=params, **kwargs)
+            except httpx.TransportError as e:
+                last_error = SpoonacularError(f"{method} {path} failed: {e}")
+                continue
+
+            if response.status_code == 200:
+                return response
+
+            last_error = SpoonacularError(
+                f"{method} {path} returned {response.status_code}",
+                status_code=response.status_code,
+            )
+            if response.status_code not in RETRY_STATUS_CODES:
+                break
+
+        raise last_error
+
+    async def analyze_image(
+        self,
+        image_data: bytes,
+        filename: str = "image.jpg",
+        content_type: str = "image/jpeg",
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> dict:
+        """Run food recognition on an image"""
+        files = {"file": (filename, image_data, content_type)}
+        response = await self.request("POST", "/food/images/analyze", priority=priority, files=files)
+        return response.json()
+
+    async def recipe_nutrition(self, recipe_id, priority: int = PRIORITY_INTERACTIVE) -> dict:
+        """Fetch the nutrition widget for a recipe"""
+        response = await self.request("GET", f"/recipes/{recipe_id}/nutritionWidget.json", priority=priority)
+        return response.json()
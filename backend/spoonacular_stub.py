@@ -0,0 +1,156 @@
+"""Local stand-in for the Spoonacular API.
+
+Serves canned responses for the two endpoints the backend uses so that the
+client can be exercised without network access or API quota:
+
+    python spoonacular_stub.py --port 8090 --latency 0.2 --error-rate 0.1
+
+and point the backend at it with SPOONACULAR_BASE_URL=http://127.0.0.1:8090.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RECIPE_NUTRITION_PATH = re.compile(r"^/recipes/(\d+)/nutritionWidget\.json$")
+
+ANALYZE_RESPONSE = {
+    "category": {"name": "burger", "probability": 0.93},
+    "nutrition": {},
+    "recipes": [
+        {"id": 642539, "title": "Falafel Burger", "imageType": "jpg", "url": "falafel-burger-642539"},
+        {"id": 663050, "title": "Tex-Mex Burger", "imageType": "jpg", "url": "tex-mex-burger-663050"},
+    ],
+}
+
+
+def recipe_nutrition_response(recipe_id: int) -> dict:
+    return {
+        "calories": "596",
+        "carbs": "52g",
+        "fat": "31g",
+        "protein": "28g",
+        "recipeId": recipe_id,
+    }
+
+
+class StubState:
+    """Behaviour knobs and request counters shared by all handler threads"""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, error_status: int = 503):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def record(self, path: str):
+        with self.lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+
+    def reset(self):
+        with self.lock:
+            self.counts = {}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self) -> StubState:
+        return self.server.state
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, payload_for_path):
+        path = self.path.split("?", 1)[0]
+        self.state.record(path)
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        if self.state.error_rate and random.random() < self.state.error_rate:
+            self._send_json(self.state.error_status, {"status": "failure", "code": self.state.error_status})
+            return
+
+        payload = payload_for_path(path)
+        if payload is None:
+            self._send_json(404, {"status": "failure", "code": 404})
+        else:
+            self._send_json(200, payload)
+
+    def do_POST(self):
+        self._handle(lambda path: ANALYZE_RESPONSE if path == "/food/images/analyze" else None)
+
+    def do_GET(self):
+        def payload_for_path(path):
+            match = RECIPE_NUTRITION_PATH.match(path)
+            return recipe_nutrition_response(int(match.group(1))) if match else None
+
+        self._handle(payload_for_path)
+
+
+class SpoonacularStub:
+    """Run the stub in a background thread, e.g. from tests or benchmarks"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **state_kwargs):
+        self.server = ThreadingHTTPServer((host, port), StubHandler)
+        self.server.daemon_threads = True
+        self.server.state = StubState(**state_kwargs)
+        self._thread = None
+
+    @property
+    def state(self) -> StubState:
+        return self.server.state
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Spoonacular stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503)
+    args = parser.parse_args()
+
+    stub = SpoonacularStub(
+        args.host, args.port,
+        latency=args.latency, error_rate=args.error_rate, error_status=args.error_status,
+    )
+    print(f"Spoonacular stub listening on {stub.base_url}")
+    stub.server.serve_forever()
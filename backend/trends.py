@@ -0,0 +1,125 @@
+"""Weight-trend analytics over a user's weight records.
+
+Readings are put on a daily grid (several readings on one day are averaged,
+days without one are interpolated for smoothing only). Everything is computed
+with vectorized NumPy over that grid.
+"""
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+
+# Daily smoothing factor of the exponentially smoothed trend line
+EMA_ALPHA = 0.1
+
+# Days of readings the rate of change is fitted over
+RATE_WINDOW_DAYS = 30
+
+# Projections further out than this are not meaningful
+MAX_PROJECTION_DAYS = 3 * 365
+
+
+def ema(values: np.ndarray, alpha: float = EMA_ALPHA) -> np.ndarray:
+    """Exponential moving average of a daily series, seeded with its first value.
+
+    Uses the closed form e[j] = d^(j+1) e[-1] + a d^j cumsum(x / d^k), evaluated
+    in chunks short enough that d^-k cannot overflow.
+    """
+    decay = 1.0 - alpha
+    chunk = len(values) if decay == 1.0 else max(1, min(512, int(600 / -np.log(decay))))
+    result = np.empty(len(values))
+    previous = values[0] if len(values) else 0.0
+    for start in range(0, len(values), chunk):
+        block = values[start:start + chunk]
+        powers = decay ** np.arange(len(block))
+        result[start:start + len(block)] = decay * powers * previous + alpha * powers * np.cumsum(block / powers)
+        previous = result[start + len(block) - 1]
+    return result
+
+
+def trailing_mean(sums: np.ndarray, counts: np.ndarray, window: int) -> np.ndarray:
+    """Mean of the readings in the `window` calendar days ending on each day (NaN if none)"""
+    total = np.cumsum(sums)
+    number = np.cumsum(counts)
+    total[window:] = total[window:] - total[:-window]
+    number[window:] = number[window:] - number[:-window]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(number > 0, total / number, np.nan)
+
+
+def _rounded(value) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), 2)
+
+
+def weight_trend(timestamps: List[str], weights: List[float], goal_weight: Optional[float] = None,
+                 since: Optional[date] = None) -> dict:
+    """Smoothed weight, 7- and 30-day averages, weekly rate and goal projection.
+
+    Readings before `since` feed the averages but are not returned as points.
+    """
+    trend = {
+        "points": [],
+        "current": None,
+        "rate_per_week": None,
+        "goal_weight": goal_weight,
+        "goal_reached": False,
+        "projected_goal_date": None,
+    }
+    if not timestamps:
+        return trend
+
+    days = np.array([datetime.fromisoformat(timestamp).date() for timestamp in timestamps], dtype="datetime64[D]")
+    values = np.asarray(weights, dtype=float)
+    first = days.min()
+    offsets = (days - first).astype(int)
+    length = offsets.max() + 1
+
+    sums = np.bincount(offsets, weights=values, minlength=length)
+    counts = np.bincount(offsets, minlength=length)
+    measured = np.flatnonzero(counts)
+    daily = sums[measured] / counts[measured]
+
+    smoothed = ema(np.interp(np.arange(length), measured, daily))
+    ma7 = trailing_mean(sums, counts, 7)
+    ma30 = trailing_mean(sums, counts, 30)
+
+    start = 0 if since is None else max(0, int((np.datetime64(since, "D") - first).astype(int)))
+    shown = measured[measured >= start]
+    trend["points"] = [
+        {
+            "date": str(first + np.timedelta64(int(day), "D")),
+            "weight": round(float(sums[day] / counts[day]), 2),
+            "ema": _rounded(smoothed[day]),
+            "ma7": _rounded(ma7[day]),
+            "ma30": _rounded(ma30[day]),
+        }
+        for day in shown
+    ]
+
+    last = length - 1
+    current = float(smoothed[last])
+    trend["current"] = {
+        "date": str(first + np.timedelta64(int(last), "D")),
+        "ema": _rounded(current),
+        "ma7": _rounded(ma7[last]),
+        "ma30": _rounded(ma30[last]),
+    }
+
+    # Least-squares slope of the daily weights over the recent window
+    recent = measured >= last - RATE_WINDOW_DAYS + 1
+    if recent.sum() >= 2:
+        slope = np.polyfit(measured[recent], daily[recent], 1)[0]
+        trend["rate_per_week"] = round(float(slope * 7), 3)
+    else:
+        slope = 0.0
+
+    if goal_weight is not None:
+        remaining = goal_weight - current
+        if abs(remaining) < 0.1:
+            trend["goal_reached"] = True
+        elif slope and remaining / slope > 0:
+            days_to_goal = remaining / slope
+            if days_to_goal <= MAX_PROJECTION_DAYS:
+                last_day = (first + np.timedelta64(int(last), "D")).astype(date)
+                trend["projected_goal_date"] = (last_day + timedelta(days=int(np.ceil(days_to_goal)))).isoformat()
+    return trend
@@ -0,0 +1,103 @@
+"""Bounded, streaming handling of uploaded images.
+
+Starlette parses multipart bodies into a SpooledTemporaryFile per file, kept
+in memory up to a threshold and moved to disk beyond it. Nothing here copies
+an upload into one bytes object: request bodies over a per-path limit are
+rejected with 413 while they arrive (or before, when Content-Length says so),
+and uploads are hashed chunk by chunk and handed on as the spooled file.
+"""
+import hashlib
+import io
+from typing import BinaryIO, Dict
+
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+from starlette.formparsers import MultiPartParser
+from starlette.responses import JSONResponse
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(HTTPException):
+
+    def __init__(self, limit: int):
+        super().__init__(status_code=413, detail=f"Upload is larger than the limit of {limit} bytes")
+
+
+def set_spool_threshold(max_bytes: int):
+    """Keep uploads up to max_bytes in memory; larger ones are spooled to disk"""
+    MultiPartParser.max_file_size = max_bytes
+
+
+class BodySizeLimit:
+    """ASGI middleware rejecting request bodies over a per-path limit with 413"""
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Refuse before reading anything when the client declares the size up front
+        declared = Headers(scope=scope).get("content-length", "")
+        if declared.isdigit() and int(declared) > limit:
+            error = UploadTooLarge(limit)
+            await JSONResponse({"detail": error.detail}, status_code=error.status_code)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised into body parsing, which FastAPI answers like any HTTPException
+                    raise UploadTooLarge(limit)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class SpooledUpload:
+    """An uploaded file with its size and SHA-256, read from its spooled file"""
+
+    def __init__(self, file: BinaryIO, size: int, sha256: str, filename: str = None):
+        self.file = file
+        self.size = size
+        self.sha256 = sha256
+        self.filename = filename
+
+    def close(self):
+        self.file.close()
+
+
+async def read_upload(upload: UploadFile, max_bytes: int, detach: bool = False) -> SpooledUpload:
+    """Hash an upload in chunks, rejecting it with 413 once it exceeds max_bytes.
+
+    FastAPI closes form files when the handler returns; with detach=True the
+    spooled file is taken over from the UploadFile so it can be used later,
+    e.g. while a streaming response runs, and must be closed by the caller.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    await upload.seek(0)
+    while True:
+        chunk = await upload.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        digest.update(chunk)
+    await upload.seek(0)
+
+    file = upload.file
+    if detach:
+        upload.file = io.BytesIO()
+    return SpooledUpload(file, size, digest.hexdigest(), upload.filename)
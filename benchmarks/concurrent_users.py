@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Throughput of the API under many concurrent users.
+
+Each simulated user loops over a mix of the app's everyday calls (save an
+entry, read today's summary, history and profile) until the duration runs
+out. Point it at a running backend:
+
+    python benchmarks/concurrent_users.py --url http://localhost:8001 --users 200 --duration 30
+
+Because handlers no longer block the event loop on MongoDB, requests from
+different users overlap, so requests per second should keep rising with
+--users until MongoDB or the CPU saturates instead of staying flat.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def simulated_user(client, user_id, deadline, latencies, errors):
+    calls = [
+        ("save-food-entry", lambda: client.post("/api/save-food-entry", json={
+            "user_id": user_id,
+            "category": "Oatmeal",
+            "nutrition": {"calories": str(random.randint(150, 450)), "protein": "8g", "carbs": "40g"},
+        })),
+        ("daily-summary", lambda: client.get("/api/daily-summary", params={"user_id": user_id})),
+        ("food-entries", lambda: client.get("/api/food-entries", params={"user_id": user_id, "limit": 20})),
+        ("weight-history", lambda: client.get("/api/weight-history", params={"user_id": user_id})),
+        ("user-profile", lambda: client.get("/api/user-profile", params={"user_id": user_id})),
+    ]
+    while time.perf_counter() < deadline:
+        name, call = random.choice(calls)
+        started = time.perf_counter()
+        try:
+            response = await call()
+            ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        latencies[name].append(time.perf_counter() - started)
+        if not ok:
+            errors[name] += 1
+
+
+async def run(url, users, duration):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(
+            simulated_user(client, f"bench_{uuid.uuid4().hex[:8]}", deadline, latencies, errors)
+            for _ in range(users)
+        ))
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8001")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds")
+    args = parser.parse_args()
+
+    latencies, errors = asyncio.run(run(args.url, args.users, args.duration))
+
+    total = sum(len(samples) for samples in latencies.values())
+    print(f"{args.users} users, {args.duration:.0f}s: {total} requests, {total / args.duration:.1f} req/s")
+    print(f"{'endpoint':<18}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for name, samples in sorted(latencies.items()):
+        print(
+            f"{name:<18}{len(samples):>8}{errors[name]:>8}"
+            f"{percentile(samples, 0.50) * 1000:>10.1f}"
+            f"{percentile(samples, 0.95) * 1000:>10.1f}"
+            f"{statistics.mean(samples) * 1000:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
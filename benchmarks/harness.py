@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""Reproducible load test of the backend against a local Spoonacular stub.
+
+Starts the Spoonacular stub and the backend (on mongomock unless --mongo-url
+is given), seeds food entries and weight records through the bulk endpoints,
+then runs simulated users over a mixed workload and reports latency
+percentiles and requests per second per endpoint:
+
+    python benchmarks/harness.py --users 50 --duration 30 --output results/baseline.json
+    python benchmarks/harness.py --users 50 --duration 30 --compare results/baseline.json
+
+Use --url to benchmark an already running backend instead; it then has to be
+configured against the stub (or real services) by whoever started it. With
+--mongo-url the backend runs through the production entry point (main.py)
+with --workers processes; scaling.py compares several worker counts.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+
+from concurrent_users import percentile
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from spoonacular_stub import SpoonacularStub  # noqa: E402
+
+# Relative weight of each call in the workload
+DEFAULT_MIX = {
+    "analyze-food": 5,
+    "save-food-entry": 10,
+    "save-weight": 3,
+    "daily-summary": 25,
+    "summary-range": 10,
+    "food-entries": 25,
+    "weight-history": 12,
+    "weight-trend": 10,
+}
+
+FOODS = ["Oatmeal", "Chicken salad", "Pasta", "Burger", "Yogurt", "Sushi", "Omelette", "Rice bowl"]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_images(count: int, seed: int) -> list:
+    """Distinct small JPEGs; uploads pick from these so repeats hit the analysis cache"""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        buffer = io.BytesIO()
+        color = tuple(rng.randrange(256) for _ in range(3))
+        Image.new("RGB", (640, 480), color).save(buffer, format="JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+def start_backend(port: int, stub_url: str, mongo_url: str, db_name: str, workers: int,
+                  verbose: bool) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        SPOONACULAR_BASE_URL=stub_url,
+        DB_NAME=db_name,
+        # Measure the app, not the quota pacing meant for the real provider
+        SPOONACULAR_RATE_LIMIT=os.environ.get("SPOONACULAR_RATE_LIMIT", "0"),
+    )
+    if mongo_url:
+        env["MONGO_URL"] = mongo_url
+        command = [
+            sys.executable, os.path.join(BACKEND_DIR, "main.py"),
+            "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+        ]
+    else:
+        # mongomock keeps its data in the process, so it cannot back several workers
+        if workers != 1:
+            raise SystemExit("--workers above 1 needs --mongo-url")
+        command = [sys.executable, os.path.join(BENCHMARKS_DIR, "serve.py"), "--port", str(port), "--mongomock"]
+    # The backend prints its log lines to stdout; errors still reach stderr
+    return subprocess.Popen(command, env=env, stdout=None if verbose else subprocess.DEVNULL)
+
+
+async def wait_until_ready(url: str, process: subprocess.Popen = None, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=url, timeout=2) as client:
+        while time.perf_counter() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"backend exited with code {process.returncode}")
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"backend at {url} did not start within {timeout}s")
+
+
+def ndjson(items) -> bytes:
+    return "".join(json.dumps(item) + "\n" for item in items).encode()
+
+
+async def seed(client: httpx.AsyncClient, user_ids: list, entries_per_user: int, weights_per_user: int,
+               days: int, rng: random.Random):
+    """Spread entries and daily-ish weights over the last `days` days for each user"""
+    now = datetime.now()
+    for user_id in user_ids:
+        entries = [
+            {
+                "user_id": user_id,
+                "category": rng.choice(FOODS),
+                "timestamp": (now - timedelta(minutes=rng.randrange(days * 24 * 60))).isoformat(),
+                "nutrition": {
+                    "calories": str(rng.randint(80, 900)),
+                    "carbs": f"{rng.randint(0, 120)}g",
+                    "protein": f"{rng.randint(0, 60)}g",
+                    "fat": f"{rng.randint(0, 50)}g",
+                },
+            }
+            for _ in range(entries_per_user)
+        ]
+        weight = rng.uniform(60, 100)
+        weights = []
+        for index in range(weights_per_user):
+            weight += rng.uniform(-0.4, 0.3)
+            weights.append({
+                "user_id": user_id,
+                "weight": round(weight, 1),
+                "timestamp": (now - timedelta(days=weights_per_user - index, hours=rng.randrange(12))).isoformat(),
+            })
+        headers = {"Content-Type": "application/x-ndjson"}
+        for path, items in (("/api/food-entries/bulk", entries), ("/api/weight/bulk", weights)):
+            response = await client.post(path, content=ndjson(items), headers=headers)
+            response.raise_for_status()
+
+
+def workload(client: httpx.AsyncClient, user_id: str, images: list, rng: random.Random) -> dict:
+    today = datetime.now().date()
+    return {
+        "analyze-food": lambda: client.post(
+            "/api/analyze-food",
+            files={"file": ("meal.jpg", rng.choice(images), "image/jpeg")},
+        ),
+        "save-food-entry": lambda: client.post("/api/save-food-entry", json={
+            "user_id": user_id,
+            "category": rng.choice(FOODS),
+            "nutrition": {"calories": str(rng.randint(80, 900)), "protein": "12g", "carbs": "40g"},
+        }),
+        "save-weight": lambda: client.post("/api/save-weight", json={
+            "user_id": user_id, "weight": round(rng.uniform(60, 100), 1),
+        }),
+        "daily-summary": lambda: client.get("/api/daily-summary", params={"user_id": user_id}),
+        "summary-range": lambda: client.get("/api/summary-range", params={
+            "user_id": user_id,
+            "start": (today - timedelta(days=29)).isoformat(),
+            "end": today.isoformat(),
+            "granularity": "week",
+        }),
+        "food-entries": lambda: client.get("/api/food-entries", params={"user_id": user_id, "limit": 50}),
+        "weight-history": lambda: client.get("/api/weight-history", params={"user_id": user_id}),
+        "weight-trend": lambda: client.get("/api/weight-trend", params={"user_id": user_id}),
+    }
+
+
+async def simulated_user(client, user_id, mix, images, deadline, latencies, errors, seed_value):
+    rng = random.Random(seed_value)
+    calls = workload(client, user_id, images, rng)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            response = await calls[name]()
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        latencies[name].append(time.perf_counter() - started)
+        if not ok:
+            errors[name] += 1
+
+
+def summarize(samples: list, errors: int, duration: float) -> dict:
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "rps": round(len(samples) / duration, 2),
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.mean(samples) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+
+async def run_load(url: str, users: int, duration: float, mix: dict, images: list, user_ids: list, seed_value: int):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(
+            simulated_user(client, user_ids[index % len(user_ids)], mix, images, deadline, latencies, errors,
+                           seed_value + index)
+            for index in range(users)
+        ))
+        elapsed = time.perf_counter() - started
+    endpoints = {name: summarize(samples, errors[name], elapsed) for name, samples in sorted(latencies.items())}
+    total = sum(result["count"] for result in endpoints.values())
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "requests": total,
+        "errors": sum(result["errors"] for result in endpoints.values()),
+        "rps": round(total / elapsed, 2),
+        "endpoints": endpoints,
+    }
+
+
+async def benchmark(args) -> dict:
+    rng = random.Random(args.seed)
+    mix = {name: weight for name, weight in DEFAULT_MIX.items() if weight > 0}
+    for override in args.mix or []:
+        name, _, weight = override.partition("=")
+        mix[name] = float(weight)
+    mix = {name: weight for name, weight in mix.items() if weight > 0}
+
+    stub = process = None
+    url = args.url
+    try:
+        if url is None:
+            stub = SpoonacularStub(latency=args.stub_latency, error_rate=args.stub_error_rate).start()
+            port = free_port()
+            url = f"http://127.0.0.1:{port}"
+            process = start_backend(port, stub.base_url, args.mongo_url, f"benchmark_{uuid.uuid4().hex[:8]}",
+                                    args.workers, args.verbose)
+        await wait_until_ready(url, process)
+
+        user_ids = [f"bench_{index:04d}" for index in range(args.seed_users)]
+        seed_started = time.perf_counter()
+        async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+            await seed(client, user_ids, args.entries_per_user, args.weights_per_user, args.days, rng)
+        seed_elapsed = time.perf_counter() - seed_started
+        print(f"Seeded {len(user_ids)} users in {seed_elapsed:.1f}s")
+
+        if args.warmup > 0:
+            await run_load(url, args.users, args.warmup, mix, make_images(args.images, args.seed), user_ids, args.seed)
+        results = await run_load(url, args.users, args.duration, mix, make_images(args.images, args.seed),
+                                 user_ids, args.seed)
+        results["upstream_calls"] = dict(stub.state.counts) if stub is not None else None
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+        if stub is not None:
+            stub.stop()
+
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "url": args.url,
+            "mongo": args.mongo_url or "mongomock",
+            "workers": args.workers,
+            "users": args.users,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "seed": args.seed,
+            "seed_users": args.seed_users,
+            "entries_per_user": args.entries_per_user,
+            "weights_per_user": args.weights_per_user,
+            "distinct_images": args.images,
+            "stub_latency_s": args.stub_latency,
+            "stub_error_rate": args.stub_error_rate,
+            "mix": mix,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "seed_elapsed_s": round(seed_elapsed, 2),
+        **results,
+    }
+
+
+def print_report(report: dict, baseline: dict = None):
+    config = report["config"]
+    print(f"{config['users']} users, {report['elapsed_s']:.0f}s: {report['requests']} requests, "
+          f"{report['rps']:.1f} req/s, {report['errors']} errors")
+    header = f"{'endpoint':<17}{'count':>7}{'errors':>7}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    if baseline:
+        header += f"{'p95 vs base':>13}{'req/s vs base':>15}"
+    print(header)
+    for name, result in report["endpoints"].items():
+        line = (
+            f"{name:<17}{result['count']:>7}{result['errors']:>7}{result['rps']:>8.1f}"
+            f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+        )
+        before = (baseline or {}).get("endpoints", {}).get(name)
+        if before:
+            line += f"{change(before['p95_ms'], result['p95_ms']):>13}{change(before['rps'], result['rps']):>15}"
+        print(line)
+
+
+def change(before: float, after: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def build_parser(description: str = __doc__) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running backend instead of starting one")
+    parser.add_argument("--mongo-url", help="MongoDB for the started backend (default: in-memory mongomock)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes of the started backend")
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of measured load")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of unmeasured load first")
+    parser.add_argument("--seed", type=int, default=1, help="random seed, for repeatable runs")
+    parser.add_argument("--seed-users", type=int, default=50)
+    parser.add_argument("--entries-per-user", type=int, default=300)
+    parser.add_argument("--weights-per-user", type=int, default=90)
+    parser.add_argument("--days", type=int, default=90, help="days the seeded entries are spread over")
+    parser.add_argument("--images", type=int, default=20, help="distinct images uploads choose from")
+    parser.add_argument("--stub-latency", type=float, default=0.15, help="seconds the Spoonacular stub adds")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--mix", action="append", metavar="NAME=WEIGHT",
+                        help=f"override a workload weight ({', '.join(DEFAULT_MIX)})")
+    parser.add_argument("--verbose", action="store_true", help="show the started backend's output")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    return parser
+
+
+def write_json(path: str, data: dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as handle:
+        json.dump(data, handle, indent=2)
+    print(f"Results written to {path}")
+
+
+def main():
+    args = build_parser().parse_args()
+
+    report = asyncio.run(benchmark(args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+    print_report(report, baseline)
+
+    if args.output:
+        write_json(args.output, report)
+
+
+if __name__ == "__main__":
+    main()
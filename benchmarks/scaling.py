@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Throughput of the backend against its number of worker processes.
+
+Runs the load-test harness once per worker count, each time starting the
+backend through its production entry point (backend/main.py) on a fresh
+database. Workers must share a real MongoDB, since mongomock keeps data per
+process:
+
+    python benchmarks/scaling.py --mongo-url mongodb://localhost:27017 --worker-counts 1,2,4 --users 64
+
+Throughput can only grow up to the number of CPU cores, which are shared
+with MongoDB and the Spoonacular stub when they run on the same machine.
+All harness options apply to every run.
+"""
+import asyncio
+import os
+from datetime import datetime
+
+from harness import benchmark, build_parser, write_json
+
+
+def print_scaling(runs: list):
+    base = runs[0]
+    print(f"{'workers':>8}{'req/s':>10}{'speedup':>9}{'efficiency':>12}{'worst p95 ms':>14}{'errors':>8}")
+    for run in runs:
+        workers = run["config"]["workers"]
+        speedup = run["rps"] / base["rps"] if base["rps"] else 0.0
+        efficiency = speedup / (workers / base["config"]["workers"])
+        worst_p95 = max((result["p95_ms"] for result in run["endpoints"].values()), default=0.0)
+        print(f"{workers:>8}{run['rps']:>10.1f}{speedup:>8.2f}x{efficiency:>11.0%}{worst_p95:>14.1f}{run['errors']:>8}")
+
+
+def main():
+    parser = build_parser(__doc__)
+    parser.add_argument("--worker-counts", default="1,2,4", help="comma-separated worker counts to compare")
+    args = parser.parse_args()
+    if args.url:
+        parser.error("--url cannot be used: the backend is started once per worker count")
+    if not args.mongo_url:
+        parser.error("--mongo-url is required: workers cannot share mongomock data")
+
+    counts = [int(count) for count in args.worker_counts.split(",")]
+    if max(counts) > (os.cpu_count() or 1):
+        print(f"Note: {os.cpu_count()} CPUs; counts above that cannot add throughput")
+
+    runs = []
+    for workers in counts:
+        args.workers = workers
+        print(f"--- {workers} worker(s)")
+        runs.append(asyncio.run(benchmark(args)))
+        print(f"{runs[-1]['rps']:.1f} req/s")
+
+    print_scaling(runs)
+    if args.output:
+        write_json(args.output, {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "worker_counts": counts,
+            "runs": runs,
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Run the backend for benchmarks, optionally on an in-memory MongoDB.
+
+    python benchmarks/serve.py --port 8001 --mongomock
+
+With --mongomock the Motor client is replaced by mongomock-motor the same
+way the tests do it, so no MongoDB server is needed. Everything else is
+configured through the usual environment variables.
+"""
+import argparse
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+
+def use_mongomock():
+    from unittest import mock
+
+    import mongomock.gridfs
+    from mongomock_motor import AsyncMongoMockClient
+
+    mock.patch(
+        "motor.motor_asyncio.AsyncIOMotorClient",
+        lambda *args, **kwargs: AsyncMongoMockClient(),
+    ).start()
+    mongomock.gridfs.enable_gridfs_integration()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--mongomock", action="store_true", help="use an in-memory MongoDB")
+    args = parser.parse_args()
+
+    # The backend resolves its modules and relative paths from its own directory
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    if args.mongomock:
+        use_mongomock()
+
+    import uvicorn
+
+    import server
+
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -203,6 +203,11 @@ const FoodCamera = ({ onFoodAnalyzed }) => {
       {nutritionData && (
         <div className="nutrition-results">
           <h3>Food Analysis Results</h3>
+          {nutritionData.source === 'fallback' && (
+            <div className="error-message">
+              Food recognition is unavailable right now, so these values are estimates.
+            </div>
+          )}
           <div className="food-info">
             <div className="food-category">
               <strong>Category:</strong> {nutritionData.category}
@@ -370,10 +375,16 @@ const FoodHistory = ({ onRefresh }) => {
           {foodEntries.map((entry) => (
             <div key={entry.id} className="history-item">
               <div className="history-image">
-                {entry.image_data && (
+                {entry.thumbnail ? (
+                  <img 
+                    src={`data:image/jpeg;base64,${entry.thumbnail}`} 
+                    alt={entry.category} 
+                  />
+                ) : entry.image_id && (
                   <img 
-                    src={`data:image/jpeg;base64,${entry.image_data}`} 
+                    src={`${process.env.REACT_APP_BACKEND_URL}/api/images/${entry.image_id}`} 
                     alt={entry.category} 
+                    loading="lazy"
                   />
                 )}
               </div>
@@ -0,0 +1,43 @@
+import os
+import sys
+from unittest import mock
+
+import mongomock
+import mongomock.gridfs
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+# The backend is run from its own directory (uvicorn server:app), so make its
+# modules importable the same way here.
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# No MongoDB server is needed for the tests: the backend's Motor client is
+# replaced by mongomock-motor, backed by one in-memory store that tests can
+# also read and seed synchronously through the sync_db fixture.
+os.environ["MONGO_URL"] = "mongodb://localhost:27017"
+os.environ["DB_NAME"] = "nutrition_tracker_test"
+MOCK_MONGO = mongomock.MongoClient()
+mock.patch(
+    "motor.motor_asyncio.AsyncIOMotorClient",
+    lambda *args, **kwargs: AsyncMongoMockClient(mock_mongo_client=MOCK_MONGO),
+).start()
+mongomock.gridfs.enable_gridfs_integration()
+
+
+@pytest.fixture
+def sync_db():
+    return MOCK_MONGO[os.environ["DB_NAME"]]
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    import server
+
+    yield
+    MOCK_MONGO.drop_database(os.environ["DB_NAME"])
+    server.analysis_cache.memory.clear()
+    server.recipe_nutrition_cache.memory.clear()
+    server.weight_trend_cache.clear()
+    server.profile_cache.clear()
@@ -0,0 +1,119 @@
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+
+def test_bulk_food_entries_from_json_array(sync_db):
+    items = [
+        {"idempotency_key": "a", "timestamp": "2026-02-01T08:00:00", "nutrition": {"calories": "300"}},
+        {"idempotency_key": "b", "timestamp": "2026-02-01T13:00:00", "nutrition": {"calories": "500", "protein": "0.5g"}},
+        {"idempotency_key": "a", "timestamp": "2026-02-01T08:00:00", "nutrition": {"calories": "300"}},
+        {"timestamp": "yesterday"},
+        "not an object",
+    ]
+
+    with TestClient(server.app) as client:
+        first = client.post("/api/food-entries/bulk", json=items).json()["data"]
+        retry = client.post("/api/food-entries/bulk", json=items[:2]).json()["data"]
+        summary = client.get("/api/daily-summary", params={"date": "2026-02-01"}).json()["data"]
+
+    assert [result["status"] for result in first["results"]] == ["created", "created", "duplicate", "invalid", "invalid"]
+    assert first["results"][2]["id"] == first["results"][0]["id"]
+    assert (first["created"], first["duplicate"], first["invalid"]) == (2, 1, 2)
+
+    # Re-sending the same keys inserts nothing and points at the stored entries
+    assert retry["created"] == 0
+    assert [result["id"] for result in retry["results"]] == [result["id"] for result in first["results"][:2]]
+
+    assert sync_db.food_entries.count_documents({}) == 2
+    assert summary["total_calories"] == 800
+    assert summary["total_protein"] == 0.5
+    assert summary["entries_count"] == 2
+
+
+def test_bulk_weights_from_ndjson(monkeypatch):
+    monkeypatch.setattr(server, "BULK_BATCH_SIZE", 2)
+    lines = [json.dumps({"weight": 70 + i / 10, "timestamp": f"2026-02-0{i + 1}T07:00:00", "idempotency_key": f"w{i}"}) for i in range(5)]
+    lines.insert(2, "{broken")
+    lines.append(json.dumps({"weight": "heavy"}))
+    body = "\n".join(lines) + "\n"
+
+    with TestClient(server.app) as client:
+        response = client.post("/api/weight/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+        history = client.get("/api/weight-history", params={"days": 100000}).json()["data"]
+
+    data = response.json()["data"]
+    assert (data["created"], data["invalid"]) == (5, 2)
+    assert data["results"][2] == {"index": 2, "status": "invalid", "error": "Invalid JSON"}
+    assert [record["weight"] for record in history] == [70.0, 70.1, 70.2, 70.3, 70.4]
+
+
+def test_bulk_rejects_non_array_body():
+    with TestClient(server.app) as client:
+        assert client.post("/api/food-entries/bulk", json={"not": "a list"}).status_code == 400
+
+
+def test_bulk_rejects_bodies_over_the_item_and_byte_limits(monkeypatch, sync_db):
+    monkeypatch.setattr(server, "BULK_MAX_ITEMS", 3)
+    monkeypatch.setitem(server.BODY_SIZE_LIMITS, "/api/weight/bulk", 200)
+    items = [{"weight": 70, "timestamp": f"2026-03-0{i + 1}T07:00:00"} for i in range(4)]
+    ndjson = "\n".join(json.dumps(item) for item in items) + "\n"
+
+    with TestClient(server.app) as client:
+        array = client.post("/api/food-entries/bulk", json=[{"nutrition": {"calories": "1"}}] * 4)
+        stream = client.post("/api/food-entries/bulk", content=ndjson, headers={"Content-Type": "application/x-ndjson"})
+        oversized = client.post("/api/weight/bulk", json=items)
+
+    assert array.status_code == 413
+    assert sync_db.food_entries.count_documents({}) == 0
+    assert stream.status_code == 413
+    assert "limited to 3 items" in stream.json()["detail"]
+    assert oversized.status_code == 413
+    assert sync_db.weight_records.count_documents({}) == 0
+
+
+def test_non_string_user_ids_are_rejected_before_anything_is_stored(sync_db):
+    items = [
+        {"user_id": ["a"], "nutrition": {"calories": "100"}},
+        {"timestamp": "2026-02-01T08:00:00", "nutrition": {"calories": "200"}},
+    ]
+
+    with TestClient(server.app) as client:
+        bulk = client.post("/api/food-entries/bulk", json=items)
+        weights = client.post("/api/weight/bulk", json=[{"user_id": {"id": 1}, "weight": 70}])
+        single = client.post("/api/save-food-entry", json={"user_id": {"id": 1}, "nutrition": {"calories": "100"}})
+        summary = client.get("/api/daily-summary", params={"date": "2026-02-01"}).json()["data"]
+
+    assert bulk.status_code == 200
+    assert [result["status"] for result in bulk.json()["data"]["results"]] == ["invalid", "created"]
+    assert weights.json()["data"]["invalid"] == 1
+    assert single.status_code == 400
+    assert sync_db.food_entries.count_documents({}) == 1
+    assert summary["total_calories"] == 200
+
+
+@pytest.fixture
+def berlin_time(monkeypatch):
+    monkeypatch.setenv("TZ", "Europe/Berlin")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_bulk_timestamps_with_offsets_are_converted_to_local_time(berlin_time, sync_db):
+    with TestClient(server.app) as client:
+        client.post("/api/food-entries/bulk", json=[
+            {"timestamp": "2026-01-01T23:30:00Z", "nutrition": {"calories": "400"}},
+            {"timestamp": "2026-01-02T09:00:00+01:00", "nutrition": {"calories": "100"}},
+        ])
+        summary = client.get("/api/daily-summary", params={"date": "2026-01-02"}).json()["data"]
+
+    assert sorted(entry["timestamp"] for entry in sync_db.food_entries.find()) == [
+        "2026-01-02T00:30:00", "2026-01-02T09:00:00",
+    ]
+    assert summary["total_calories"] == 500
@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+from mongomock_motor import AsyncMongoMockClient
+
+from cache import LRUCache, SingleFlight, TieredCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+
+
+def test_lru_expires_entries():
+    cache = LRUCache(ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+
+
+def test_tiered_cache_falls_back_to_store():
+    collection = AsyncMongoMockClient().db.cache
+    cache = TieredCache(collection, ttl=60)
+
+    async def run():
+        await cache.ensure_indexes()
+        await cache.set("key", {"category": "pizza"})
+        cache.memory.clear()
+        assert (await cache.contains("key"), await cache.contains("other")) == (True, False)
+        return await cache.get("key"), await cache.get("other")
+
+    assert asyncio.run(run()) == ({"category": "pizza"}, None)
+    assert cache.stats()["hits_store"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flights = SingleFlight()
+    calls = 0
+
+    async def fetch(key):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return key.upper()
+
+    async def run():
+        first = await asyncio.gather(*(flights.run("a", fetch, "a") for _ in range(5)))
+        second = await flights.run("a", fetch, "a")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == ["A"] * 5 and second == "A"
+    assert calls == 2
+    assert flights.coalesced == 4
+    assert len(flights) == 0
@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def call(breaker, success=True, elapsed=0.01):
+    breaker.before_call()
+    breaker.record(success, elapsed)
+
+
+def test_trips_on_error_rate_and_fails_fast():
+    breaker = CircuitBreaker(window=4, min_calls=4, failure_rate=0.5, reset_timeout=60)
+    call(breaker)
+    call(breaker)
+    call(breaker, success=False)
+    assert breaker.state == CLOSED
+    call(breaker, success=False)
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_trips_on_slow_calls():
+    breaker = CircuitBreaker(min_calls=3, slow_call_seconds=1.0, slow_call_rate=0.6)
+    for _ in range(3):
+        call(breaker, elapsed=2.0)
+
+    assert breaker.state == OPEN
+
+
+def test_half_open_probe_closes_or_reopens():
+    breaker = CircuitBreaker(min_calls=1, reset_timeout=0.01)
+    call(breaker, success=False)
+    time.sleep(0.02)
+
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(False, 0.01)
+    assert breaker.state == OPEN
+
+    time.sleep(0.02)
+    call(breaker)
+    assert breaker.state == CLOSED
+
+
+def test_released_probe_lets_another_through():
+    breaker = CircuitBreaker(min_calls=1, reset_timeout=0.01)
+    call(breaker, success=False)
+    time.sleep(0.02)
+
+    breaker.before_call()
+    breaker.release()
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
@@ -0,0 +1,57 @@
+from fastapi.testclient import TestClient
+
+import server
+
+
+def test_food_entries_revalidate_without_querying(monkeypatch):
+    with TestClient(server.app) as client:
+        client.post("/api/save-food-entry", json={"category": "pizza", "nutrition": {"calories": "300"}})
+        first = client.get("/api/food-entries")
+        etag = first.headers["etag"]
+
+        def no_queries(*args, **kwargs):
+            raise AssertionError("a 304 must not query food_entries")
+
+        with monkeypatch.context() as patch:
+            patch.setattr(server.food_entries, "find", no_queries)
+            repeat = client.get("/api/food-entries", headers={"If-None-Match": etag})
+
+        client.post("/api/save-food-entry", json={"category": "salad", "nutrition": {"calories": "150"}})
+        after_write = client.get("/api/food-entries", headers={"If-None-Match": etag})
+
+    assert first.headers["cache-control"] == "private, no-cache"
+    assert "last-modified" in first.headers
+    assert repeat.status_code == 304
+    assert repeat.content == b""
+    assert repeat.headers["etag"] == etag
+    assert after_write.status_code == 200
+    assert after_write.headers["etag"] != etag
+    assert len(after_write.json()["data"]) == 2
+
+
+def test_daily_summary_etag_follows_goals():
+    with TestClient(server.app) as client:
+        etag = client.get("/api/daily-summary").headers["etag"]
+        assert client.get("/api/daily-summary", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+
+        client.post("/api/update-user-profile", json={"daily_calorie_goal": 1700})
+        changed = client.get("/api/daily-summary", headers={"If-None-Match": etag})
+
+    assert changed.status_code == 200
+    assert changed.json()["data"]["goal_calories"] == 1700
+
+
+def test_weight_history_etag_depends_on_representation():
+    with TestClient(server.app) as client:
+        client.post("/api/save-weight", json={"weight": 72.5})
+        as_json = client.get("/api/weight-history")
+        as_ndjson = client.get("/api/weight-history", headers={"Accept": "application/x-ndjson"})
+        cross = client.get(
+            "/api/weight-history",
+            headers={"Accept": "application/x-ndjson", "If-None-Match": as_json.headers["etag"]},
+        )
+
+    assert as_json.headers["etag"] != as_ndjson.headers["etag"]
+    assert as_ndjson.headers["vary"] == "Accept"
+    assert cross.status_code == 200
+    assert cross.text.count("\n") == 1
@@ -0,0 +1,107 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import server
+
+
+def save_entries(client):
+    client.post("/api/save-food-entry", json={
+        "category": "salad",
+        "nutrition": {"calories": "120"},
+        "recipes": [{"id": 1, "title": "Greek Salad"}],
+    })
+    client.post("/api/save-weight", json={"weight": 72.5})
+
+
+def test_food_entries_default_projection_is_lean():
+    with TestClient(server.app) as client:
+        save_entries(client)
+        entry = client.get("/api/food-entries").json()["data"][0]
+
+    assert "_id" not in entry
+    assert "recipes" not in entry
+    assert entry["category"] == "salad"
+
+
+def test_food_entries_field_selection():
+    with TestClient(server.app) as client:
+        save_entries(client)
+        selected = client.get("/api/food-entries", params={"fields": "category"}).json()["data"][0]
+        everything = client.get("/api/food-entries", params={"fields": "*"}).json()["data"][0]
+        invalid = client.get("/api/food-entries", params={"fields": "category,$where"})
+
+    assert set(selected) == {"id", "timestamp", "category"}
+    assert everything["recipes"] == [{"id": 1, "title": "Greek Salad"}]
+    assert "_id" not in everything
+    assert invalid.status_code == 400
+
+
+def test_weight_history_excludes_object_id():
+    with TestClient(server.app) as client:
+        save_entries(client)
+        record = client.get("/api/weight-history").json()["data"][0]
+        selected = client.get("/api/weight-history", params={"fields": "weight"}).json()["data"][0]
+
+    assert "_id" not in record
+    assert record["weight"] == 72.5
+    assert set(selected) == {"id", "timestamp", "weight"}
+
+
+def insert_entries(db, count, timestamp="2026-01-01T12:00:00"):
+    # Shared timestamps make sure ties are broken by id
+    db.food_entries.insert_many([
+        {"id": f"entry-{i:03d}", "user_id": "pager", "timestamp": timestamp if i % 2 else f"2026-01-01T12:00:{i:02d}"}
+        for i in range(count)
+    ])
+
+
+def test_food_entries_keyset_pagination(sync_db):
+    insert_entries(sync_db, 25)
+
+    with TestClient(server.app) as client:
+        seen = []
+        cursor = None
+        while True:
+            params = {"user_id": "pager", "days": 100000, "limit": 10}
+            if cursor:
+                params["cursor"] = cursor
+            page = client.get("/api/food-entries", params=params).json()
+            seen.extend(entry["id"] for entry in page["data"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        everything = client.get("/api/food-entries", params={"user_id": "pager", "days": 100000}).json()
+        bad_cursor = client.get("/api/food-entries", params={"cursor": "not-a-cursor"})
+        scalar_cursors = [
+            client.get("/api/food-entries", params={"limit": 5, "cursor": cursor}).status_code
+            for cursor in ("MTIz", "bnVsbA==", "WyJhIl0=")  # 123, null, ["a"]
+        ]
+
+    assert seen == [entry["id"] for entry in everything["data"]]
+    assert len(set(seen)) == 25
+    assert everything["next_cursor"] is None
+    assert bad_cursor.status_code == 400
+    assert scalar_cursors == [400, 400, 400]
+
+
+def test_food_entries_ndjson_stream(sync_db):
+    insert_entries(sync_db, 5)
+
+    with TestClient(server.app) as client:
+        response = client.get(
+            "/api/food-entries",
+            params={"user_id": "pager", "days": 100000, "limit": 3},
+            headers={"Accept": "application/x-ndjson"},
+        )
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        rest = client.get(
+            "/api/food-entries",
+            params={"user_id": "pager", "days": 100000, "cursor": lines[-1]["next_cursor"]},
+            headers={"Accept": "application/x-ndjson"},
+        )
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert len(lines) == 4
+    assert len(rest.text.splitlines()) == 2
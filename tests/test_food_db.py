@@ -0,0 +1,43 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+import server
+from food_db import FoodDatabase
+
+
+def test_search_tolerates_typos_and_separators():
+    database = server.food_database
+
+    assert database.search("french_fries")[0]["name"] == "french fries"
+    assert database.search("piza")[0]["name"] == "pizza"
+    assert database.search("spag")[0]["name"] == "spaghetti"
+    assert database.search("qwxz") == []
+
+
+def test_usda_style_csv_and_memory_mapped_copy(tmp_path):
+    path = tmp_path / "usda.csv"
+    # USDA headers contain commas, so the dump quotes them
+    path.write_text(
+        'Description,Energy (kcal),Protein (g),Total lipid (fat) (g),"Carbohydrate, by difference (g)"\n'
+        "Lentils boiled,116,9.02,0.38,20.13\n"
+    )
+    database = FoodDatabase.from_csv(str(path))
+    database.save(str(tmp_path / "table"))
+    opened = FoodDatabase.open(str(tmp_path / "table"))
+
+    assert isinstance(opened.nutrients, np.memmap)
+    lentils = opened.search("lentil")[0]
+    assert lentils["per_100g"]["calories_kcal"] == 116
+    assert lentils["per_100g"]["carbs_g"] == 20.13
+    assert lentils["nutrition"]["protein"] == "9g"
+
+
+def test_foods_search_endpoint():
+    with TestClient(server.app) as client:
+        found = client.get("/api/foods/search", params={"q": "cheesecake", "limit": 2}).json()["data"]
+        missing_query = client.get("/api/foods/search", params={"q": " "})
+
+    assert found[0]["name"] == "cheesecake"
+    assert found[0]["score"] == 1.0
+    assert float(found[0]["nutrition"]["calories"]) > 0
+    assert missing_query.status_code == 400
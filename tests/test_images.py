@@ -0,0 +1,144 @@
+import asyncio
+import base64
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from typer.testing import CliRunner
+
+import manage
+import server
+from image_store import FileSystemImageStore, GridFSImageStore, ImageStore, image_id_for
+from preprocess import preprocess_image
+
+
+def make_jpeg(size=(640, 480)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 120, 40)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture(params=["filesystem", "gridfs"])
+def image_store(request, tmp_path, monkeypatch):
+    if request.param == "filesystem":
+        store = FileSystemImageStore(str(tmp_path))
+    else:
+        store = GridFSImageStore(server.db)
+    monkeypatch.setattr(server, "image_store", store)
+    return store
+
+
+def test_stores_must_implement_every_operation():
+    class WriteOnlyStore(ImageStore):
+        async def put(self, source, content_type, image_id=None):
+            return image_id
+
+    with pytest.raises(TypeError):
+        WriteOnlyStore()
+
+
+def test_legacy_inline_image_is_moved_to_store(image_store):
+    image = make_jpeg()
+
+    with TestClient(server.app) as client:
+        for _ in range(2):
+            client.post("/api/save-food-entry", json={
+                "category": "pizza",
+                "image_data": base64.b64encode(image).decode("utf-8"),
+            })
+        malformed = client.post("/api/save-food-entry", json={"category": "pizza", "image_data": "not base64!"})
+        entries = client.get("/api/food-entries").json()["data"]
+
+    assert malformed.status_code == 400
+    assert len(entries) == 2
+    assert all("image_data" not in entry for entry in entries)
+    assert {entry["image_id"] for entry in entries} == {image_id_for(image)}
+
+    thumbnail = Image.open(io.BytesIO(base64.b64decode(entries[0]["thumbnail"])))
+    assert max(thumbnail.size) <= 160
+
+
+def test_edit_with_inline_image_moves_it_to_store(image_store, sync_db):
+    image = make_jpeg((320, 240))
+
+    with TestClient(server.app) as client:
+        entry_id = client.post("/api/save-food-entry", json={"category": "pizza"}).json()["id"]
+        edited = client.put(f"/api/food-entries/{entry_id}", json={"image_data": base64.b64encode(image).decode("utf-8")})
+        malformed = client.put(f"/api/food-entries/{entry_id}", json={"image_data": "not base64!", "category": "soup"})
+
+    assert edited.status_code == 200
+    assert malformed.status_code == 400
+    entry = sync_db.food_entries.find_one({"id": entry_id})
+    assert "image_data" not in entry
+    assert entry["image_id"] == image_id_for(image)
+    assert entry["thumbnail"]
+    assert entry["category"] == "pizza"
+
+
+def test_migrate_images_skips_malformed_entries(image_store, sync_db):
+    image = make_jpeg()
+    sync_db.food_entries.insert_many([
+        {"id": "broken", "user_id": "default_user", "image_data": "not base64!"},
+        {"id": "good", "user_id": "default_user", "image_data": base64.b64encode(image).decode("utf-8")},
+    ])
+
+    result = CliRunner().invoke(manage.cli, ["migrate-images"])
+
+    assert result.exit_code == 0
+    assert "Migrated 1 food entries" in result.output
+    assert "Skipped 1 food entries" in result.output
+    assert sync_db.food_entries.find_one({"id": "good"})["image_id"] == image_id_for(image)
+    assert sync_db.food_entries.find_one({"id": "broken"})["image_data"] == "not base64!"
+
+
+def test_image_endpoint_supports_etag_and_range(image_store):
+    image = make_jpeg()
+    image_id = asyncio.run(image_store.put(image, "image/jpeg"))
+
+    with TestClient(server.app) as client:
+        full = client.get(f"/api/images/{image_id}")
+        assert full.status_code == 200
+        assert full.content == image
+        assert full.headers["content-type"] == "image/jpeg"
+
+        cached = client.get(f"/api/images/{image_id}", headers={"If-None-Match": full.headers["etag"]})
+        assert cached.status_code == 304
+        # Lists and weak validators, as proxies and browsers send them
+        listed = client.get(f"/api/images/{image_id}", headers={"If-None-Match": f'"other", W/{full.headers["etag"]}'})
+        assert listed.status_code == 304
+
+        partial = client.get(f"/api/images/{image_id}", headers={"Range": "bytes=10-19"})
+        assert partial.status_code == 206
+        assert partial.content == image[10:20]
+        assert partial.headers["content-range"] == f"bytes 10-19/{len(image)}"
+
+        assert client.get(f"/api/images/{image_id}", headers={"Range": f"bytes={len(image)}-"}).status_code == 416
+        assert client.get("/api/images/" + "0" * 64).status_code == 404
+        assert client.get("/api/images/..%2F..%2Fetc").status_code == 404
+
+
+def test_preprocessing_downscales_and_turns_photo_upright():
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x0112] = 6  # stored sideways: rotate 90 degrees clockwise to display
+    noise = Image.effect_noise((3000, 2000), 64).convert("RGB")
+    noise.save(buffer, format="JPEG", quality=95, exif=exif)
+    photo = buffer.getvalue()
+
+    prepared = preprocess_image(photo, max_side=1024)
+
+    with Image.open(io.BytesIO(prepared.data)) as image:
+        assert image.size == (683, 1024)
+    assert prepared.content_type == "image/jpeg"
+    assert prepared.bytes_saved > len(photo) // 2
+    assert prepared.report()["upload_bytes"] == len(prepared.data)
+
+
+def test_preprocessing_keeps_small_jpegs_and_non_images():
+    small = make_jpeg((320, 240))
+    assert preprocess_image(small, max_side=1024).data == small
+
+    prepared = preprocess_image(b"not an image")
+    assert prepared.data == b"not an image"
+    assert prepared.bytes_saved == 0
@@ -0,0 +1,91 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+import pytest
+from pymongo import mongo_client
+
+from indexes import INDEXES, ensure_indexes
+
+
+def test_ensure_indexes_creates_and_reconciles():
+    client = AsyncMongoMockClient()
+    db = client.db
+
+    report = asyncio.run(ensure_indexes(db))
+    assert report["user_profiles"]["created"] == ["user_id"]
+    assert asyncio.run(db.user_profiles.index_information())["user_id"]["unique"] is True
+    assert "user_timestamp" in asyncio.run(db.food_entries.index_information())
+
+    # A stale definition under the same name gets rebuilt
+    async def replace_with_non_unique():
+        await db.user_profiles.drop_index("user_id")
+        await db.user_profiles.create_index("user_id", name="user_id")
+
+    asyncio.run(replace_with_non_unique())
+    report = asyncio.run(ensure_indexes(db))
+    assert report["user_profiles"]["rebuilt"] == ["user_id"]
+    assert report["food_entries"] == {"created": [], "rebuilt": [], "failed": []}
+
+
+# Query plans need a real MongoDB; set MONGO_TEST_URL to run these checks.
+MONGO_TEST_URL = os.getenv("MONGO_TEST_URL")
+
+
+@pytest.fixture(scope="module")
+def real_db():
+    if not MONGO_TEST_URL:
+        pytest.skip("MONGO_TEST_URL not set")
+    client = mongo_client.MongoClient(MONGO_TEST_URL, serverSelectionTimeoutMS=2000)
+    db = client["nutrition_tracker_explain_test"]
+    # ensure_indexes needs an async driver; build the same declared indexes with this sync client
+    for collection_name, models in INDEXES.items():
+        db[collection_name].create_indexes(models)
+
+    now = datetime.now()
+    for collection_name in ("food_entries", "weight_records"):
+        db[collection_name].insert_many([
+            {"id": f"{collection_name}-{i}", "user_id": f"user-{i % 20}", "timestamp": (now - timedelta(hours=i)).isoformat()}
+            for i in range(2000)
+        ])
+    db.user_profiles.insert_many([{"user_id": f"user-{i}"} for i in range(20)])
+
+    yield db
+    client.drop_database(db.name)
+    client.close()
+
+
+def plan_stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+
+def assert_no_collscan(cursor):
+    winning_plan = cursor.explain()["queryPlanner"]["winningPlan"]
+    assert "COLLSCAN" not in set(plan_stages(winning_plan))
+
+
+@pytest.mark.parametrize("collection_name", ["food_entries", "weight_records"])
+def test_history_queries_use_index(real_db, collection_name):
+    end = datetime.now()
+    query = {"user_id": "user-3", "timestamp": {"$gte": (end - timedelta(days=7)).isoformat(), "$lte": end.isoformat()}}
+    collection = real_db[collection_name]
+
+    assert_no_collscan(collection.find(query).sort([("timestamp", -1), ("id", -1)]))
+    assert_no_collscan(collection.find(query).sort([("timestamp", 1), ("id", 1)]).limit(11))
+
+    after_cursor = {"$and": [query, {"$or": [
+        {"timestamp": {"$lt": end.isoformat()}},
+        {"timestamp": end.isoformat(), "id": {"$lt": "x"}},
+    ]}]}
+    assert_no_collscan(collection.find(after_cursor).sort([("timestamp", -1), ("id", -1)]).limit(11))
+
+
+def test_profile_lookup_uses_index(real_db):
+    assert_no_collscan(real_db.user_profiles.find({"user_id": "user-3"}).limit(1))
+
@@ -0,0 +1,122 @@
+import asyncio
+import io
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from jobs import DONE, FAILED, JobQueue, JobWorkers
+from spoonacular import SpoonacularClient
+from spoonacular_stub import SpoonacularStub
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    with SpoonacularStub() as stub:
+        monkeypatch.setattr(server, "spoonacular", SpoonacularClient("test-key", base_url=stub.base_url))
+        yield stub
+
+
+def wait_for_job(client, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/analyze-food/jobs/{job_id}").json()["data"]
+        if job["status"] in (DONE, FAILED):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_upload_returns_job_that_workers_complete(stub):
+    with TestClient(server.app) as client:
+        response = client.post(
+            "/api/analyze-food/jobs",
+            files={"file": ("food.jpg", io.BytesIO(b"queued-image"), "image/jpeg")},
+        )
+        assert response.status_code == 202
+        queued = response.json()["data"]
+        assert response.headers["location"] == f"/api/analyze-food/jobs/{queued['id']}"
+        assert queued["status"] == "pending"
+
+        job = wait_for_job(client, queued["id"])
+        assert client.get("/api/analyze-food/jobs/unknown").status_code == 404
+
+    assert job["status"] == DONE
+    assert job["attempts"] == 1
+    assert job["result"]["category"] == "burger"
+    assert job["result"]["nutrition"]["calories"] == "596"
+    assert job["result"]["image_id"] == queued["image_id"]
+    assert asyncio.run(server.image_store.info(queued["image_id"])) is not None
+    assert stub.state.counts["/food/images/analyze"] == 1
+
+
+def test_job_events_stream_until_done(stub):
+    stub.state.latency = 0.2
+
+    with TestClient(server.app) as client:
+        job_id = client.post(
+            "/api/analyze-food/jobs",
+            files={"file": ("food.jpg", io.BytesIO(b"streamed-image"), "image/jpeg")},
+        ).json()["data"]["id"]
+
+        with client.stream("GET", f"/api/analyze-food/jobs/{job_id}/events") as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            events = [line.split(": ", 1)[1] for line in response.iter_lines() if line.startswith("event: ")]
+
+    assert events[-1] == DONE
+    assert "running" in events
+
+
+def test_job_interrupted_by_a_restart_is_claimed_again(stub, sync_db):
+    image_id = asyncio.run(server.image_store.put(b"interrupted-image", "image/jpeg"))
+    expired = datetime.utcnow() - timedelta(minutes=1)
+    for job_id, attempts in (("interrupted", 1), ("hopeless", server.analysis_workers.max_attempts)):
+        sync_db.analysis_jobs.insert_one({
+            "id": job_id,
+            "status": "running",
+            "image_id": image_id,
+            "attempts": attempts,
+            "worker": "dead-worker",
+            "lease_expires_at": expired,
+            "created_at": expired,
+            "updated_at": expired,
+        })
+
+    with TestClient(server.app) as client:
+        interrupted = wait_for_job(client, "interrupted")
+        hopeless = wait_for_job(client, "hopeless")
+
+    assert interrupted["status"] == DONE
+    assert interrupted["attempts"] == 2
+    assert interrupted["result"]["image_id"] == image_id
+    assert hopeless["status"] == FAILED
+    assert "Gave up" in hopeless["error"]
+
+
+def test_stopping_workers_drains_running_jobs():
+    async def run(handler_seconds, grace):
+        queue = JobQueue(AsyncMongoMockClient().db.jobs)
+
+        async def handler(job):
+            await asyncio.sleep(handler_seconds)
+            return {"result": "ok"}
+
+        workers = JobWorkers(queue, handler, concurrency=1, poll_interval=0.01)
+        workers.start()
+        job = await queue.create({})
+        workers.notify()
+        while (await queue.get(job["id"]))["status"] != "running":
+            await asyncio.sleep(0.01)
+        await workers.stop(grace)
+        return await queue.get(job["id"])
+
+    finished = asyncio.run(run(0.1, grace=5))
+    assert (finished["status"], finished["result"]) == (DONE, "ok")
+
+    # Past the grace period the job is handed back without using up an attempt
+    released = asyncio.run(run(5, grace=0.1))
+    assert (released["status"], released["attempts"]) == ("pending", 0)
+    assert "worker" not in released
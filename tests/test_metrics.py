@@ -0,0 +1,107 @@
+import io
+import json
+import os
+import time
+
+from fastapi.testclient import TestClient
+
+import server
+from metrics import Counter, Gauge, Histogram, Registry, SharedMetrics, SlowRequestProfiler
+from spoonacular import SpoonacularClient
+from spoonacular_stub import SpoonacularStub
+
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.register(Counter("demo_total", "Demo requests", ("route",)))
+    latency = registry.register(Histogram("demo_seconds", "Demo latency", buckets=(0.1, 1.0)))
+    requests.inc(route='/a"b')
+    requests.inc(2, route='/a"b')
+    latency.observe(0.05)
+    latency.observe(3)
+
+    text = registry.render()
+
+    assert "# TYPE demo_total counter" in text
+    assert 'demo_total{route="/a\\"b"} 3' in text
+    assert 'demo_seconds_bucket{le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{le="1.0"} 1' in text
+    assert 'demo_seconds_bucket{le="+Inf"} 2' in text
+    assert "demo_seconds_count 2" in text
+
+
+def test_shared_metrics_combine_all_workers(tmp_path):
+    registry = Registry()
+    requests = registry.register(Counter("demo_total", "Demo requests", ("route",)))
+    latency = registry.register(Histogram("demo_seconds", "Demo latency", buckets=(0.1, 1.0)))
+    in_flight = registry.register(Gauge("demo_in_flight", "Demo in flight"))
+    ratio = registry.register(Gauge("demo_ratio", "Demo ratio", aggregate="all"))
+    requests.inc(route="/a")
+    latency.observe(0.05)
+    in_flight.set(1)
+    ratio.set(0.5)
+
+    # A worker that has exited: its counts stay in the totals, its gauges do not
+    exited = {
+        "demo_total": [[["/a"], 2], [["/b"], 1]],
+        "demo_seconds": [[[], [[0, 1, 0], 0.5]]],
+        "demo_in_flight": [[[], 7]],
+        "demo_ratio": [[[], 0.9]],
+    }
+    (tmp_path / "999999999.json").write_text(json.dumps(exited))
+
+    text = SharedMetrics(registry, str(tmp_path)).render()
+
+    assert (tmp_path / f"{os.getpid()}.json").exists()
+    assert 'demo_total{route="/a"} 3' in text
+    assert 'demo_total{route="/b"} 1' in text
+    assert 'demo_seconds_bucket{le="1.0"} 2' in text
+    assert "demo_seconds_sum 0.55" in text
+    assert "demo_in_flight 1" in text
+    assert f'demo_ratio{{worker="{os.getpid()}"}} 0.5' in text
+    assert "0.9" not in text
+
+
+def test_requests_are_timed_and_exposed(monkeypatch):
+    with SpoonacularStub() as stub:
+        monkeypatch.setattr(server, "spoonacular", SpoonacularClient("test-key", base_url=stub.base_url))
+        with TestClient(server.app) as client:
+            listing = client.get("/api/food-entries")
+            analysis = client.post(
+                "/api/analyze-food",
+                files={"file": ("food.jpg", io.BytesIO(b"metrics-plate"), "image/jpeg")},
+            )
+            text = client.get("/metrics").text
+
+    assert "db.query;dur=" in listing.headers["server-timing"]
+    assert "serialize;dur=" in listing.headers["server-timing"]
+    timing = analysis.headers["server-timing"]
+    for stage in ("upload.read", "image.store", "upstream.recognition", "upstream.nutrition", "total"):
+        assert f"{stage};dur=" in timing
+    assert 'http_requests_total{method="GET",route="/api/food-entries",status="200"}' in text
+    assert 'http_request_duration_seconds_count{method="POST",route="/api/analyze-food"}' in text
+    assert 'upstream_requests_total{service="spoonacular",endpoint="/recipes/{id}/nutritionWidget.json",outcome="ok"}' in text
+    assert 'cache_hit_ratio{cache="analysis"}' in text
+    assert "http_requests_in_flight" in text
+
+
+def test_slow_request_profile_is_written(tmp_path):
+    profiler = SlowRequestProfiler(0.05, str(tmp_path), interval=0.002)
+    profiler.sampler.start()
+    try:
+        def busy_handler():
+            deadline = time.perf_counter() + 0.1
+            while time.perf_counter() < deadline:
+                pass
+
+        started = time.perf_counter()
+        busy_handler()
+        path = profiler.record("GET /api/slow", started, time.perf_counter())
+        fast = profiler.record("GET /api/fast", started, started + 0.01)
+    finally:
+        profiler.sampler.stop()
+
+    assert fast is None
+    folded = open(path).read()
+    assert "busy_handler" in folded
+    assert folded.splitlines()[0].rsplit(" ", 1)[1].isdigit()
@@ -0,0 +1,95 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from typer.testing import CliRunner
+
+import manage
+import server
+from nutrition import normalize_nutrition, parse_amount
+from rollups import rebuild_rollups
+
+
+def test_parse_amount_handles_decimals_and_units():
+    assert parse_amount("0.5g", "g") == 0.5
+    assert parse_amount("35 g", "g") == 35.0
+    assert parse_amount("250mg", "g") == 0.25
+    assert parse_amount("250", "kcal") == 250.0
+    assert parse_amount(120, "kcal") == 120.0
+    assert parse_amount("35g", "kcal") is None
+    assert parse_amount("lots", "g") is None
+    assert parse_amount("2,000 kcal", "kcal") == 2000.0
+    assert parse_amount("1,234", "kcal") == 1234.0
+    assert parse_amount("1,234,567.5", "kcal") == 1234567.5
+    assert parse_amount("0,5g", "g") == 0.5
+
+
+def test_normalize_spoonacular_widget():
+    widget = {
+        "calories": "596",
+        "carbs": "52g",
+        "fat": "31g",
+        "protein": "28g",
+        "good": [{"title": "Fiber", "amount": "5.5g"}, {"title": "Protein", "amount": "99g"}],
+        "bad": [{"title": "Sugar", "amount": "700mg"}],
+    }
+
+    assert normalize_nutrition(widget) == {
+        "calories_kcal": 596.0,
+        "carbs_g": 52.0,
+        "protein_g": 28.0,
+        "fat_g": 31.0,
+        "fiber_g": 5.5,
+        "sugar_g": 0.7,
+    }
+
+
+def test_daily_summary_uses_numeric_nutrients():
+    with TestClient(server.app) as client:
+        client.post("/api/save-food-entry", json={"nutrition": {"calories": "95", "protein": "0.5g"}})
+        client.post("/api/save-food-entry", json={"nutrition": {"calories": "105", "protein": "1.2g"}})
+        summary = client.get("/api/daily-summary").json()["data"]
+
+    assert summary["total_calories"] == 200
+    assert summary["total_protein"] == 1.7
+
+
+def test_backfill_nutrients_command(sync_db):
+    sync_db.food_entries.insert_many([
+        {"id": "old-1", "nutrition": {"calories": "250", "carbs": "35g"}},
+        {"id": "new-1", "nutrition": {"calories": "10"}, "nutrients": {"calories_kcal": 10.0}},
+    ])
+
+    result = CliRunner().invoke(manage.cli, ["backfill-nutrients"])
+
+    assert result.exit_code == 0
+    assert "1 food entries" in result.output
+    assert sync_db.food_entries.find_one({"id": "old-1"})["nutrients"] == {"calories_kcal": 250.0, "carbs_g": 35.0}
+
+
+def test_summary_range_groups_by_week_and_month(sync_db):
+    sync_db.food_entries.insert_many([
+        {"id": "a", "user_id": "ranger", "timestamp": "2026-03-02T08:00:00", "nutrients": {"calories_kcal": 300.0, "protein_g": 10.0}},
+        {"id": "b", "user_id": "ranger", "timestamp": "2026-03-02T19:30:00", "nutrients": {"calories_kcal": 700.0}},
+        {"id": "c", "user_id": "ranger", "timestamp": "2026-03-10T12:00:00", "nutrients": {"calories_kcal": 500.0}},
+        {"id": "d", "user_id": "ranger", "timestamp": "2026-04-01T12:00:00", "nutrients": {"calories_kcal": 100.0}},
+        {"id": "e", "user_id": "someone-else", "timestamp": "2026-03-02T12:00:00", "nutrients": {"calories_kcal": 9999.0}},
+    ])
+    asyncio.run(rebuild_rollups(server.food_entries.collection, server.daily_rollups))
+
+    with TestClient(server.app) as client:
+        get = lambda **params: client.get("/api/summary-range", params={"user_id": "ranger", **params})
+        days = get(start="2026-03-01", end="2026-03-03").json()["data"]["series"]
+        weeks = get(start="2026-03-02", end="2026-03-15", granularity="week").json()["data"]["series"]
+        months = get(start="2026-03-01", end="2026-04-30", granularity="month").json()["data"]["series"]
+        daily = client.get("/api/daily-summary", params={"user_id": "ranger", "date": "2026-03-02"}).json()["data"]
+        invalid = get(start="2026-03-05", end="2026-03-01")
+
+    assert [(d["date"], d["total_calories"], d["entries_count"]) for d in days] == [
+        ("2026-03-01", 0, 0), ("2026-03-02", 1000.0, 2), ("2026-03-03", 0, 0),
+    ]
+    assert [(w["period"], w["total_calories"]) for w in weeks] == [("2026-W10", 1000.0), ("2026-W11", 500.0)]
+    assert [(m["period"], m["total_calories"]) for m in months] == [("2026-03", 1500.0), ("2026-04", 100.0)]
+    assert daily["total_calories"] == 1000.0
+    assert daily["total_protein"] == 10.0
+    assert daily["goal_calories"] == 2000
+    assert invalid.status_code == 400
@@ -0,0 +1,56 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from cache import LRUCache, VersionStamp
+
+
+def test_concurrent_first_reads_create_one_profile(sync_db):
+    async def run():
+        return await asyncio.gather(*(
+            server.user_profiles.get_or_create("new_user", {"goal_weight": 65}) for _ in range(10)
+        ))
+
+    profiles = asyncio.run(run())
+
+    assert all(profile == {"user_id": "new_user", "goal_weight": 65} for profile in profiles)
+    assert sync_db.user_profiles.count_documents({"user_id": "new_user"}) == 1
+
+
+def test_profile_is_cached_until_updated(sync_db):
+    with TestClient(server.app) as client:
+        assert client.get("/api/user-profile").json()["data"]["daily_calorie_goal"] == 2000
+
+        # Changes that bypass the API are not seen while the profile is cached
+        sync_db.user_profiles.update_one({"user_id": "default_user"}, {"$set": {"daily_calorie_goal": 1500}})
+        assert client.get("/api/user-profile").json()["data"]["daily_calorie_goal"] == 2000
+
+        client.post("/api/update-user-profile", json={"daily_calorie_goal": 1800, "daily_protein_goal": 120})
+        profile = client.get("/api/user-profile").json()["data"]
+        summary = client.get("/api/daily-summary").json()["data"]
+
+    assert profile["daily_calorie_goal"] == 1800
+    assert summary["goal_calories"] == 1800
+    assert summary["goal_protein"] == 120
+    assert summary["goal_fat"] == 65
+
+
+def test_version_stamp_clears_other_workers_caches():
+    collection = AsyncMongoMockClient().db.cache_versions
+    stamp = VersionStamp(collection, "user_profiles")
+    cache = LRUCache()
+    cache.set("default_user", {"goal_weight": 70})
+
+    async def run():
+        watcher = asyncio.create_task(stamp.watch(cache, interval=0.01))
+        await asyncio.sleep(0.03)
+        assert "default_user" in cache
+        # Another worker updated a profile
+        await VersionStamp(collection, "user_profiles").bump()
+        await asyncio.sleep(0.03)
+        watcher.cancel()
+
+    asyncio.run(run())
+    assert len(cache) == 0
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from ratelimit import MongoTokenBucket, PrioritySemaphore, RateLimitExceeded, TokenBucket
+
+
+def test_token_bucket_paces_after_burst():
+    bucket = TokenBucket(rate=50, burst=2)
+
+    async def run():
+        started = time.perf_counter()
+        for _ in range(5):
+            await bucket.acquire()
+        return time.perf_counter() - started
+
+    # Two tokens are free, the other three arrive every 20 ms
+    assert asyncio.run(run()) >= 0.05
+
+
+def test_token_bucket_gives_up_past_max_wait():
+    bucket = TokenBucket(rate=1, burst=1, max_wait=0.1)
+
+    async def run():
+        await bucket.acquire()
+        await bucket.acquire()
+
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(run())
+
+
+def test_mongo_bucket_is_shared_between_workers():
+    collection = AsyncMongoMockClient().db.rate_limits
+    # Two processes' limiters pointing at the same document
+    workers = [MongoTokenBucket(collection, "spoonacular", rate=1, burst=3, max_wait=0.1) for _ in range(2)]
+
+    async def run():
+        for bucket in workers + workers[:1]:
+            await bucket.acquire()
+        await workers[1].acquire()
+
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(run())
+    assert asyncio.run(collection.find_one({"_id": "spoonacular"}))["tokens"] < 1
+
+
+def test_priority_semaphore_serves_interactive_first():
+    order = []
+
+    async def run():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire()
+
+        async def worker(name, priority):
+            async with semaphore.slot(priority):
+                order.append(name)
+
+        waiters = [asyncio.create_task(worker(f"warm-{i}", 10)) for i in range(3)]
+        waiters.append(asyncio.create_task(worker("user", 0)))
+        await asyncio.sleep(0)
+        assert semaphore.waiting == 4
+        semaphore.release()
+        await asyncio.gather(*waiters)
+
+    asyncio.run(run())
+    assert order == ["user", "warm-0", "warm-1", "warm-2"]
@@ -0,0 +1,52 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+from typer.testing import CliRunner
+
+import manage
+import server
+from rollups import check_rollups
+
+
+def rollup_for_today(client):
+    summary = client.get("/api/daily-summary").json()["data"]
+    return summary["total_calories"], summary["total_protein"], summary["entries_count"]
+
+
+def test_rollups_follow_saves_edits_and_deletes():
+    with TestClient(server.app) as client:
+        first = client.post("/api/save-food-entry", json={"nutrition": {"calories": "300", "protein": "20g"}}).json()["id"]
+        second = client.post("/api/save-food-entry", json={"nutrition": {"calories": "200", "protein": "5.5g"}}).json()["id"]
+        assert rollup_for_today(client) == (500.0, 25.5, 2)
+
+        client.put(f"/api/food-entries/{first}", json={"nutrition": {"calories": "350", "protein": "20g"}})
+        assert rollup_for_today(client) == (550.0, 25.5, 2)
+
+        client.delete(f"/api/food-entries/{second}")
+        assert rollup_for_today(client) == (350.0, 20.0, 1)
+
+        assert client.delete(f"/api/food-entries/{second}").status_code == 404
+        assert client.put("/api/food-entries/missing", json={"notes": "x"}).status_code == 404
+
+    assert asyncio.run(check_rollups(server.food_entries.collection, server.daily_rollups)) == []
+
+
+def test_check_and_rebuild_commands_repair_drift(sync_db):
+    with TestClient(server.app) as client:
+        client.post("/api/save-food-entry", json={"nutrition": {"calories": "300"}})
+        sync_db.daily_rollups.update_many({}, {"$inc": {"calories_kcal": 40}})
+        stale_etag = client.get("/api/daily-summary").headers["etag"]
+
+    runner = CliRunner()
+    check = runner.invoke(manage.cli, ["check-rollups"])
+    assert check.exit_code == 1
+    assert "calories_kcal expected 300.0 stored 340.0" in check.output
+
+    assert runner.invoke(manage.cli, ["rebuild-rollups"]).exit_code == 0
+    assert runner.invoke(manage.cli, ["check-rollups"]).exit_code == 0
+
+    # Clients that cached the drifted totals must not be told they are still current
+    with TestClient(server.app) as client:
+        revalidated = client.get("/api/daily-summary", headers={"If-None-Match": stale_etag})
+    assert revalidated.status_code == 200
+    assert revalidated.json()["data"]["total_calories"] == 300.0
@@ -0,0 +1,271 @@
+import asyncio
+import io
+import json
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from circuit_breaker import CircuitBreaker
+from spoonacular import SpoonacularClient, SpoonacularError
+from spoonacular_stub import SpoonacularStub
+
+
+@pytest.fixture
+def stub():
+    with SpoonacularStub() as stub:
+        yield stub
+
+
+def test_client_fetches_recognition_and_nutrition(stub):
+    async def run():
+        client = SpoonacularClient("test-key", base_url=stub.base_url)
+        try:
+            result = await client.analyze_image(b"not really a jpeg")
+            nutrition = await client.recipe_nutrition(result["recipes"][0]["id"])
+        finally:
+            await client.close()
+        return result, nutrition
+
+    result, nutrition = asyncio.run(run())
+    assert result["category"]["name"] == "burger"
+    assert nutrition["recipeId"] == 642539
+
+
+def test_client_retries_then_raises(stub):
+    stub.state.error_rate = 1.0
+
+    async def run():
+        client = SpoonacularClient("test-key", base_url=stub.base_url, max_retries=2, backoff_base=0.001)
+        try:
+            await client.analyze_image(b"image")
+        finally:
+            await client.close()
+
+    with pytest.raises(SpoonacularError) as exc_info:
+        asyncio.run(run())
+    assert exc_info.value.status_code == 503
+    assert stub.state.counts["/food/images/analyze"] == 3
+
+
+def test_quota_errors_trip_the_breaker_without_retries(stub):
+    stub.state.error_rate = 1.0
+    stub.state.error_status = 402
+    breaker = CircuitBreaker(min_calls=2, reset_timeout=60)
+
+    async def run():
+        client = SpoonacularClient("test-key", base_url=stub.base_url, max_retries=2, circuit_breaker=breaker)
+        statuses = []
+        try:
+            for _ in range(3):
+                try:
+                    await client.analyze_image(b"image")
+                except SpoonacularError as e:
+                    statuses.append(e.status_code)
+        finally:
+            await client.close()
+        return statuses
+
+    # Two calls sent once each open the circuit; the third fails fast
+    assert asyncio.run(run()) == [402, 402, 503]
+    assert stub.state.counts["/food/images/analyze"] == 2
+    assert breaker.state == "open"
+
+
+def test_client_bounds_concurrency():
+    in_flight = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json={"calories": "100"})
+
+    async def run():
+        client = SpoonacularClient("test-key", max_concurrency=3, transport=httpx.MockTransport(handler))
+        try:
+            await asyncio.gather(*(client.recipe_nutrition(i) for i in range(12)))
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+    assert peak == 3
+
+
+def test_analyze_food_uses_shared_client(stub, monkeypatch):
+    monkeypatch.setattr(server, "spoonacular", SpoonacularClient("test-key", base_url=stub.base_url))
+
+    with TestClient(server.app) as client:
+        response = client.post(
+            "/api/analyze-food",
+            files={"file": ("food.jpg", io.BytesIO(b"image-bytes"), "image/jpeg")},
+        )
+
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["category"] == "burger"
+    assert data["nutrition"]["calories"] == "596"
+    assert "image_data" not in data
+    assert data["image_id"]
+    assert response.json()["preprocessing"]["original_bytes"] == len(b"image-bytes")
+    assert stub.state.counts == {"/food/images/analyze": 1, "/recipes/642539/nutritionWidget.json": 1}
+
+
+def test_repeat_upload_is_served_from_cache(stub, monkeypatch):
+    monkeypatch.setattr(server, "spoonacular", SpoonacularClient("test-key", base_url=stub.base_url))
+    monkeypatch.setattr(server.analysis_cache, "hits_memory", 0)
+    monkeypatch.setattr(server.analysis_cache, "hits_store", 0)
+    monkeypatch.setattr(server.analysis_cache, "misses", 0)
+
+    with TestClient(server.app) as client:
+        upload = lambda: client.post(
+            "/api/analyze-food",
+            files={"file": ("food.jpg", io.BytesIO(b"same-image"), "image/jpeg")},
+        )
+        first = upload().json()["data"]
+        second = upload().json()["data"]
+
+        # Drop the in-process tier: the Mongo tier must still answer
+        server.analysis_cache.memory.clear()
+        third = upload().json()["data"]
+        stats = client.get("/api/cache-stats").json()["data"]["analysis"]
+
+    assert first["nutrition"] == second["nutrition"] == third["nutrition"]
+    assert first["id"] != second["id"]
+    assert stub.state.counts["/food/images/analyze"] == 1
+    assert stats["misses"] == 1
+    assert stats["hits_memory"] == 1
+    assert stats["hits_store"] == 1
+
+
+def test_warmed_recipe_nutrition_skips_second_hop(stub, monkeypatch):
+    monkeypatch.setattr(server, "spoonacular", SpoonacularClient("test-key", base_url=stub.base_url))
+
+    with TestClient(server.app) as client:
+        before = server.recipe_nutrition_cache.stats()
+        warm = client.post("/api/admin/warm-recipe-nutrition", json={"recipe_ids": [642539, 642539, 663050]})
+        assert warm.json()["data"] == {"requested": 2, "already_cached": 0, "fetched": 2, "failed": []}
+        rewarm = client.post("/api/admin/warm-recipe-nutrition", json={"recipe_ids": [642539]})
+        assert rewarm.json()["data"]["already_cached"] == 1
+        # Warming is not counted as lookups
+        after = server.recipe_nutrition_cache.stats()
+        assert [after[field] - before[field] for field in ("hits_memory", "hits_store", "misses")] == [0, 0, 0]
+        for invalid in ("642539", [{"id": 1}], [True], [None]):
+            assert client.post("/api/admin/warm-recipe-nutrition", json={"recipe_ids": invalid}).status_code == 400
+
+        response = client.post(
+            "/api/analyze-food",
+            files={"file": ("food.jpg", io.BytesIO(b"fresh-image"), "image/jpeg")},
+        )
+
+    assert response.json()["data"]["nutrition"]["recipeId"] == 642539
+    assert stub.state.counts["/recipes/642539/nutritionWidget.json"] == 1
+    assert stub.state.counts["/food/images/analyze"] == 1
+
+
+def test_batch_analysis_dedupes_and_runs_concurrently(stub, monkeypatch):
+    monkeypatch.setattr(server, "spoonacular", SpoonacularClient("test-key", base_url=stub.base_url))
+    stub.state.latency = 0.3
+    uploads = [b"plate-one", b"plate-two", b"plate-one", b"plate-three"]
+
+    with TestClient(server.app) as client:
+        started = time.perf_counter()
+        response = client.post(
+            "/api/analyze-food/batch",
+            files=[("files", (f"food{i}.jpg", io.BytesIO(data), "image/jpeg")) for i, data in enumerate(uploads)],
+        )
+        elapsed = time.perf_counter() - started
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == [0, 1, 2, 3]
+    assert all(line["success"] and line["data"]["category"] == "burger" for line in lines)
+    by_index = {line["index"]: line["data"] for line in lines}
+    assert by_index[0]["image_id"] == by_index[2]["image_id"]
+    assert by_index[0]["id"] != by_index[2]["id"]
+
+    # Three distinct images, one shared recipe lookup, overlapping upstream calls
+    assert stub.state.counts == {"/food/images/analyze": 3, "/recipes/642539/nutritionWidget.json": 1}
+    assert elapsed < 3 * 0.3 + 0.3
+
+
+def test_concurrent_identical_uploads_share_one_upstream_call(stub, monkeypatch):
+    monkeypatch.setattr(server, "spoonacular", SpoonacularClient("test-key", base_url=stub.base_url))
+    stub.state.latency = 0.1
+
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*(
+                client.post("/api/analyze-food", files={"file": ("food.jpg", b"same-plate", "image/jpeg")})
+                for _ in range(4)
+            ))
+        await server.spoonacular.close()
+        return [response.json()["data"] for response in responses]
+
+    results = asyncio.run(run())
+    assert {data["category"] for data in results} == {"burger"}
+    assert stub.state.counts == {"/food/images/analyze": 1, "/recipes/642539/nutritionWidget.json": 1}
+
+
+def test_open_circuit_serves_uncached_fallback(stub, monkeypatch):
+    breaker = CircuitBreaker(min_calls=2, reset_timeout=0.2)
+    monkeypatch.setattr(server, "spoonacular", SpoonacularClient(
+        "test-key", base_url=stub.base_url, max_retries=1, backoff_base=0.001, circuit_breaker=breaker,
+    ))
+    stub.state.error_rate = 1.0
+
+    with TestClient(server.app) as client:
+        upload = lambda: client.post(
+            "/api/analyze-food",
+            files={"file": ("food.jpg", io.BytesIO(b"outage-plate"), "image/jpeg")},
+        ).json()["data"]
+
+        degraded = upload()
+        assert degraded["source"] == "fallback"
+        assert client.get("/api/upstream-status").json()["data"]["spoonacular"]["state"] == "open"
+
+        # While open, requests fail fast without reaching the provider
+        upload()
+        assert stub.state.counts["/food/images/analyze"] == 2
+
+        stub.state.error_rate = 0.0
+        time.sleep(0.25)
+        recovered = upload()
+        repeated = upload()
+
+    assert recovered["source"] == "live"
+    assert recovered["category"] == "burger"
+    assert repeated["source"] == "cache"
+    assert breaker.state == "closed"
+
+
+def test_failed_nutrition_lookup_uses_local_table_uncached(monkeypatch):
+    async def handler(request):
+        if request.url.path == "/food/images/analyze":
+            return httpx.Response(200, json={
+                "category": {"name": "cheesecake", "probability": 0.9},
+                "recipes": [{"id": 1, "title": "Cheesecake"}],
+            })
+        return httpx.Response(500)
+
+    monkeypatch.setattr(server, "spoonacular", SpoonacularClient(
+        "test-key", max_retries=0, transport=httpx.MockTransport(handler),
+    ))
+
+    with TestClient(server.app) as client:
+        response = client.post(
+            "/api/analyze-food",
+            files={"file": ("food.jpg", io.BytesIO(b"cake-plate"), "image/jpeg")},
+        )
+
+    data = response.json()["data"]
+    assert data["source"] == "live"
+    assert data["nutrition_source"] == "local"
+    assert data["nutrients"]["calories_kcal"] > 0
+    assert asyncio.run(server.analysis_cache.get(data["image_id"])) is None
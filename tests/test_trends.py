@@ -0,0 +1,77 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import server
+from trends import ema, weight_trend
+
+
+def test_ema_matches_recursive_definition():
+    values = np.random.default_rng(1).normal(80, 2, 1500)
+    expected = [values[0]]
+    for value in values[1:]:
+        expected.append(0.9 * expected[-1] + 0.1 * value)
+
+    np.testing.assert_allclose(ema(values, 0.1), expected)
+
+
+def test_trend_averages_rate_and_projection():
+    start = datetime(2026, 1, 1, 8)
+    # Losing 0.1 kg a day, weighed every other day
+    timestamps = [(start + timedelta(days=day)).isoformat() for day in range(0, 40, 2)]
+    weights = [90 - 0.1 * day for day in range(0, 40, 2)]
+
+    trend = weight_trend(timestamps, weights, goal_weight=80, since=date(2026, 1, 20))
+
+    assert trend["points"][0]["date"] == "2026-01-21"
+    # Readings on days 32, 34, 36 and 38 fall in the last 7-day window
+    assert trend["points"][-1]["ma7"] == 86.5
+    assert trend["rate_per_week"] == -0.7
+    # The smoothed value lags the readings; the projection starts from it
+    assert trend["current"]["ema"] > weights[-1]
+    assert date.fromisoformat(trend["projected_goal_date"]) > date(2026, 2, 8)
+
+
+def test_trend_endpoint_is_memoized_until_new_weight(sync_db):
+    now = datetime.now()
+    sync_db.weight_records.insert_many([
+        {"id": str(day), "user_id": "default_user", "weight": 75 - 0.05 * day,
+         "timestamp": (now - timedelta(days=20 - day)).isoformat()}
+        for day in range(20)
+    ])
+    sync_db.user_profiles.insert_one({"user_id": "default_user", "goal_weight": 70})
+
+    with TestClient(server.app) as client:
+        first = client.get("/api/weight-trend").json()["data"]
+        sync_db.weight_records.insert_one({"id": "x", "user_id": "default_user", "weight": 60.0, "timestamp": now.isoformat()})
+        cached = client.get("/api/weight-trend").json()["data"]
+        client.post("/api/save-weight", json={"weight": 74.0})
+        refreshed = client.get("/api/weight-trend").json()["data"]
+
+    assert len(first["points"]) == 20
+    assert first["rate_per_week"] < 0
+    assert first["projected_goal_date"] is not None
+    assert cached == first
+    assert len(refreshed["points"]) == 21
+
+
+def test_trend_cache_sees_writes_from_other_workers(sync_db):
+    now = datetime.now()
+    sync_db.weight_records.insert_many([
+        {"id": str(day), "user_id": "default_user", "weight": 80.0, "timestamp": (now - timedelta(days=day)).isoformat()}
+        for day in range(1, 5)
+    ])
+
+    with TestClient(server.app) as client:
+        first = client.get("/api/weight-trend").json()["data"]
+        # Another worker stores a weight: it bumps the shared version, not this worker's cache
+        sync_db.weight_records.insert_one({"id": "x", "user_id": "default_user", "weight": 79.0, "timestamp": now.isoformat()})
+        asyncio.run(server.data_versions.bump("weight_records", ["default_user"]))
+        refreshed = client.get("/api/weight-trend").json()["data"]
+
+    assert len(first["points"]) == 4
+    assert len(refreshed["points"]) == 5
+    # The stale trend was replaced rather than kept alongside the new one
+    assert len(server.weight_trend_cache) == 1
@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import io
+import tempfile
+import tracemalloc
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import server
+from image_store import FileSystemImageStore
+from spoonacular import SpoonacularClient
+from spoonacular_stub import SpoonacularStub
+from uploads import BodySizeLimit, read_upload
+
+
+def limited_app(limit: int):
+    app = FastAPI()
+    app.add_middleware(BodySizeLimit, limits={"/upload": limit})
+    calls = []
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        calls.append(file.filename)
+        return {"size": len(await file.read())}
+
+    return app, calls
+
+
+def test_body_over_limit_is_rejected_before_the_handler():
+    app, calls = limited_app(1000)
+    with TestClient(app) as client:
+        assert client.post("/upload", files={"file": ("a.jpg", b"x" * 100)}).json() == {"size": 100}
+
+        declared = client.post("/upload", files={"file": ("b.jpg", b"x" * 5000)})
+        assert declared.status_code == 413
+
+        # Without a Content-Length the body is cut off once it has grown past the limit
+        body = b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"c.jpg\"\r\n\r\n" + b"x" * 5000
+        streamed = client.post(
+            "/upload",
+            content=(body[start:start + 512] for start in range(0, len(body), 512)),
+            headers={"Content-Type": "multipart/form-data; boundary=b"},
+        )
+        assert streamed.status_code == 413
+
+    assert calls == ["a.jpg"]
+
+
+def test_image_over_limit_is_rejected_and_not_stored(monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "UPLOAD_MAX_BYTES", 1000)
+    monkeypatch.setattr(server, "image_store", FileSystemImageStore(str(tmp_path)))
+
+    with TestClient(server.app) as client:
+        single = client.post("/api/analyze-food", files={"file": ("big.jpg", b"x" * 5000, "image/jpeg")})
+        batch = client.post("/api/analyze-food/batch", files=[
+            ("files", ("small.jpg", b"x" * 10, "image/jpeg")),
+            ("files", ("big.jpg", b"x" * 5000, "image/jpeg")),
+        ])
+
+    assert single.status_code == 413
+    assert batch.status_code == 413
+    assert not any(tmp_path.iterdir())
+
+
+def test_read_upload_hashes_in_chunks_and_can_detach():
+    data = bytes(range(256)) * 1000
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024)
+    spooled.write(data)
+    upload = UploadFile(spooled, filename="photo.jpg")
+
+    result = asyncio.run(read_upload(upload, max_bytes=len(data), detach=True))
+
+    assert (result.size, result.sha256) == (len(data), hashlib.sha256(data).hexdigest())
+    assert result.file is spooled and upload.file is not spooled
+    asyncio.run(upload.close())
+    assert result.file.read() == data
+    result.close()
+
+
+def test_large_upload_is_analyzed_without_copying_it_into_memory(monkeypatch, tmp_path):
+    buffer = io.BytesIO()
+    Image.effect_noise((3000, 2000), 64).convert("RGB").save(buffer, format="JPEG", quality=95)
+    photo = buffer.getvalue()
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(photo)
+    assert spooled._rolled  # spooled to disk, like Starlette does above its threshold
+    upload = UploadFile(spooled, filename="photo.jpg")
+    monkeypatch.setattr(server, "image_store", FileSystemImageStore(str(tmp_path)))
+
+    with SpoonacularStub() as stub:
+        monkeypatch.setattr(server, "spoonacular", SpoonacularClient("test-key", base_url=stub.base_url))
+
+        async def analyze():
+            await server.spoonacular.start()
+            try:
+                tracemalloc.start()
+                result = await server.analyze_food_image(upload)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            finally:
+                await server.spoonacular.close()
+            return result, peak
+
+        result, peak = asyncio.run(analyze())
+
+    image_id = hashlib.sha256(photo).hexdigest()
+    assert result["data"]["image_id"] == image_id
+    assert (tmp_path / image_id[:2] / image_id).read_bytes() == photo
+    assert result["preprocessing"]["original_bytes"] == len(photo)
+    # Only the downscaled copy for recognition and small buffers were held in memory
+    assert peak < len(photo) // 4, f"peak {peak} bytes for a {len(photo)} byte upload"
+
+
+def test_early_rejection_carries_cors_headers_and_is_counted(monkeypatch):
+    monkeypatch.setitem(server.BODY_SIZE_LIMITS, "/api/analyze-food", 1000)
+
+    with TestClient(server.app) as client:
+        response = client.post(
+            "/api/analyze-food",
+            files={"file": ("big.jpg", b"x" * 5000, "image/jpeg")},
+            headers={"Origin": "http://example.com"},
+        )
+        metrics_text = client.get("/metrics").text
+
+    assert response.status_code == 413
+    assert response.headers["access-control-allow-origin"] in ("*", "http://example.com")
+    assert 'status="413"' in metrics_text
+
+
+def test_recognition_reads_the_image_from_the_store(monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "image_store", FileSystemImageStore(str(tmp_path)))
+
+    with SpoonacularStub() as stub:
+        stub.state.latency = 0.1
+        monkeypatch.setattr(server, "spoonacular", SpoonacularClient("test-key", base_url=stub.base_url))
+
+        async def analyze():
+            await server.spoonacular.start()
+            try:
+                image_id = await server.image_store.put(b"stored-plate", "image/jpeg")
+                # Callers share one flight by image id alone: none lends it an upload that could close under it
+                first = asyncio.ensure_future(server.recognize_image(image_id))
+                await asyncio.sleep(0.02)
+                first.cancel()
+                return await server.recognize_image(image_id)
+            finally:
+                await server.spoonacular.close()
+
+        analysis, source, preprocessing = asyncio.run(analyze())
+
+    assert (analysis["category"], source) == ("burger", "live")
+    assert preprocessing["original_bytes"] == len(b"stored-plate")
+    assert stub.state.counts["/food/images/analyze"] == 1